@@ -63,6 +63,8 @@ const Checkout = () => {
             razorpay_order_id: response.razorpay_order_id,
             razorpay_payment_id: response.razorpay_payment_id,
             razorpay_signature: response.razorpay_signature,
+          }, {
+            headers: { 'Idempotency-Key': response.razorpay_payment_id },
           });
           navigate(`/payment-success/${orderData.transaction.id}`);
         } catch (error) {
@@ -24,26 +24,23 @@ const Dashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const response = await api.get('/payments/transactions/');
-      const transactions = response.data;
-      
-      const total = transactions.length;
-      const successful = transactions.filter(t => t.status === 'SUCCESS').length;
-      const pending = transactions.filter(t => t.status === 'PENDING').length;
-      const failed = transactions.filter(t => t.status === 'FAILED').length;
-      const successAmount = transactions
-        .filter(t => t.status === 'SUCCESS')
-        .reduce((sum, t) => sum + parseFloat(t.amount), 0);
+      // Totals come pre-aggregated from the summary endpoint, only the recent rows are fetched
+      const [recent, summary] = await Promise.all([
+        api.get('/payments/transactions/', { params: { page_size: 5 } }),
+        api.get('/payments/summary/')
+      ]);
+      const byStatus = summary.data.by_status;
+      const count = (status) => byStatus[status]?.count || 0;
       
       setStats({
-        total,
-        successful,
-        successAmount,
-        pending,
-        failed
+        total: summary.data.total_count,
+        successful: count('SUCCESS'),
+        successAmount: parseFloat(byStatus.SUCCESS?.total || 0),
+        pending: count('PENDING'),
+        failed: count('FAILED')
       });
       
-      setRecentTransactions(transactions.slice(0, 5));
+      setRecentTransactions(recent.data.results);
       setLoading(false);
     } catch (error) {
       setLoading(false);
@@ -1,17 +1,26 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import api from '../api/axios';
 
 const PaymentForm = () => {
   const [formData, setFormData] = useState({ amount: '', description: '' });
   const [error, setError] = useState('');
+  // same key for retries of the same form, so a resubmit never creates a second order
+  const idempotencyKey = useRef(crypto.randomUUID());
   const navigate = useNavigate();
 
+  const updateForm = (changes) => {
+    idempotencyKey.current = crypto.randomUUID();
+    setFormData({ ...formData, ...changes });
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError('');
     try {
-      const response = await api.post('/payments/create-order/', formData);
+      const response = await api.post('/payments/create-order/', formData, {
+        headers: { 'Idempotency-Key': idempotencyKey.current },
+      });
       navigate('/checkout', { state: { orderData: response.data } });
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to create order');
@@ -40,7 +49,7 @@ const PaymentForm = () => {
                 min="1"
                 placeholder="Enter amount"
                 value={formData.amount}
-                onChange={(e) => setFormData({ ...formData, amount: e.target.value })}
+                onChange={(e) => updateForm({ amount: e.target.value })}
                 required
               />
               <span className="form-hint">Minimum amount: ₹1</span>
@@ -54,7 +63,7 @@ const PaymentForm = () => {
                 rows="3"
                 placeholder="What is this payment for?"
                 value={formData.description}
-                onChange={(e) => setFormData({ ...formData, description: e.target.value })}
+                onChange={(e) => updateForm({ description: e.target.value })}
               ></textarea>
             </div>
 
@@ -3,10 +3,23 @@ import { Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import api from '../api/axios';
 
+const PAGE_SIZE = 20;
+
 const TransactionHistory = () => {
   const { user, loading: authLoading } = useAuth();
   const [transactions, setTransactions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // The API is cursor paginated, each page carries the cursor for the next one
+  const fetchPage = async (cursor) => {
+    const params = { page_size: PAGE_SIZE };
+    if (cursor) params.cursor = cursor;
+    const response = await api.get('/payments/transactions/', { params });
+    setTransactions(prev => (cursor ? [...prev, ...response.data.results] : response.data.results));
+    setNextCursor(response.data.next_cursor);
+  };
 
   useEffect(() => {
     const fetchTransactions = async () => {
@@ -17,8 +30,7 @@ const TransactionHistory = () => {
       }
       
       try {
-        const response = await api.get('/payments/transactions/');
-        setTransactions(response.data);
+        await fetchPage(null);
       } catch (error) {
         // Handle error silently
       } finally {
@@ -28,6 +40,17 @@ const TransactionHistory = () => {
     fetchTransactions();
   }, [user, authLoading]);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchPage(nextCursor);
+    } catch (error) {
+      // Handle error silently
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const getStatusBadge = (status) => {
     if (status === 'SUCCESS') {
       return <span className="badge badge-success">✓ Success</span>;
@@ -78,6 +101,13 @@ const TransactionHistory = () => {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div style={{ marginTop: '20px', textAlign: 'center' }}>
+                <button className="btn btn-outline" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? 'Loading...' : 'Load More'}
+                </button>
+              </div>
+            )}
           </div>
         ) : (
           <div className="empty-state">
@@ -0,0 +1,25 @@
+from django import forms
+from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.forms import UserChangeForm
+from django.contrib.auth.models import User
+
+from .models import Account, normalize_email
+
+
+class AccountUserChangeForm(UserChangeForm):
+    # accounts.email is unique, accounts/signals.py would fail the save with an IntegrityError
+    def clean_email(self):
+        email = self.cleaned_data.get('email')
+        taken = Account.objects.filter(email=normalize_email(email)).exclude(user_id=self.instance.pk)
+        if normalize_email(email) and taken.exists():
+            raise forms.ValidationError('Another user already has this email.')
+        return email
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class AccountUserAdmin(UserAdmin):
+    form = AccountUserChangeForm
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        from payment_gateway import caches
+        caches.check_session_cache()
@@ -0,0 +1,46 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+from .models import normalize_email
+
+
+class EmailBackend(ModelBackend):
+    """
+    Logs in by email with one indexed query on accounts.email.
+
+    The login form sends the email as username. A value without an @ is a
+    plain username, the admin's for instance, and goes to ModelBackend.
+
+    Users that shared an email before accounts existed have no account row,
+    only the oldest of them got it, see accounts/migrations/0006_account.py.
+    They signed up with the email as username and are still found by it.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or '@' not in username:
+            return super().authenticate(request, username=username, password=password, **kwargs)
+        if password is None:
+            return None
+        users = self.get_candidates(username)
+        if not users:
+            # hash anyway, so unknown emails take as long as wrong passwords
+            User().set_password(password)
+            return None
+        for user in users:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
+
+    def get_candidates(self, username):
+        """The user holding the email, then the user with it as username when that is someone else."""
+        user = self.get_by_email(username)
+        if user is not None and user.username == username:
+            return [user]
+        users = [] if user is None else [user]
+        return users + list(User.objects.filter(username=username))
+
+    def get_by_email(self, email):
+        try:
+            return User.objects.get(account__email=normalize_email(email))
+        except User.DoesNotExist:
+            return None
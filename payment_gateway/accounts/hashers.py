@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+# Cost parameters come from settings.PASSWORD_HASHING. Django's check_password() rehashes a
+# stored password on the next successful login when its parameters differ from these
+# (must_update), so changing them needs no migration.
+
+
+def password_hashing_options():
+    options = {
+        # OWASP's Argon2id baseline, 19 MiB and 2 passes on one lane, about 20 ms a hash
+        'ARGON2_TIME_COST': 2,
+        'ARGON2_MEMORY_COST': 19 * 1024,
+        'ARGON2_PARALLELISM': 1,
+        'SCRYPT_WORK_FACTOR': 2 ** 14,
+        'SCRYPT_BLOCK_SIZE': 8,
+        'SCRYPT_PARALLELISM': 1,
+        'PBKDF2_ITERATIONS': PBKDF2PasswordHasher.iterations,
+    }
+    options.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return options
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return password_hashing_options()['ARGON2_TIME_COST']
+
+    @property
+    def memory_cost(self):
+        return password_hashing_options()['ARGON2_MEMORY_COST']
+
+    @property
+    def parallelism(self):
+        return password_hashing_options()['ARGON2_PARALLELISM']
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return password_hashing_options()['SCRYPT_WORK_FACTOR']
+
+    @property
+    def block_size(self):
+        return password_hashing_options()['SCRYPT_BLOCK_SIZE']
+
+    @property
+    def parallelism(self):
+        return password_hashing_options()['SCRYPT_PARALLELISM']
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return password_hashing_options()['PBKDF2_ITERATIONS']
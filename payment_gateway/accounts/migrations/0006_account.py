@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_accounts(apps, schema_editor):
+    # the oldest user keeps an email registered more than once. The others get no account row,
+    # their usernames are that email and EmailBackend falls back to a username lookup for them
+    User = apps.get_model("auth", "User")
+    Account = apps.get_model("accounts", "Account")
+    seen = set()
+    accounts = []
+    for user_id, email in (
+        User.objects.order_by("id").values_list("id", "email").iterator()
+    ):
+        email = (email or "").strip().lower()
+        if email and email not in seen:
+            seen.add(email)
+            accounts.append(Account(user_id=user_id, email=email))
+    Account.objects.bulk_create(accounts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_delete_userprofile"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Account",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("email", models.CharField(max_length=254, unique=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="account",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "accounts",
+            },
+        ),
+        migrations.RunPython(backfill_accounts, migrations.RunPython.noop),
+    ]
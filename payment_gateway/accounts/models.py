@@ -1,5 +1,21 @@
 from django.db import models
 from django.contrib.auth.models import User
 
-# Using Django's built-in User model
-# No custom models needed for this application
\ No newline at end of file
+# Django's built-in User model, plus one row per user holding the login email.
+# auth_user.email has no index and no unique constraint, accounts.email has both.
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+class Account(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='account')
+    # normalized with normalize_email(), kept in step with user.email by accounts/signals.py
+    email = models.CharField(max_length=254, unique=True)
+
+    class Meta:
+        db_table = 'accounts'
+
+    def __str__(self):
+        return self.email
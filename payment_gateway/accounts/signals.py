@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from payment_gateway import object_cache
+
+from .models import Account, normalize_email
+
+
+@receiver([post_save, post_delete], sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    object_cache.invalidate_users([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def sync_account_email(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Keeps accounts.email equal to the normalized user.email.
+
+    Saves that name their fields and leave out email, like the last_login
+    update on every login, skip the query. A duplicate email raises
+    IntegrityError inside the caller's save, the admin's user form checks first.
+    """
+    if raw or (update_fields is not None and 'email' not in update_fields):
+        return
+    email = normalize_email(instance.email)
+    if not email:
+        Account.objects.filter(user=instance).delete()
+    elif created:
+        Account.objects.create(user=instance, email=email)
+    else:
+        Account.objects.update_or_create(user=instance, defaults={'email': email})
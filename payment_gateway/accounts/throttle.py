@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import normalize_email
+
+
+def login_throttle_options():
+    options = {
+        # sustained attempts per minute and the burst allowed on top, per client IP and per email
+        'IP_PER_MINUTE': 30,
+        'IP_BURST': 20,
+        'EMAIL_PER_MINUTE': 5,
+        'EMAIL_BURST': 10,
+        # buckets kept per worker, the least recently used go first
+        'MAX_KEYS': 100000,
+        # proxies in front of the app that append to X-Forwarded-For, 0 keys the IP bucket on REMOTE_ADDR
+        'TRUSTED_PROXIES': 0,
+    }
+    options.update(getattr(settings, 'LOGIN_THROTTLE', {}))
+    return options
+
+
+class TokenBuckets:
+    """
+    In-memory token buckets shared by the threads of a worker.
+
+    A limit is (key, tokens per second, burst). take() is all or nothing
+    across the limits it is given, so a rejected attempt costs no bucket a
+    token. Buckets are stored as (tokens, last refill) and evicted least
+    recently used past max_keys, an evicted bucket comes back full.
+    """
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def level(self, key, rate, burst, now):
+        tokens, updated = self.buckets.get(key, (burst, now))
+        return min(burst, tokens + (now - updated) * rate)
+
+    def take(self, limits, now=None):
+        """Takes a token from every bucket and returns 0, or the seconds until all of them have one."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            levels = [self.level(key, rate, burst, now) for key, rate, burst in limits]
+            wait = max((1 - tokens) / rate for (_, rate, _), tokens in zip(limits, levels))
+            if wait > 0:
+                return wait
+            for (key, _, _), tokens in zip(limits, levels):
+                self.store(key, tokens - 1, now)
+        return 0
+
+    def give_back(self, limits, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            for key, rate, burst in limits:
+                self.store(key, min(burst, self.level(key, rate, burst, now) + 1), now)
+
+    def store(self, key, tokens, now):
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+buckets = TokenBuckets(login_throttle_options()['MAX_KEYS'])
+
+
+def client_ip(request):
+    """
+    The address the IP bucket is keyed on.
+
+    Clients write what they like into X-Forwarded-For, only the entry the
+    outermost trusted proxy appended, TRUSTED_PROXIES from the right, is theirs.
+    """
+    proxies = login_throttle_options()['TRUSTED_PROXIES']
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    if proxies and len(forwarded) >= proxies and forwarded[-proxies]:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def login_limits(ip_address, email):
+    options = login_throttle_options()
+    return [
+        (f"ip:{ip_address}", options['IP_PER_MINUTE'] / 60, options['IP_BURST']),
+        # the same form EmailBackend looks the account up by, every spelling shares one bucket
+        (f"email:{normalize_email(email)}", options['EMAIL_PER_MINUTE'] / 60, options['EMAIL_BURST']),
+    ]
@@ -1,11 +1,20 @@
+import math
+
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
 
+from payment_gateway import object_cache
+
+from . import throttle
+from .models import Account, normalize_email
+
 # it converts a Django User model object into a JSON-friendly Python dictionary that can be sent to the frontend (React). 
 def serialize_user(user):
     return {
@@ -23,7 +32,7 @@ def signup_api(request):
 
     first = data.get("first_name", "").strip()
     last = data.get("last_name", "").strip()
-    email = data.get("email", "").strip()
+    email = normalize_email(data.get("email", ""))
     p1 = data.get("password1")
     p2 = data.get("password2")
 
@@ -33,16 +42,22 @@ def signup_api(request):
     if p1 != p2:
         return Response({"error": "Passwords do not match."}, status=400)
 
-    if User.objects.filter(email=email).exists():
+    # indexed pre-check that spares the password hash, the unique constraint settles races
+    if Account.objects.filter(email=email).exists():
         return Response({"error": "Email already registered."}, status=400)
 
-    user = User.objects.create_user(
-        username=email,
-        email=email,
-        password=p1,
-        first_name=first,
-        last_name=last,
-    )
+    try:
+        # the user and its accounts row (accounts/signals.py) commit together or not at all
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=email,
+                email=email,
+                password=p1,
+                first_name=first,
+                last_name=last,
+            )
+    except IntegrityError:
+        return Response({"error": "Email already registered."}, status=400)
 
     return Response(
         {"message": "Account created.", "user": serialize_user(user)},
@@ -59,14 +74,27 @@ def login_api(request):
     if not email or not password:
         return Response({"error": "Email and password required."}, status=400)
 
+    # checked before authenticate(), a throttled attempt never reaches the password hasher
+    limits = throttle.login_limits(throttle.client_ip(request), email)
+    retry_after = throttle.buckets.take(limits)
+    if retry_after:
+        return Response(
+            {"error": "Too many login attempts. Try again later."},
+            status=429,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
     user = authenticate(request, username=email, password=password)
 
     if not user:
         return Response({"error": "Invalid email or password."}, status=401)
 
+    # only failed attempts count against the limits
+    throttle.buckets.give_back(limits)
+
+    # SessionMiddleware saves the new session on the way out
     login(request, user)
-    request.session.save()
-    
+
     return Response({"message": "Login successful.", "user": serialize_user(user)})
 
 
@@ -80,7 +108,11 @@ def logout_api(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def current_user_api(request):
-    return Response(serialize_user(request.user))
+    # the app polls this on every page load, the body and its ETag come from the object cache
+    etag, body = object_cache.cached_body(
+        object_cache.user_body_key(request.user.pk), lambda: JSONRenderer().render(serialize_user(request.user))
+    )
+    return object_cache.json_response(request, etag, body)
 
 
 @api_view(["GET"])
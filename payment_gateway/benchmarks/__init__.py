@@ -0,0 +1 @@
+# Benchmarks package, scripts here are run by hand and are not collected by pytest
@@ -0,0 +1,88 @@
+"""
+Order creation throughput of one worker with a slow gateway, sync WSGI vs async ASGI endpoint.
+Run: python -m benchmarks.async_orders --requests 200 --concurrency 50 --latency-ms 100
+
+A sync gunicorn worker holds its thread for the whole gateway round trip and
+tops out near 1 / latency req/s. The async view keeps taking requests while
+gateway calls are in flight, up to RAZORPAY_HTTP['ASYNC_CONCURRENCY'].
+Use Postgres for the async run, SQLite serialises the concurrent writes.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.utils import setup_django, latency_report, print_report, session_cookie, test_database
+from benchmarks.stub_gateway import StubGateway
+
+BODY = {'amount': '100.00', 'description': 'bench'}
+
+
+def drive_wsgi(app, cookies, path, requests):
+    samples = []
+    with httpx.Client(transport=httpx.WSGITransport(app=app), base_url='http://testserver', cookies=cookies) as http:
+        started = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            http.post(path, json=BODY).raise_for_status()
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+async def drive_asgi(app, cookies, path, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(http):
+        async with semaphore:
+            t0 = time.perf_counter()
+            response = await http.post(path, json=BODY)
+            response.raise_for_status()
+            samples.append(time.perf_counter() - t0)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver', cookies=cookies) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(http) for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from payment_gateway.asgi import application as asgi_application
+    from payment_gateway.wsgi import application as wsgi_application
+
+    stub = StubGateway(latency_ms=args.latency_ms).start()
+    settings.RAZORPAY_HTTP = {**settings.RAZORPAY_HTTP, 'BASE_URL': stub.url}
+    settings.RAZORPAY_KEY_ID = settings.RAZORPAY_KEY_ID or 'rzp_test_bench'
+    settings.RAZORPAY_KEY_SECRET = settings.RAZORPAY_KEY_SECRET or 'bench_secret'
+
+    try:
+        with test_database():
+            user = User.objects.create_user(username='bench@test.com', email='bench@test.com', password='bench')
+            cookies = session_cookie(user)
+
+            samples, elapsed = drive_wsgi(wsgi_application, cookies, '/api/payments/create-order/', args.requests)
+            print_report(latency_report('sync worker (WSGI)', samples, elapsed))
+
+            samples, elapsed = asyncio.run(drive_asgi(
+                asgi_application, cookies, '/api/payments/async/create-order/', args.requests, args.concurrency
+            ))
+            print_report(latency_report('async worker (ASGI)', samples, elapsed))
+    finally:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Bulk refund throughput against the stub gateway.
+Run: python -m benchmarks.bulk_refund --refunds 10000 --latency-ms 20 --concurrency 1 16
+
+Each concurrency level refunds its own set of paid transactions through
+BulkRefunder with the pooled razorpay client, the same path as
+manage.py bulk_refund. Reports refunds/sec end to end, DB writes included.
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, test_database
+from benchmarks.stub_gateway import StubGateway
+
+
+def seed(user, count):
+    from decimal import Decimal
+    from payments.models import Transaction
+
+    prefix = f"{user.pk}_"
+    Transaction.objects.bulk_create([
+        Transaction(user=user, order_id=f"ORD_{prefix}{i}", amount=Decimal('100.00'), status='SUCCESS',
+                    razorpay_order_id=f"order_{prefix}{i}", razorpay_payment_id=f"pay_{prefix}{i}")
+        for i in range(count)
+    ], batch_size=1000)
+    return Transaction.objects.filter(user=user).only('id', 'order_id', 'amount', 'status', 'razorpay_payment_id')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--refunds', type=int, default=10_000)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16])
+    parser.add_argument('--chunk-size', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from payments import gateway
+    from payments.refunds import BulkRefunder, refund_options
+
+    stub = StubGateway(latency_ms=args.latency_ms).start()
+    settings.RAZORPAY_HTTP = {**settings.RAZORPAY_HTTP, 'BASE_URL': stub.url, 'POOL_MAXSIZE': max(args.concurrency)}
+    settings.RAZORPAY_KEY_ID = settings.RAZORPAY_KEY_ID or 'rzp_test_bench'
+    settings.RAZORPAY_KEY_SECRET = settings.RAZORPAY_KEY_SECRET or 'bench_secret'
+
+    try:
+        with test_database():
+            for concurrency in args.concurrency:
+                user = User.objects.create_user(username=f"bench{concurrency}@test.com", password='bench')
+                transactions = seed(user, args.refunds)
+                refunder = BulkRefunder(gateway.get_client(), {
+                    **refund_options(), 'CONCURRENCY': concurrency, 'CHUNK_SIZE': args.chunk_size,
+                })
+
+                requests = [(t, None, 'bench') for t in transactions.order_by('pk')]
+                started = time.perf_counter()
+                stats = refunder.run(requests, f"bench-{concurrency}")
+                elapsed = time.perf_counter() - started
+
+                print(f"{f'concurrency {concurrency}':<28} {stats['processed']:>7} refunds  "
+                      f"{round(stats['processed'] / elapsed, 1):>9} refunds/s  {elapsed:>8.2f} s")
+    finally:
+        gateway.registry.close()
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
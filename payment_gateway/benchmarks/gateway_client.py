@@ -0,0 +1,48 @@
+"""
+Order creation latency against the stub gateway, new client per call vs the pooled registry.
+Run: python -m benchmarks.gateway_client --requests 2000 --latency-ms 5
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, latency_report, print_report
+from benchmarks.stub_gateway import StubGateway
+
+
+def run(name, make_client, requests):
+    samples = []
+    started = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        make_client().order.create({'amount': 10000, 'currency': 'INR', 'receipt': f"bench_{i}"})
+        samples.append(time.perf_counter() - t0)
+    return latency_report(name, samples, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    import razorpay
+    from django.conf import settings
+    from payments import gateway
+
+    stub = StubGateway(latency_ms=args.latency_ms).start()
+    settings.RAZORPAY_HTTP = {**settings.RAZORPAY_HTTP, 'BASE_URL': stub.url}
+    auth = ('rzp_test_bench', 'bench_secret')
+    try:
+        before = run('new client per order', lambda: razorpay.Client(auth=auth, base_url=stub.url), args.requests)
+        after = run('pooled client registry', lambda: gateway.registry.get(*auth), args.requests)
+    finally:
+        gateway.registry.close()
+        stub.stop()
+
+    print_report(before)
+    print_report(after)
+
+
+if __name__ == '__main__':
+    main()
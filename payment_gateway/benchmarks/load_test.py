@@ -0,0 +1,283 @@
+"""
+End to end load test: virtual users run signup -> login -> create-order -> verify -> history.
+Run: python -m benchmarks.load_test --users 20 --iterations 10 --latency-ms 20 --output results.json
+
+Stands the app up on a throwaway copy of the configured database (Postgres
+from .env, or point DJANGO_SETTINGS_MODULE at a file based SQLite settings
+module) with Razorpay replaced by benchmarks/stub_gateway.py. Each virtual
+user is a thread with its own client, calls go through the WSGI app in
+process, or over a local threaded HTTP server with --http.
+
+Reports requests/sec, latency percentiles, queries per request and errors
+per endpoint, writes them as JSON with --output and compares against an
+earlier run with --baseline. A regression beyond --tolerance exits with 1,
+so the same command works as a CI gate.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.utils import setup_django, percentile, test_database
+from benchmarks.stub_gateway import StubGateway
+
+QUERY_HEADER = 'X-Bench-Queries'
+PASSWORD = 'bench-pass-123'
+
+
+def counting_app(app):
+    """Wraps a WSGI app to report the queries each request ran in a response header."""
+    from django.db import connection
+
+    def wrapped(environ, start_response):
+        queries = 0
+        captured = {}
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        def capture(status, headers, exc_info=None):
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+
+        with connection.execute_wrapper(count):
+            result = app(environ, capture)
+            try:
+                body = b''.join(result)
+            finally:
+                # fires request_finished, the session save and connection cleanup happen here
+                if hasattr(result, 'close'):
+                    result.close()
+        start_response(captured['status'], [*captured['headers'], (QUERY_HEADER, str(queries))], captured['exc_info'])
+        return [body]
+
+    return wrapped
+
+
+def serve(app):
+    from django.core.servers.basehttp import ThreadedWSGIServer
+    from django.test.testcases import QuietWSGIRequestHandler
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+    server.set_app(app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Results:
+    """Latency, query count and status of every call, by endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = defaultdict(list)
+
+    def add(self, calls):
+        with self.lock:
+            for endpoint, samples in calls.items():
+                self.calls[endpoint].extend(samples)
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, samples in self.calls.items():
+            latencies = [latency for latency, _, _ in samples]
+            # failed calls stop early, they would pull the average down
+            queries = [q for _, q, ok in samples if ok] or [q for _, q, _ in samples]
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': sum(1 for _, _, ok in samples if not ok),
+                'rps': round(len(samples) / elapsed, 1),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'queries_per_request': round(sum(queries) / len(queries), 2),
+            }
+        return endpoints
+
+
+class VirtualUser:
+
+    def __init__(self, number, http, iterations, decline_rate):
+        self.email = f'vu{number}@bench.test'
+        self.http = http
+        self.iterations = iterations
+        self.decline_rate = decline_rate
+        self.random = random.Random(number)
+        self.calls = defaultdict(list)
+
+    def call(self, endpoint, method, path, expected, **kwargs):
+        started = time.perf_counter()
+        response = self.http.request(method, path, **kwargs)
+        latency = time.perf_counter() - started
+        queries = int(response.headers.get(QUERY_HEADER, 0))
+        self.calls[endpoint].append((latency, queries, response.status_code in expected))
+        return response
+
+    def run(self):
+        from payments.views import payment_signature
+
+        self.call('signup', 'POST', '/api/auth/signup/', {201}, json={
+            'first_name': 'Bench', 'last_name': 'User', 'email': self.email,
+            'password1': PASSWORD, 'password2': PASSWORD,
+        })
+        login = self.call('login', 'POST', '/api/auth/login/', {200}, json={'email': self.email, 'password': PASSWORD})
+        if login.status_code != 200:
+            return
+        for _ in range(self.iterations):
+            order = self.call('create-order', 'POST', '/api/payments/create-order/', {200}, json={
+                'amount': '499.00', 'description': 'bench',
+            })
+            if order.status_code == 200:
+                order_id = order.json()['razorpay_order_id']
+                payment_id = f'pay_{order_id}'
+                # a share of checkouts come back with a bad signature, the failure path is timed too
+                declined = self.random.random() < self.decline_rate
+                signature = 'declined' if declined else payment_signature(order_id, payment_id)
+                self.call('verify', 'POST', '/api/payments/verify/', {400} if declined else {200}, json={
+                    'razorpay_order_id': order_id, 'razorpay_payment_id': payment_id, 'razorpay_signature': signature,
+                })
+            self.call('history', 'GET', '/api/payments/transactions/', {200})
+
+
+def run_users(make_http, args):
+    from django.db import connection
+
+    results = Results()
+    errors = []
+
+    def one(number):
+        try:
+            with make_http() as http:
+                user = VirtualUser(number, http, args.iterations, args.decline_rate)
+                user.run()
+                results.add(user.calls)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=one, args=(n,)) for n in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return results, elapsed
+
+
+def compare(current, baseline, tolerance):
+    """Lines describing each endpoint against the baseline, and whether any of them regressed."""
+    lines, regressed = [], False
+    for endpoint, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if not before:
+            lines.append(f"{endpoint:<14} new endpoint, no baseline")
+            continue
+        problems = []
+        if now['rps'] < before['rps'] * (1 - tolerance):
+            problems.append('throughput')
+        if now['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            problems.append('p99')
+        if now['queries_per_request'] > before['queries_per_request']:
+            problems.append('queries')
+        if now['errors'] > before['errors']:
+            problems.append('errors')
+        regressed = regressed or bool(problems)
+        lines.append(
+            f"{endpoint:<14} req/s {before['rps']:>8} -> {now['rps']:<8} "
+            f"p99 {before['p99_ms']:>8} -> {now['p99_ms']:<8} ms  "
+            f"queries {before['queries_per_request']} -> {now['queries_per_request']}  "
+            f"{'REGRESSED: ' + ', '.join(problems) if problems else 'ok'}"
+        )
+    return lines, regressed
+
+
+def print_endpoints(endpoints):
+    print(f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'queries':>8}")
+    for endpoint, report in endpoints.items():
+        print(f"{endpoint:<14} {report['requests']:>8} {report['errors']:>6} {report['rps']:>8} "
+              f"{report['p50_ms']:>8} {report['p90_ms']:>8} {report['p99_ms']:>8} {report['queries_per_request']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=10, help='Checkouts per virtual user')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Stub gateway latency per call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of gateway calls answered with a 502')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of verifications with a bad signature')
+    parser.add_argument('--http', action='store_true', help='Go over a local threaded HTTP server instead of in process')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--baseline', help='Compare against the JSON of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput and p99 change, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from payment_gateway.wsgi import application
+
+    stub = StubGateway(latency_ms=args.latency_ms, failure_rate=args.failure_rate).start()
+    settings.RAZORPAY_HTTP = {**settings.RAZORPAY_HTTP, 'BASE_URL': stub.url}
+    settings.RAZORPAY_KEY_ID = settings.RAZORPAY_KEY_ID or 'rzp_test_bench'
+    settings.RAZORPAY_KEY_SECRET = settings.RAZORPAY_KEY_SECRET or 'bench_secret'
+    app = counting_app(application)
+
+    try:
+        with test_database():
+            if args.http:
+                # the local server has no TLS, a Secure session cookie would never come back
+                settings.SESSION_COOKIE_SECURE = False
+                server = serve(app)
+                url = f"http://127.0.0.1:{server.server_address[1]}"
+                make_http = lambda: httpx.Client(base_url=url, timeout=60)  # noqa: E731
+            else:
+                server = None
+                make_http = lambda: httpx.Client(transport=httpx.WSGITransport(app=app), base_url='https://testserver')  # noqa: E731
+            try:
+                results, elapsed = run_users(make_http, args)
+            finally:
+                if server:
+                    server.shutdown()
+                    server.server_close()
+    finally:
+        stub.stop()
+
+    current = {
+        'config': {
+            **{key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'elapsed_s': round(elapsed, 2),
+        'endpoints': results.report(elapsed),
+    }
+    print(f"{args.users} users x {args.iterations} checkouts on {connection.vendor} in {elapsed:.1f}s")
+    print_endpoints(current['endpoints'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines, regressed = compare(current, json.load(f), args.tolerance)
+        print(f"\nagainst {args.baseline}")
+        print('\n'.join(lines))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
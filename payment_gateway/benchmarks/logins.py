@@ -0,0 +1,69 @@
+"""
+Login cost per core for each password hasher, and the cost of a throttled attempt.
+Run: python -m benchmarks.logins --seconds 3
+
+Times check_password() on one thread for Django's stock PBKDF2 and for the
+tuned hashers in accounts/hashers.py (argon2 only with argon2-cffi
+installed), then a throttled POST /api/auth/login/ which is turned away
+before any hashing.
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django
+
+HASHERS = [
+    ('pbkdf2 (Django default)', 'django.contrib.auth.hashers.PBKDF2PasswordHasher'),
+    ('scrypt (tuned)', 'accounts.hashers.TunedScryptPasswordHasher'),
+    ('argon2 (tuned)', 'accounts.hashers.TunedArgon2PasswordHasher'),
+]
+
+
+def per_second(call, seconds):
+    count, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        call()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.hashers import check_password
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.utils.module_loading import import_string
+
+    print(f"{'hasher':<28} {'logins/s/core':>14}")
+    for name, path in HASHERS:
+        hasher = import_string(path)()
+        try:
+            encoded = hasher.encode('benchpass123', hasher.salt())
+        except ValueError as e:
+            print(f"{name:<28} {'skipped':>14}  ({e})")
+            continue
+        with override_settings(PASSWORD_HASHERS=[path]):
+            rate = per_second(lambda: check_password('benchpass123', encoded), args.seconds)
+        print(f"{name:<28} {rate:>14.1f}")
+
+    from accounts import throttle
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    client = Client()
+    body = {'email': 'stuffing@test.com', 'password': 'guess'}
+    with override_settings(LOGIN_THROTTLE={'EMAIL_BURST': 1, 'EMAIL_PER_MINUTE': 1}):
+        throttle.buckets.clear()
+        throttle.buckets.take(throttle.login_limits('127.0.0.1', body['email']))
+
+        def throttled():
+            assert client.post('/api/auth/login/', body, content_type='application/json').status_code == 429
+        rate = per_second(throttled, args.seconds)
+    print(f"{'throttled attempt (429)':<28} {rate:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Transaction list serialization throughput.
+Run: python -m benchmarks.serialization --rows 100 --repeat 500
+
+Renders the same history page three ways and reports rows/sec:
+serialize_transaction per model instance + JSONRenderer (the old path),
+Rows + FastJSONRenderer with the stdlib template encoder, and the same
+with orjson when it is installed. No database, the rows are built in memory.
+"""
+import argparse
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from benchmarks.utils import setup_django
+
+
+def build(count):
+    from django.utils import timezone
+    from payments.models import Transaction
+    from payments.views import TRANSACTION_FIELDS
+
+    now = timezone.now()
+    instances = [
+        Transaction(
+            id=i, order_id=f"ORD_{i:012d}", razorpay_order_id=f"order_{i}", razorpay_payment_id=f"pay_{i}",
+            amount=Decimal('499.00') + i, currency='INR', description=f"Order #{i} for a café", status='SUCCESS',
+            created_at=now - timedelta(minutes=i), updated_at=now,
+        )
+        for i in range(count)
+    ]
+    rows = [tuple(getattr(t, field) for field in TRANSACTION_FIELDS) + (t.id, t.created_at) for t in instances]
+    return instances, rows
+
+
+def measure(render, rows, repeat):
+    body = render()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    elapsed = time.perf_counter() - started
+    return body, rows * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100, help='rows per page')
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from payments import renderers
+    from payments.renderers import FastJSONRenderer, transaction_rows
+    from payments.views import TRANSACTION_FIELDS, serialize_transaction
+
+    instances, rows = build(args.rows)
+
+    def old_path():
+        return JSONRenderer().render({'results': [serialize_transaction(t) for t in instances], 'next_cursor': 'abc'})
+
+    def fast_path():
+        return FastJSONRenderer().render({'results': transaction_rows(TRANSACTION_FIELDS, rows), 'next_cursor': 'abc'})
+
+    baseline, baseline_rate = measure(old_path, args.rows, args.repeat)
+    print(f"{'serialize_transaction + JSONRenderer':<40} {baseline_rate:>12,.0f} rows/s")
+
+    variants = [('FastJSONRenderer, stdlib', None)]
+    if renderers.orjson is not None:
+        variants.append(('FastJSONRenderer, orjson', renderers.orjson))
+    for name, library in variants:
+        with patch.object(renderers, 'orjson', library):
+            body, rate = measure(fast_path, args.rows, args.repeat)
+        assert json.loads(body) == json.loads(baseline), name
+        print(f"{name:<40} {rate:>12,.0f} rows/s  {rate / baseline_rate:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Database queries and latency per authenticated request for each session setup.
+Run: python -m benchmarks.sessions --requests 2000
+
+Logs in through /api/auth/login/ and then polls an authenticated endpoint
+with Django's test client, counting all queries and the django_session ones:
+the old db engine with SESSION_SAVE_EVERY_REQUEST, then cached_db and
+signed_cookies with the sliding middleware.
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, test_database
+
+SETUPS = [
+    ('db, save every request', 'django.contrib.sessions.backends.db', True),
+    ('cached_db, sliding', 'django.contrib.sessions.backends.cached_db', False),
+    ('signed_cookies, sliding', 'django.contrib.sessions.backends.signed_cookies', False),
+]
+
+
+def run(path, count):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    client.post('/api/auth/login/', {'email': 'bench@test.com', 'password': 'benchpass123'}, content_type='application/json')
+    client.get(path)
+
+    with CaptureQueriesContext(connection) as context:
+        started = time.perf_counter()
+        for _ in range(count):
+            assert client.get(path).status_code == 200
+        elapsed = time.perf_counter() - started
+    session = sum(1 for q in context.captured_queries if 'django_session' in q['sql'])
+    return len(context.captured_queries) / count, session / count, count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--path', default='/api/payments/transactions/')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+
+    with test_database():
+        User.objects.create_user(username='bench@test.com', email='bench@test.com', password='benchpass123')
+        print(f"{'setup':<28} {'queries/req':>12} {'session/req':>12} {'req/s':>9}")
+        for name, engine, save_every_request in SETUPS:
+            with override_settings(SESSION_ENGINE=engine, SESSION_SAVE_EVERY_REQUEST=save_every_request):
+                queries, session, rate = run(args.path, args.requests)
+            print(f"{name:<28} {queries:>12.2f} {session:>12.2f} {rate:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
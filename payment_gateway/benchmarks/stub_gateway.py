@@ -0,0 +1,132 @@
+"""
+Local stand-in for the Razorpay REST API, used by the benchmarks.
+Run: python -m benchmarks.stub_gateway --port 8900 --latency-ms 20
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    ids = itertools.count(1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def simulate(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.failure_rate and random.random() < self.server.failure_rate:
+            self.send_json(502, {'error': {'code': 'SERVER_ERROR', 'description': 'Injected failure'}})
+            return False
+        return True
+
+    def do_POST(self):
+        data = self.read_json()
+        if not self.simulate():
+            return
+        if self.path == '/v1/orders':
+            self.send_json(200, {
+                'id': f"order_stub{next(self.ids)}",
+                'entity': 'order',
+                'amount': data.get('amount'),
+                'currency': data.get('currency', 'INR'),
+                'receipt': data.get('receipt'),
+                'status': 'created',
+            })
+            return
+        match = re.fullmatch(r'/v1/payments/([^/]+)/refund', self.path)
+        if match:
+            refund = {
+                'id': f"rfnd_stub{next(self.ids)}",
+                'entity': 'refund',
+                'payment_id': match.group(1),
+                'amount': data.get('amount'),
+                'receipt': data.get('receipt'),
+                'notes': data.get('notes', {}),
+                'status': 'processed',
+            }
+            with self.server.lock:
+                self.server.refunds.setdefault(match.group(1), []).append(refund)
+            self.send_json(200, refund)
+            return
+        self.send_json(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+
+    def do_GET(self):
+        if not self.simulate():
+            return
+        match = re.fullmatch(r'/v1/payments/([^/]+)/refunds', self.path)
+        if match:
+            with self.server.lock:
+                items = list(self.server.refunds.get(match.group(1), []))
+            self.send_json(200, {'entity': 'collection', 'count': len(items), 'items': items})
+            return
+        match = re.fullmatch(r'/v1/orders/([^/]+)/payments', self.path)
+        if match:
+            self.send_json(200, {'entity': 'collection', 'count': 0, 'items': []})
+            return
+        match = re.fullmatch(r'/v1/orders/([^/]+)', self.path)
+        if match:
+            self.send_json(200, {'id': match.group(1), 'entity': 'order', 'status': 'created'})
+            return
+        self.send_json(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Not found'}})
+
+
+class StubGateway(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port=0, latency_ms=0, failure_rate=0.0):
+        super().__init__(('127.0.0.1', port), StubGatewayHandler)
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        # refunds by payment id, so resumed bulk refunds can look up what was already submitted
+        self.refunds = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    gateway = StubGateway(args.port, args.latency_ms, args.failure_rate)
+    print(f"Stub gateway listening on {gateway.url}")
+    gateway.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
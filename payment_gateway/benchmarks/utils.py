@@ -0,0 +1,72 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'payment_gateway.settings')
+    import django
+    django.setup()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_report(name, samples, elapsed):
+    return {
+        'name': name,
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def print_report(report):
+    print(f"{report['name']:<28} {report['requests']:>7} req  {report['rps']:>9} req/s  "
+          f"p50 {report['p50_ms']:>8} ms  p99 {report['p99_ms']:>8} ms")
+
+
+@contextmanager
+def test_database():
+    """
+    Run against a throwaway copy of the configured database, like the test runner does.
+
+    PaymentLog entries spill to a temporary file, the real spill file is replayed
+    into the real payment_logs. The writer is drained before the copy is dropped.
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+    from payments import audit
+
+    old_name = connection.settings_dict['NAME']
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    spill_dir = tempfile.TemporaryDirectory(prefix='benchmark-payment-logs-')
+    payment_log = override_settings(
+        PAYMENT_LOG={**settings.PAYMENT_LOG, 'SPILL_PATH': os.path.join(spill_dir.name, 'payment_logs.spill.jsonl')}
+    )
+    payment_log.enable()
+    try:
+        yield
+    finally:
+        audit.writer.close()
+        payment_log.disable()
+        spill_dir.cleanup()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def session_cookie(user):
+    from django.conf import settings
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+    return {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
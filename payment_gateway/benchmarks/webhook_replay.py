@@ -0,0 +1,98 @@
+"""
+Webhook ingestion and processing throughput.
+Run: python -m benchmarks.webhook_replay --events 100000 --duplicates 0.1
+
+Records signed payment.captured / payment.failed payloads for pending
+transactions, replays them through the webhook endpoint (with a share of
+redeliveries) and reports events/sec for the ack path and the processor
+separately. Ingest runs with ASYNC off the request path, processing is
+timed by draining the processor queue afterwards.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import time
+
+import httpx
+
+from benchmarks.utils import setup_django, latency_report, print_report, test_database
+
+SECRET = 'bench_webhook_secret'
+
+
+def record_payloads(order_ids, count, duplicates):
+    payloads = []
+    for i in range(count):
+        if payloads and random.random() < duplicates:
+            payloads.append(random.choice(payloads))
+            continue
+        event = random.choice(['payment.captured', 'payment.captured', 'payment.failed'])
+        body = json.dumps({
+            'entity': 'event',
+            'event': event,
+            'payload': {'payment': {'entity': {'id': f"pay_{i}", 'order_id': random.choice(order_ids)}}},
+        }).encode()
+        signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        payloads.append((f"evt_{i}", body, signature))
+    return payloads
+
+
+def replay(app, payloads):
+    samples = []
+    with httpx.Client(transport=httpx.WSGITransport(app=app), base_url='http://testserver') as http:
+        started = time.perf_counter()
+        for event_id, body, signature in payloads:
+            t0 = time.perf_counter()
+            http.post('/api/payments/webhook/', content=body, headers={
+                'Content-Type': 'application/json',
+                'X-Razorpay-Signature': signature,
+                'X-Razorpay-Event-Id': event_id,
+            }).raise_for_status()
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--events', type=int, default=100_000)
+    parser.add_argument('--transactions', type=int, default=20_000)
+    parser.add_argument('--duplicates', type=float, default=0.1)
+    args = parser.parse_args()
+
+    setup_django()
+    from decimal import Decimal
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from payment_gateway.wsgi import application
+    from payments import webhooks
+    from payments.models import Transaction, WebhookEvent
+
+    settings.RAZORPAY_WEBHOOK_SECRET = SECRET
+    settings.RAZORPAY_WEBHOOK = {**settings.RAZORPAY_WEBHOOK, 'QUEUE_SIZE': args.events}
+
+    with test_database():
+        user = User.objects.create_user(username='bench@test.com', email='bench@test.com', password='bench')
+        Transaction.objects.bulk_create([
+            Transaction(user=user, order_id=f"ORD_{i}", razorpay_order_id=f"order_{i}", amount=Decimal('100.00'))
+            for i in range(args.transactions)
+        ], batch_size=1000)
+        payloads = record_payloads([f"order_{i}" for i in range(args.transactions)], args.events, args.duplicates)
+
+        # keep the processor thread out of the ingest numbers, it is drained below
+        webhooks.processor.autostart = False
+        samples, elapsed = replay(application, payloads)
+        print_report(latency_report('webhook ingest', samples, elapsed))
+
+        queued = webhooks.processor.queue.qsize()
+        started = time.perf_counter()
+        webhooks.processor.drain()
+        elapsed = time.perf_counter() - started
+        print(f"{'webhook processing':<28} {queued:>7} evt  {round(queued / elapsed, 1) if elapsed else 0.0:>9} evt/s")
+        print(f"stored {WebhookEvent.objects.count()} unique events from {len(payloads)} deliveries")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,51 @@
 import pytest
 
-pytestmark = pytest.mark.django_db
\ No newline at end of file
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    from django.contrib.auth.models import User
+    return User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+
+
+@pytest.fixture
+def logged_in_user(client, user):
+    client.force_login(user)
+    return user
+
+
+@pytest.fixture(autouse=True)
+def sync_payment_logs(settings):
+    # Tests read PaymentLog rows straight after the request, tests/test_audit.py covers the batched writer
+    settings.PAYMENT_LOG = {**settings.PAYMENT_LOG, 'DEFAULT_DURABILITY': 'sync'}
+
+
+@pytest.fixture(autouse=True)
+def clear_object_cache():
+    # ids are reused once each test rolls back, entries must not leak into the next test
+    from payment_gateway import object_cache
+    object_cache.cache().clear()
+    object_cache.counters.reset()
+
+
+@pytest.fixture(autouse=True)
+def reset_login_throttle():
+    # every test client logs in from 127.0.0.1
+    from accounts import throttle
+    throttle.buckets.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    from payment_gateway import metrics
+    metrics.registry.reset()
+
+
+@pytest.fixture(autouse=True)
+def query_checks(request, settings):
+    # any request that runs an N+1 or a slow query fails its test, @pytest.mark.query_checks(...) overrides the options
+    marker = request.node.get_closest_marker('query_checks')
+    settings.QUERY_CHECKS = {
+        **settings.QUERY_CHECKS, 'ENABLED': True, 'MODE': 'raise', 'SLOW_QUERY_MS': 500, **(marker.kwargs if marker else {}),
+    }
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import object_cache
+
+# Caches that hold state every worker has to agree on, sessions for one, must be shared
+# between the workers. A delete in one worker never reaches another worker's locmem, or
+# another host's file cache, so a logged out session would stay valid there.
+
+SHARED_BACKENDS = {
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django.core.cache.backends.db.DatabaseCache',
+}
+
+
+def is_shared(alias):
+    return settings.CACHES[alias]['BACKEND'] in SHARED_BACKENDS
+
+
+def single_worker():
+    # gunicorn takes its worker count from WEB_CONCURRENCY, unset means several are possible
+    return settings.WEB_CONCURRENCY == 1
+
+
+def require_shared(alias, feature, hint=''):
+    if is_shared(alias):
+        return
+    raise ImproperlyConfigured(
+        f"{feature} needs CACHES[{alias!r}] shared between processes (redis or memcached), "
+        f"not {settings.CACHES[alias]['BACKEND']}.{hint}"
+    )
+
+
+def check_session_cache():
+    """Raises ImproperlyConfigured when cached_db sessions would be cached per worker."""
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db' and not single_worker():
+        require_shared(
+            settings.SESSION_CACHE_ALIAS, 'SESSION_BACKEND=cached_db', ' Set WEB_CONCURRENCY=1 if only one worker serves requests'
+        )
+
+
+def check_object_cache():
+    """
+    Raises ImproperlyConfigured when the object cache is enabled on a per process cache.
+
+    A single worker is not enough here, reconcile_payments, process_webhooks
+    and bulk_refund change transactions from their own processes.
+    """
+    options = object_cache.object_cache_options()
+    if options['ENABLED']:
+        require_shared(options['CACHE'], 'OBJECT_CACHE_ENABLED')
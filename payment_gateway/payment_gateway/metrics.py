@@ -0,0 +1,321 @@
+import contextvars
+import hmac
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Request, database and gateway timings in Prometheus text format, served on /metrics.
+# Each gunicorn worker keeps its own numbers, Prometheus adds them up across scrapes of every worker.
+
+
+def metrics_options():
+    options = {
+        'ENABLED': True,
+        # scrapers send it as a bearer token, without one only staff sessions can read /metrics
+        'TOKEN': '',
+        'LATENCY_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+        'QUERY_BUCKETS': (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+        'QUERY_COUNT_BUCKETS': (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    }
+    options.update(getattr(settings, 'METRICS', {}))
+    return options
+
+
+METRICS = {
+    # name: (type, help, bucket option)
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', 'LATENCY_BUCKETS'),
+    'http_request_app_seconds': (
+        'histogram', 'Request time spent outside the database and the gateway.', 'LATENCY_BUCKETS'
+    ),
+    'db_query_duration_seconds': ('histogram', 'Database query latency by endpoint.', 'QUERY_BUCKETS'),
+    'db_queries_per_request': ('histogram', 'Database queries per request by endpoint.', 'QUERY_COUNT_BUCKETS'),
+    'gateway_request_duration_seconds': ('histogram', 'Razorpay API call latency by operation.', 'LATENCY_BUCKETS'),
+    'gateway_errors_total': ('counter', 'Razorpay API calls that failed or returned an error status.', None),
+    'payment_log_queue_depth': ('gauge', 'PaymentLog entries waiting for the batched writer.', None),
+    'payment_log_flush_duration_seconds': ('histogram', 'PaymentLog batch insert latency.', 'QUERY_BUCKETS'),
+    'payment_log_entries_total': ('counter', 'PaymentLog entries written or spilled to disk by the batched writer.', None),
+    'payment_log_replay_failures_total': ('counter', 'Spill file replays that failed.', None),
+    'payment_log_quarantined_total': ('counter', 'Spill files moved to .failed because they cannot be replayed.', None),
+}
+
+
+class Shard:
+    """One thread's counters and histograms. Only its thread writes to it."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class ShardOwner:
+    pass
+
+
+class Registry:
+    """
+    Per worker metrics, aggregated without locks on the hot path.
+
+    Every thread writes to its own Shard, so recording is a dict lookup and a
+    few additions. collect() sums the shards when /metrics is read. A shard
+    whose thread has exited is folded into `retired`, threads that come and
+    go, like runserver's one per request, do not pile up shards.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.shards = []
+        self.retired = Shard()
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            pass
+        shard = Shard()
+        # lives in the thread's local storage only, its finalizer runs when the thread exits
+        self.local.owner = owner = ShardOwner()
+        weakref.finalize(owner, self.retire, shard)
+        with self.lock:
+            self.shards.append(shard)
+        self.local.shard = shard
+        return shard
+
+    def retire(self, shard):
+        with self.lock:
+            if shard in self.shards:
+                self.shards.remove(shard)
+                merge(self.retired, shard)
+
+    def inc(self, name, labels, amount=1):
+        counters = self.shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        histograms = self.shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            # a count per bucket, the +Inf bucket, then the sum
+            counts = histograms[key] = [0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def collect(self):
+        total = Shard()
+        with self.lock:
+            shards = [self.retired, *self.shards]
+            for shard in shards:
+                merge(total, shard)
+        return total
+
+    def reset(self):
+        with self.lock:
+            for shard in [self.retired, *self.shards]:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+
+def merge(into, shard):
+    # dict() copies in one step, the owning thread may be adding keys meanwhile
+    for key, value in dict(shard.counters).items():
+        into.counters[key] = into.counters.get(key, 0) + value
+    for key, counts in dict(shard.histograms).items():
+        merged = into.histograms.get(key)
+        if merged is None:
+            into.histograms[key] = list(counts)
+        else:
+            for i, count in enumerate(counts):
+                merged[i] += count
+
+
+registry = Registry()
+
+# callables returning {(name, labels): value}, read on every render for numbers another component keeps
+collectors = []
+
+
+def register_collector(collect):
+    if collect not in collectors:
+        collectors.append(collect)
+
+
+def observe(name, labels, value):
+    registry.observe(name, labels, value, metrics_options()[METRICS[name][2]])
+
+
+def format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    """Everything recorded so far in the Prometheus text exposition format."""
+    options = metrics_options()
+    total = registry.collect()
+    values = dict(total.counters)
+    for collect in collectors:
+        values.update(collect())
+    lines = []
+    for name, (kind, help_text, bucket_option) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind in ('counter', 'gauge'):
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            continue
+        bounds = [*map(str, options[bucket_option]), '+Inf']
+        for (metric, labels), counts in sorted(total.histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {counts[-1]:.6f}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    __slots__ = ('request', 'queries', 'db_seconds', 'gateway_seconds')
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.gateway_seconds = 0.0
+
+    @property
+    def endpoint(self):
+        # read at query time, the URL is resolved after the first middlewares have run
+        return endpoint_for(self.request)
+
+
+# the request being served, sync_to_async copies it into the thread that runs the ORM calls
+current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def endpoint_for(request):
+    match = getattr(request, 'resolver_match', None)
+    # the route pattern, not the path, ids would make a series per object
+    return match.route if match else 'unmatched'
+
+
+def observe_query(execute, sql, params, many, context):
+    """
+    Installed on every connection with execute_wrapper semantics, see track_connection().
+
+    Times each query and charges it to the current request's endpoint,
+    queries outside a request count under endpoint="none".
+    """
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = current_request.get()
+        if stats is None:
+            observe('db_query_duration_seconds', (('endpoint', 'none'),), elapsed)
+        else:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            observe('db_query_duration_seconds', (('endpoint', stats.endpoint),), elapsed)
+
+
+def track_connection(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper, install once
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+GATEWAY_ID = re.compile(r'/[a-z]+_[A-Za-z0-9]+')
+
+
+def observe_gateway(method, path, seconds, error=None):
+    """Records one Razorpay API call, error is a status code or exception name when it failed."""
+    labels = (('operation', f'{method} {GATEWAY_ID.sub("/{id}", path)}'),)
+    observe('gateway_request_duration_seconds', labels, seconds)
+    if error is not None:
+        registry.inc('gateway_errors_total', (*labels, ('error', str(error))))
+    stats = current_request.get()
+    if stats is not None:
+        stats.gateway_seconds += seconds
+
+
+class MetricsMiddleware:
+    """
+    Times every request, goes first in MIDDLEWARE so the rest of the stack is inside it.
+
+    Labels are the URL route, method and status. The per request query
+    count and the time left after database and gateway waits, which is
+    Python, serialization and middleware, are recorded alongside.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = metrics_options()['ENABLED']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        stats, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        stats, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    def start(self, request):
+        stats = RequestStats(request)
+        return stats, current_request.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        elapsed = time.perf_counter() - started
+        endpoint = endpoint_for(request)
+        labels = (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code)))
+        observe('http_request_duration_seconds', labels, elapsed)
+        observe('http_request_app_seconds', (('endpoint', endpoint),),
+                max(0.0, elapsed - stats.db_seconds - stats.gateway_seconds))
+        observe('db_queries_per_request', (('endpoint', endpoint),), stats.queries)
+
+
+def metrics_view(request):
+    token = metrics_options()['TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if token:
+        allowed = hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    else:
+        allowed = request.user.is_active and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+
+# Unix time the session was last written, the cookie and the stored expiry date both start from it
+REFRESHED_AT = '_refreshed_at'
+
+
+class SlidingSessionMiddleware:
+    """
+    Sliding session expiry without a write on every request.
+
+    Goes after SessionMiddleware. A session is only marked modified, and so
+    saved with a fresh SESSION_COOKIE_AGE, once less than
+    SESSION_REFRESH_THRESHOLD seconds of it are left. Requests in between only
+    read it, which the cached_db engine serves from the cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        if session is None or not session.accessed or session.is_empty():
+            return response
+        now = int(time.time())
+        remaining = session.get(REFRESHED_AT, 0) + settings.SESSION_COOKIE_AGE - now
+        if session.modified or remaining < settings.SESSION_REFRESH_THRESHOLD:
+            session[REFRESHED_AT] = now
+        return response
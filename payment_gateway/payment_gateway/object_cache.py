@@ -0,0 +1,135 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+# Read-through cache for single objects: a user's transactions and the current user's response.
+# Entries are (etag, JSON body). The process that changes a row drops its entry, the web workers
+# and the management commands alike, so it is only enabled on a cache they all share
+# (payment_gateway/caches.py). Disabled, every read renders and the ETags still work.
+
+
+def object_cache_options():
+    options = {
+        'ENABLED': False,
+        'CACHE': 'default',
+        'TTL': 5 * 60,
+    }
+    options.update(getattr(settings, 'OBJECT_CACHE', {}))
+    return options
+
+
+class Counters:
+    """Per-process hit, miss, 304 and invalidation counts."""
+
+    NAMES = ('hits', 'misses', 'not_modified', 'invalidations')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.values = dict.fromkeys(self.NAMES, 0)
+
+    def bump(self, name, amount=1):
+        with self.lock:
+            self.values[name] += amount
+
+    def snapshot(self):
+        with self.lock:
+            values = dict(self.values)
+        lookups = values['hits'] + values['misses']
+        values['hit_ratio'] = round(values['hits'] / lookups, 4) if lookups else 0.0
+        return values
+
+
+counters = Counters()
+
+
+def cache():
+    return caches[object_cache_options()['CACHE']]
+
+
+def cache_key(kind, *parts):
+    return ':'.join(['obj', kind, *map(str, parts)])
+
+
+def etag_for(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def enabled():
+    return object_cache_options()['ENABLED']
+
+
+def read_through(key, load):
+    """Cached value for key, load() fills a miss. None from load() is not cached."""
+    if not enabled():
+        return load()
+    value = cache().get(key)
+    if value is not None:
+        counters.bump('hits')
+        return value
+    counters.bump('misses')
+    value = load()
+    if value is not None:
+        cache().set(key, value, object_cache_options()['TTL'])
+    return value
+
+
+def cached_body(key, render):
+    """(etag, body) for key, render() returns the JSON bytes or None when there is nothing to show."""
+    def load():
+        body = render()
+        return None if body is None else (etag_for(body), body)
+    return read_through(key, load)
+
+
+def json_response(request, etag, body):
+    """200 with the cached body, or 304 when If-None-Match already has it. Neither renders anything."""
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in etags or '*' in etags:
+        counters.bump('not_modified')
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # per user data, shared caches must not keep it
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def invalidate(keys):
+    """
+    Drops keys now and again once the surrounding transaction commits.
+
+    The second delete covers a reader that loaded the old row between the
+    first delete and the commit and put it back in the cache.
+    """
+    keys = list(keys)
+    if not keys or not enabled():
+        return
+    cache().delete_many(keys)
+    counters.bump('invalidations', len(keys))
+    db_transaction.on_commit(lambda: cache().delete_many(keys))
+
+
+def transaction_key(user_id, transaction_id):
+    return cache_key('transaction', user_id, transaction_id)
+
+
+def user_body_key(user_id):
+    return cache_key('user-body', user_id)
+
+
+def invalidate_transactions(transactions):
+    invalidate(transaction_key(t.user_id, t.pk) for t in transactions)
+
+
+def invalidate_users(user_ids):
+    invalidate(user_body_key(user_id) for user_id in user_ids)
@@ -0,0 +1,185 @@
+import contextvars
+import logging
+import os
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from payment_gateway import metrics
+
+# N+1 and slow query detection for tests and staging, off in production.
+# conftest.py turns it on in raise mode, so any request that repeats a query shape fails its test.
+
+logger = logging.getLogger(__name__)
+
+
+def query_checks_options():
+    options = {
+        'ENABLED': False,
+        # 'log' warns through the payment_gateway.query_checks logger, 'raise' fails the request
+        'MODE': 'log',
+        # the same query shape this many times in one request is an N+1
+        'N_PLUS_ONE': 5,
+        'SLOW_QUERY_MS': 100,
+    }
+    options.update(getattr(settings, 'QUERY_CHECKS', {}))
+    return options
+
+
+class QueryProblems(Exception):
+    pass
+
+
+LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s|\?'), '?'),
+    # IN (?, ?, ?) and bulk VALUES lists grow with their input
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'(?:\(\.\.\.\)\s*,\s*)+\(\.\.\.\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+# transaction bookkeeping repeats by design
+IGNORED = re.compile(r'^\s*(SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """The shape of a statement, values and list lengths taken out."""
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+# the query wrappers themselves are always on the stack
+WRAPPER_FILES = {__file__, metrics.__file__}
+
+
+def app_frame():
+    """file:line of the innermost frame in this project, where the query was triggered from."""
+    root = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(root) and frame.filename not in WRAPPER_FILES \
+                and f'{os.sep}site-packages{os.sep}' not in frame.filename:
+            return f'{os.path.relpath(frame.filename, root)}:{frame.lineno}'
+    return 'unknown'
+
+
+class Report:
+    """The queries of one request: how often each shape ran, where it came from and which were slow."""
+
+    def __init__(self, label, options):
+        self.label = label
+        self.repeat_limit = options['N_PLUS_ONE']
+        self.slow_seconds = options['SLOW_QUERY_MS'] / 1000
+        self.counts = Counter()
+        self.examples = {}
+        self.locations = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if not IGNORED.match(sql):
+                self.record(sql, elapsed)
+
+    def record(self, sql, elapsed):
+        shape = fingerprint(sql)
+        self.counts[shape] += 1
+        self.examples.setdefault(shape, sql)
+        # the stack is only walked when it is needed for a report
+        if self.counts[shape] == self.repeat_limit:
+            self.locations[shape] = app_frame()
+        if elapsed >= self.slow_seconds:
+            self.slow.append((elapsed, sql, app_frame()))
+
+    def problems(self):
+        found = [
+            f'N+1: {count} x {self.examples[shape][:200]} (from {self.locations[shape]})'
+            for shape, count in self.counts.most_common() if count >= self.repeat_limit
+        ]
+        found += [f'slow query: {elapsed * 1000:.0f} ms {sql[:200]} (from {where})' for elapsed, sql, where in self.slow]
+        return found
+
+
+# the inspect() block being run, sync_to_async copies it into the thread that runs the ORM calls
+current_report = contextvars.ContextVar('query_report', default=None)
+
+
+def check_query(execute, sql, params, many, context):
+    """Installed on every connection with execute_wrapper semantics, hands the query to the current report."""
+    report = current_report.get()
+    if report is None:
+        return execute(sql, params, many, context)
+    return report(execute, sql, params, many, context)
+
+
+def track_connection(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper, install once
+    if check_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(check_query)
+
+
+@contextmanager
+def inspect(label, **overrides):
+    """
+    Checks the queries run inside the block, on any connection of the same context.
+
+    Nested blocks share the outer report. Problems are logged, or raised
+    as QueryProblems in 'raise' mode.
+    """
+    options = {**query_checks_options(), **overrides}
+    if current_report.get() is not None:
+        yield current_report.get()
+        return
+    report = Report(label, options)
+    token = current_report.set(report)
+    try:
+        yield report
+    finally:
+        current_report.reset(token)
+    problems = report.problems()
+    if not problems:
+        return
+    message = f"{label}: " + '; '.join(problems)
+    if options['MODE'] == 'raise':
+        raise QueryProblems(message)
+    logger.warning(message)
+
+
+class QueryChecksMiddleware:
+    """
+    Runs every request inside inspect() when QUERY_CHECKS['ENABLED'] is on.
+
+    Async views run their ORM calls on other threads' connections, the report
+    reaches them through current_report like the metrics do.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not query_checks_options()['ENABLED']:
+            return self.get_response(request)
+        with inspect(f'{request.method} {request.path}'):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not query_checks_options()['ENABLED']:
+            return await self.get_response(request)
+        with inspect(f'{request.method} {request.path}'):
+            return await self.get_response(request)
@@ -1,3 +1,4 @@
+from importlib.util import find_spec
 from pathlib import Path
 import os
 import dj_database_url 
@@ -36,10 +37,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so the time of every other middleware is in the request latency
+    "payment_gateway.metrics.MetricsMiddleware",
+    "payment_gateway.query_checks.QueryChecksMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "payment_gateway.middleware.SlidingSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -87,6 +92,34 @@ if 'DATABASE_URL' in os.environ:
 
 AUTH_PASSWORD_VALIDATORS = []
 
+# Password hashing, see accounts/hashers.py. The first hasher hashes new passwords, stored
+# hashes from the others (or with other parameters) are rehashed on the next login.
+# argon2 needs argon2-cffi, without it scrypt from the standard library is used
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER') or ('argon2' if find_spec('argon2') else 'scrypt')
+TUNED_PASSWORD_HASHERS = {
+    'argon2': 'accounts.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'accounts.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'accounts.hashers.TunedPBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [TUNED_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in TUNED_PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PASSWORD_HASHING = {
+    'ARGON2_TIME_COST': int(os.getenv('ARGON2_TIME_COST', '2')),
+    'ARGON2_MEMORY_COST': int(os.getenv('ARGON2_MEMORY_COST', str(19 * 1024))),
+    'ARGON2_PARALLELISM': int(os.getenv('ARGON2_PARALLELISM', '1')),
+}
+
+# Failed login attempts per client IP and per email, see accounts/throttle.py
+LOGIN_THROTTLE = {
+    'IP_PER_MINUTE': int(os.getenv('LOGIN_THROTTLE_IP_PER_MINUTE', '30')),
+    'EMAIL_PER_MINUTE': int(os.getenv('LOGIN_THROTTLE_EMAIL_PER_MINUTE', '5')),
+    'TRUSTED_PROXIES': int(os.getenv('LOGIN_THROTTLE_TRUSTED_PROXIES') or '0'),
+}
+
+# email login on accounts.email
+AUTHENTICATION_BACKENDS = ['accounts.backends.EmailBackend']
+
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
 USE_I18N = True
@@ -107,10 +140,181 @@ LOGOUT_REDIRECT_URL = '/'
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
+# PaymentLog writes, see payments/audit.py. Durability per event_type is sync, durable or async
+PAYMENT_LOG = {
+    'DEFAULT_DURABILITY': os.getenv('PAYMENT_LOG_DURABILITY', 'async'),
+    'DURABILITY': {
+        'PAYMENT_SUCCESS': 'sync',
+    },
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 0.5,
+    'SPILL_PATH': os.getenv('PAYMENT_LOG_SPILL_PATH') or str(BASE_DIR / 'var' / 'payment_logs.spill.jsonl'),
+    'SPILL_REPLAY_INTERVAL': 30,
+}
+
+# Stale PENDING transactions, see payments/reconciliation.py and the reconcile_payments command
+RECONCILIATION = {
+    'OLDER_THAN_MINUTES': int(os.getenv('RECONCILE_OLDER_THAN_MINUTES', '30')),
+    'EXPIRE_AFTER_MINUTES': int(os.getenv('RECONCILE_EXPIRE_AFTER_MINUTES', str(24 * 60))),
+    'CHUNK_SIZE': 500,
+    'CONCURRENCY': int(os.getenv('RECONCILE_CONCURRENCY', '8')),
+    'RATE_LIMIT': float(os.getenv('RECONCILE_RATE_LIMIT', '20')),
+    'CHECKPOINT_PATH': str(BASE_DIR / 'var' / 'reconcile.checkpoint.json'),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # per worker copy of recent Idempotency-Key responses, the idempotency_keys table is shared
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'idempotency',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Read-through cache for transaction detail and the current user's response, see payment_gateway/object_cache.py.
+# Off unless OBJECT_CACHE_ENABLED=True, which needs redis (OBJECT_CACHE_URL) or memcached: rows are changed
+# by every worker and by the management commands, each drops the entries in its own process only otherwise
+OBJECT_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'objects',
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('OBJECT_CACHE_MAX_ENTRIES', '10000'))},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('OBJECT_CACHE_URL') or 'redis://127.0.0.1:6379/1',
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.getenv('OBJECT_CACHE_URL') or '127.0.0.1:11211',
+    },
+}
+
+# Sessions for the cached_db engine, misses fall back to django_session. Logging out deletes the
+# entry in this cache only, so it has to be one all workers share, payment_gateway/caches.py
+# refuses locmem unless WEB_CONCURRENCY=1
+SESSION_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('SESSION_CACHE_URL') or 'redis://127.0.0.1:6379/2',
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.getenv('SESSION_CACHE_URL') or '127.0.0.1:11211',
+    },
+}
+CACHES['sessions'] = SESSION_CACHE_BACKENDS[os.getenv('SESSION_CACHE_BACKEND', 'locmem')]
+
+# gunicorn's worker count, 0 when unknown. A per process session cache is only accepted when it is 1
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY') or '0')
+
+CACHES['objects'] = OBJECT_CACHE_BACKENDS[os.getenv('OBJECT_CACHE_BACKEND', 'locmem')]
+
+OBJECT_CACHE = {
+    'ENABLED': os.getenv('OBJECT_CACHE_ENABLED', 'False') == 'True',
+    'CACHE': 'objects',
+    'TTL': int(os.getenv('OBJECT_CACHE_TTL', '300')),
+}
+
+# Prometheus metrics on /metrics, see payment_gateway/metrics.py
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'True') == 'True',
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+}
+
+# Monthly payment_logs partitions (Postgres), maintained by the partition_payment_logs command
+PAYMENT_LOG_PARTITIONS = {
+    'MONTHS_AHEAD': int(os.getenv('PAYMENT_LOG_MONTHS_AHEAD', '3')),
+    'RETENTION_MONTHS': int(os.getenv('PAYMENT_LOG_RETENTION_MONTHS', '12')),
+    'ARCHIVE_DIR': os.getenv('PAYMENT_LOG_ARCHIVE_DIR') or BASE_DIR / 'var' / 'archive' / 'payment_logs',
+}
+
+# Finalized transactions moved to transactions_archive by the archive_transactions command
+TRANSACTION_ARCHIVE = {
+    'AGE_DAYS': int(os.getenv('TRANSACTION_ARCHIVE_AGE_DAYS', '365')),
+    'BATCH_SIZE': int(os.getenv('TRANSACTION_ARCHIVE_BATCH_SIZE', '500')),
+    'PAUSE': 0.05,
+}
+
+# Admin changelists for the payment tables, see payments/admin.py
+LARGE_TABLE_ADMIN = {
+    'EXACT_COUNT_BELOW': int(os.getenv('LARGE_TABLE_ADMIN_EXACT_COUNT_BELOW', '10000')),
+}
+
+# N+1 and slow query detection, for staging. The test suite runs with it in raise mode (conftest.py)
+QUERY_CHECKS = {
+    'ENABLED': os.getenv('QUERY_CHECKS_ENABLED', 'False') == 'True',
+    'MODE': os.getenv('QUERY_CHECKS_MODE', 'log'),
+    'N_PLUS_ONE': int(os.getenv('QUERY_CHECKS_N_PLUS_ONE', '5')),
+    'SLOW_QUERY_MS': int(os.getenv('QUERY_CHECKS_SLOW_QUERY_MS', '100')),
+}
+
+# Idempotency-Key handling for create-order and verify, see payments/idempotency.py
+IDEMPOTENCY = {
+    'CACHE': 'idempotency',
+    'TTL': 24 * 60 * 60,
+    'WAIT_TIMEOUT': 10,
+    'LOCK_TIMEOUT': 60,
+}
+
+# Refund submission, see payments/refunds.py and the bulk_refund command
+REFUNDS = {
+    'CONCURRENCY': int(os.getenv('REFUND_CONCURRENCY', '8')),
+    'CHUNK_SIZE': 200,
+}
+
+# Streaming CSV/JSONL exports, see payments/exports.py and the export_payments command
+EXPORTS = {
+    'CHUNK_SIZE': 2000,
+    'BUFFER_SIZE': 64 * 1024,
+}
+
+# GET /api/payments/transactions/ page sizes
+TRANSACTION_HISTORY_PAGE_SIZE = 20
+TRANSACTION_HISTORY_MAX_PAGE_SIZE = 100
+
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET', '')
+
+# Webhook ingestion, see payments/webhooks.py
+RAZORPAY_WEBHOOK = {
+    'ASYNC': True,
+    'DEDUP_CACHE_SIZE': 10000,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 100,
+}
+
+# Pooled keep-alive HTTP session shared by every razorpay.Client in a worker, see payments/gateway.py
+RAZORPAY_HTTP = {
+    'BASE_URL': os.getenv('RAZORPAY_BASE_URL', 'https://api.razorpay.com'),
+    'POOL_CONNECTIONS': int(os.getenv('RAZORPAY_POOL_CONNECTIONS', '4')),
+    'POOL_MAXSIZE': int(os.getenv('RAZORPAY_POOL_MAXSIZE', '16')),
+    'CONNECT_TIMEOUT': float(os.getenv('RAZORPAY_CONNECT_TIMEOUT', '3.05')),
+    'READ_TIMEOUT': float(os.getenv('RAZORPAY_READ_TIMEOUT', '15')),
+    'RETRIES': int(os.getenv('RAZORPAY_RETRIES', '3')),
+    'BACKOFF_FACTOR': float(os.getenv('RAZORPAY_BACKOFF_FACTOR', '0.3')),
+    # in-flight gateway calls per ASGI worker for the async endpoints
+    'ASYNC_CONCURRENCY': int(os.getenv('RAZORPAY_ASYNC_CONCURRENCY', '64')),
+}
 FRONTEND_URL = os.getenv('FRONTEND_URI', 'http://localhost:5173')
 
+# Order ids, see payments/order_ids.py. Pin ORDER_ID_WORKER_ID per instance when running many replicas
+ORDER_ID_GENERATOR = 'payments.order_ids.TimeOrderedOrderIdGenerator'
+ORDER_ID_GENERATOR_OPTIONS = {}
+if os.getenv('ORDER_ID_WORKER_ID'):
+    ORDER_ID_GENERATOR_OPTIONS['worker_id'] = int(os.getenv('ORDER_ID_WORKER_ID'))
+
 
 if DEBUG:
     CSRF_COOKIE_SAMESITE = 'Lax'
@@ -147,7 +351,19 @@ else:
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_DOMAIN = None
 SESSION_COOKIE_AGE = 1209600
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are rewritten by payment_gateway.middleware.SlidingSessionMiddleware once less than
+# SESSION_REFRESH_THRESHOLD seconds are left, not on every request
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_THRESHOLD = int(os.getenv('SESSION_REFRESH_THRESHOLD', str(SESSION_COOKIE_AGE // 2)))
+# db reads django_session on every request. cached_db reads sessions from the 'sessions' cache
+# and writes through to django_session, it needs SESSION_CACHE_BACKEND=redis or memcached.
+# signed_cookies keeps them in the cookie and never touches the database
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[os.getenv('SESSION_BACKEND', 'db')]
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
 CORS_ALLOWED_ORIGINS = [
@@ -160,7 +376,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
-CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'Idempotent-Replayed']
 CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
@@ -171,6 +387,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 REST_FRAMEWORK = {
@@ -4,9 +4,12 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.http import JsonResponse
 from accounts.views import signup_api, login_api, logout_api, current_user_api
 from payments.views import (
-    create_order_api, verify_payment_api, payment_failure_api,
-    transaction_history_api, transaction_detail_api
+    create_order_api, verify_payment_api, payment_failure_api, refund_api,
+    transaction_history_api, transaction_detail_api, payment_summary_api, export_api, razorpay_webhook_api,
+    object_cache_stats_api,
 )
+from payments.async_views import create_order_async_api, verify_payment_async_api
+from payment_gateway.metrics import metrics_view
 
 
 @ensure_csrf_cookie
@@ -16,6 +19,9 @@ def get_csrf_token(request):
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+
+    # Prometheus scrape target
+    path('metrics', metrics_view, name='metrics'),
     
     # CSRF token
     path('api/csrf/', get_csrf_token, name='api_csrf'),
@@ -30,6 +36,15 @@ urlpatterns = [
     path('api/payments/create-order/', create_order_api, name='api_create_order'),
     path('api/payments/verify/', verify_payment_api, name='api_verify_payment'),
     path('api/payments/failure/', payment_failure_api, name='api_payment_failure'),
+    path('api/payments/refund/', refund_api, name='api_refund'),
     path('api/payments/transactions/', transaction_history_api, name='api_transaction_history'),
     path('api/payments/transactions/<int:transaction_id>/', transaction_detail_api, name='api_transaction_detail'),
+    path('api/payments/summary/', payment_summary_api, name='api_payment_summary'),
+    path('api/payments/export/<slug:kind>.<slug:fmt>', export_api, name='api_export'),
+    path('api/payments/cache-stats/', object_cache_stats_api, name='api_object_cache_stats'),
+    path('api/payments/webhook/', razorpay_webhook_api, name='api_razorpay_webhook'),
+
+    # Async payment endpoints, for ASGI deployments
+    path('api/payments/async/create-order/', create_order_async_api, name='api_create_order_async'),
+    path('api/payments/async/verify/', verify_payment_async_api, name='api_verify_payment_async'),
 ]
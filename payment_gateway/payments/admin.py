@@ -1,14 +1,91 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Transaction, PaymentLog
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from accounts.models import normalize_email
+from .models import ArchivedTransaction, Transaction, PaymentLog
+
+# The payment tables run to millions of rows. Nothing on these changelists may
+# scan them: no exact COUNT(*), no date_hierarchy or DISTINCT filter values,
+# searches are exact or prefix matches on indexed columns and sorting is by
+# the created_at index only.
+
+
+def large_table_admin_options():
+    options = {
+        # below this estimate the paginator pays for an exact count
+        'EXACT_COUNT_BELOW': 10000,
+    }
+    options.update(getattr(settings, 'LARGE_TABLE_ADMIN', {}))
+    return options
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate for queryset on Postgres, None elsewhere.
+
+    Unfiltered it is reltuples from pg_class, as fresh as the last
+    (auto)vacuum or ANALYZE. Filtered it is the row estimate of the plan.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # -1 until the table has been analyzed
+            return row[0] if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the planner's estimate over COUNT(*) once a table or filter is large."""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < large_table_admin_options()['EXACT_COUNT_BELOW']:
+            return super().count
+        return estimate
+
+
+class LightChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer(*self.model_admin.changelist_defer) if self.model_admin.changelist_defer else queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # the "N total" link is a second COUNT(*) over the unfiltered table
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    sortable_by = ['created_at']
+    # columns the changelist does not show and should not load
+    changelist_defer = []
+
+    def get_changelist(self, request, **kwargs):
+        return LightChangeList
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = ['order_id', 'user', 'amount', 'currency', 'status', 'created_at']
-    list_filter = ['status', 'currency', 'created_at']
-    search_fields = ['order_id', 'razorpay_order_id', 'razorpay_payment_id', 'user__email']
+    list_select_related = ['user']
+    # status has choices, a currency filter would SELECT DISTINCT over the whole table
+    list_filter = ['status', 'created_at']
+    # order ids exactly, Razorpay ids by prefix on their pattern ops indexes, emails through accounts.email
+    search_fields = ['order_id__exact', 'razorpay_order_id__startswith', 'razorpay_payment_id__startswith']
+    search_help_text = 'Order id, Razorpay order or payment id (or its start), or customer email'
+    raw_id_fields = ['user']
     readonly_fields = ['created_at', 'updated_at']
-    date_hierarchy = 'created_at'
     fieldsets = (
         ('Transaction Info', {
             'fields': ('user', 'order_id', 'amount', 'currency', 'status', 'description')
@@ -21,11 +98,40 @@ class TransactionAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        if '@' in search_term:
+            return queryset.filter(user__account__email=normalize_email(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 @admin.register(PaymentLog)
-class PaymentLogAdmin(admin.ModelAdmin):
+class PaymentLogAdmin(LargeTableAdmin):
     list_display = ['event_type', 'transaction', 'message', 'ip_address', 'created_at']
+    # Transaction.__str__ shows the user's email
+    list_select_related = ['transaction__user']
     list_filter = ['event_type', 'created_at']
-    search_fields = ['message', 'transaction__order_id']
+    search_fields = ['transaction__order_id__exact', 'transaction__razorpay_order_id__startswith']
+    search_help_text = 'Order id, or Razorpay order id (or its start)'
+    raw_id_fields = ['transaction']
     readonly_fields = ['created_at']
-    date_hierarchy = 'created_at'
+    changelist_defer = ['payload']
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(LargeTableAdmin):
+    # written by payments/archive.py only
+    list_display = ['order_id', 'user', 'amount', 'currency', 'status', 'created_at', 'archived_at']
+    list_select_related = ['user']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order_id__exact']
+    search_help_text = 'Order id'
+    changelist_defer = ['refunds']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
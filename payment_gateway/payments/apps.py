@@ -3,3 +3,17 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "payments"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        from django.db.backends.signals import connection_created
+        from payment_gateway import caches, metrics, query_checks
+        from . import audit
+        caches.check_object_cache()
+        # does nothing outside query_checks.inspect(), which QUERY_CHECKS['ENABLED'] turns on per request
+        connection_created.connect(query_checks.track_connection)
+        if metrics.metrics_options()['ENABLED']:
+            # times every query, see payment_gateway/metrics.py
+            connection_created.connect(metrics.track_connection)
+            metrics.register_collector(audit.collect_metrics)
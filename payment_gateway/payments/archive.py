@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+
+from .models import ArchivedTransaction, Refund, Transaction
+
+# Finalized transactions past AGE_DAYS move from transactions to transactions_archive
+# with the same id, see the archive_transactions command. The detail, history and
+# export endpoints read both tables, payment_summaries counts both.
+#
+# Readers query transactions first and the archive second. A row moved in between
+# then shows up in both reads and merged() drops the copy. The other order would miss it.
+
+FINAL_STATUSES = ['SUCCESS', 'FAILED', 'REFUNDED']
+
+COLUMNS = [field.attname for field in Transaction._meta.concrete_fields]
+
+REFUND_FIELDS = [
+    'id', 'amount', 'status', 'razorpay_refund_id', 'reason', 'batch', 'error', 'requested_by_id',
+    'created_at', 'updated_at',
+]
+
+
+def archive_options():
+    options = {
+        # Razorpay takes refunds for six months, a year old payment is settled
+        'AGE_DAYS': 365,
+        # rows moved per database transaction
+        'BATCH_SIZE': 500,
+        # seconds between batches, checkout gets the table in between
+        'PAUSE': 0.05,
+    }
+    options.update(getattr(settings, 'TRANSACTION_ARCHIVE', {}))
+    return options
+
+
+def cutoff(age_days, now=None):
+    return (now or timezone.now()) - timedelta(days=age_days)
+
+
+def candidates(cutoff):
+    """Transactions archive_batch would move, oldest first. A refund still PENDING keeps its transaction."""
+    return (
+        Transaction.objects
+        .filter(status__in=FINAL_STATUSES, created_at__lt=cutoff)
+        .exclude(refunds__status='PENDING')
+        .order_by('created_at', 'id')
+    )
+
+
+@db_transaction.atomic
+def archive_batch(cutoff, batch_size):
+    """
+    Moves up to batch_size transactions created before cutoff, returns how many moved.
+
+    Rows another request has locked (a refund being created) are skipped and
+    picked up by a later run. The detail body cached for a transaction stays
+    valid, the archive row serializes the same.
+    """
+    transactions = list(candidates(cutoff).select_for_update(skip_locked=True)[:batch_size])
+    if not transactions:
+        return 0
+    ids = [t.pk for t in transactions]
+
+    refunds = defaultdict(list)
+    rows = Refund.objects.filter(transaction_id__in=ids).order_by('created_at', 'id').values('transaction_id', *REFUND_FIELDS)
+    for refund in rows:
+        refunds[refund.pop('transaction_id')].append(refund)
+
+    ArchivedTransaction.objects.bulk_create([
+        ArchivedTransaction(**{column: getattr(t, column) for column in COLUMNS}, refunds=refunds[t.pk])
+        for t in transactions
+    ])
+    Refund.objects.filter(transaction_id__in=ids).delete()
+    # not .delete(), that would cascade to the payment logs, which stay
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {Transaction._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+    return len(ids)
+
+
+def archive(age_days=None, batch_size=None, pause=None, limit=None, now=None):
+    """Archives transactions in batches until none are left or limit rows moved, returns the count."""
+    options = archive_options()
+    age_days = options['AGE_DAYS'] if age_days is None else age_days
+    batch_size = batch_size or options['BATCH_SIZE']
+    pause = options['PAUSE'] if pause is None else pause
+    before = cutoff(age_days, now)
+
+    moved = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        count = archive_batch(before, size)
+        moved += count
+        if count < size:
+            break
+        time.sleep(pause)
+    return moved
+
+
+def merged(transactions, archived, key, reverse=False):
+    """Merges rows both sorted by key, which includes the id. A row read from both tables comes out once."""
+    last = None
+    for row in heapq.merge(transactions, archived, key=key, reverse=reverse):
+        if last is None or key(row) != last:
+            last = key(row)
+            yield row
+
+
+def history(filters, columns, limit, transactions):
+    """
+    The first limit history rows over both tables, newest first.
+
+    transactions are the rows already read from the transactions table with
+    filters, the archive is read with the same filters after them and the
+    two ordered lists are merged. columns end with id and created_at, the
+    sort key.
+    """
+    archived = ArchivedTransaction.objects.filter(filters).order_by('-created_at', '-id').values_list(*columns)[:limit]
+    rows = merged(transactions, list(archived), key=lambda row: (row[-1], row[-2]), reverse=True)
+    return list(itertools.islice(rows, limit))
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+from razorpay.errors import BadRequestError, GatewayError, ServerError
+
+from payment_gateway import metrics
+
+from .gateway import gateway_options
+
+
+class AsyncGatewayClient:
+    """
+    Minimal asyncio Razorpay client for the ASGI endpoints.
+
+    The semaphore caps in-flight gateway calls per worker, so a slow gateway
+    queues requests here instead of exhausting the connection pool.
+    """
+
+    def __init__(self, key_id, key_secret, options=None):
+        options = options or gateway_options()
+        self.http = httpx.AsyncClient(
+            base_url=options['BASE_URL'],
+            auth=(key_id, key_secret),
+            timeout=httpx.Timeout(options['READ_TIMEOUT'], connect=options['CONNECT_TIMEOUT']),
+            limits=httpx.Limits(
+                max_connections=options['POOL_MAXSIZE'],
+                max_keepalive_connections=options['POOL_MAXSIZE'],
+            ),
+            # only connection failures are retried, the request never reached the gateway
+            transport=httpx.AsyncHTTPTransport(retries=options['RETRIES']),
+        )
+        self.semaphore = asyncio.Semaphore(options['ASYNC_CONCURRENCY'])
+
+    async def request(self, method, path, payload=None):
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self.http.request(method, path, json=payload)
+            except httpx.HTTPError as exc:
+                metrics.observe_gateway(method, path, time.perf_counter() - started, type(exc).__name__)
+                raise
+        error = response.status_code if response.status_code >= 400 else None
+        metrics.observe_gateway(method, path, time.perf_counter() - started, error)
+
+        body = response.json()
+        if 200 <= response.status_code < 300:
+            return body
+
+        error = body.get('error', {})
+        code = str(error.get('code', '')).upper()
+        message = error.get('description', '')
+        if code == 'BAD_REQUEST_ERROR':
+            raise BadRequestError(message)
+        if code == 'GATEWAY_ERROR':
+            raise GatewayError(message)
+        raise ServerError(message)
+
+    async def create_order(self, data):
+        return await self.request('POST', '/v1/orders', data)
+
+    async def fetch_order_payments(self, order_id):
+        return await self.request('GET', f'/v1/orders/{order_id}/payments')
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+# httpx.AsyncClient is bound to the event loop that created it, so clients are kept per loop
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    key = (settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET, gateway_options()['BASE_URL'])
+    clients = _clients.setdefault(loop, {})
+    if key not in clients:
+        clients[key] = AsyncGatewayClient(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    return clients[key]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_clients.clear)
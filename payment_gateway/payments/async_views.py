@@ -0,0 +1,98 @@
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+import razorpay
+
+from .async_gateway import get_async_client
+from .idempotency import async_idempotent
+from .models import Transaction
+from .order_ids import generate_order_id
+from .views import (
+    apply_verification, get_client_ip, order_response, parse_amount, record_order, serialize_transaction,
+)
+
+# ASGI-native variants of the payment endpoints. Serve them with an ASGI worker
+# (gunicorn -k uvicorn.workers.UvicornWorker payment_gateway.asgi:application),
+# under WSGI every call gets its own event loop and nothing is gained.
+
+
+# async_api does what @api_view/@permission_classes do for the sync views: POST only,
+# session auth without CSRF (same as CsrfExemptSessionAuthentication) and a parsed JSON body
+def async_api(view):
+    @csrf_exempt
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'detail': 'JSON parse error.'}, status=400)
+
+        return await view(request, user, data, *args, **kwargs)
+    return wrapper
+
+
+@async_api
+@async_idempotent('create-order')
+async def create_order_async_api(request, user, data):
+    description = data.get('description', 'Payment')
+    amount, error = parse_amount(data.get('amount'))
+    if error:
+        return JsonResponse({'amount': [error]}, status=400)
+
+    if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
+        return JsonResponse({'error': 'Razorpay keys not configured.'}, status=500)
+
+    try:
+        order_id = generate_order_id(user)
+        razorpay_order = await get_async_client().create_order({
+            'amount': int(amount * 100),
+            'currency': 'INR',
+            'receipt': order_id,
+            'payment_capture': 1
+        })
+
+        transaction = await sync_to_async(record_order)(
+            user, order_id, amount, description, razorpay_order, get_client_ip(request)
+        )
+
+        return JsonResponse(order_response(user, transaction, razorpay_order, amount, description))
+
+    except razorpay.errors.BadRequestError:
+        return JsonResponse({'error': 'Authentication failed. Check Razorpay credentials.'}, status=500)
+    except Exception as e:
+        return JsonResponse({'error': f'Error creating order: {str(e)}'}, status=500)
+
+
+@async_api
+@async_idempotent('verify')
+async def verify_payment_async_api(request, user, data):
+    razorpay_order_id = data.get('razorpay_order_id')
+    razorpay_payment_id = data.get('razorpay_payment_id')
+    razorpay_signature = data.get('razorpay_signature')
+
+    try:
+        transaction = await Transaction.objects.aget(razorpay_order_id=razorpay_order_id, user=user)
+    except Transaction.DoesNotExist:
+        return JsonResponse({'error': 'Transaction not found.'}, status=404)
+
+    verified = await sync_to_async(apply_verification)(
+        transaction, razorpay_order_id, razorpay_payment_id, razorpay_signature, get_client_ip(request)
+    )
+    if not verified:
+        return JsonResponse({'error': 'Payment verification failed.'}, status=400)
+
+    return JsonResponse({
+        'message': 'Payment successful.',
+        'transaction': serialize_transaction(transaction)
+    })
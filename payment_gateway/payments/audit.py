@@ -0,0 +1,327 @@
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DataError, IntegrityError, close_old_connections, transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from payment_gateway import metrics
+
+from .models import PaymentLog
+
+# Durability per PaymentLog.event_type, see PAYMENT_LOG in settings.py
+#   sync     written with the request, same as PaymentLog.objects.create
+#   durable  appended and fsynced to the local spill file, bulk inserted by the writer later
+#   async    kept in the in-process queue and bulk inserted, spilled to disk if the DB or queue is unavailable
+SYNC, DURABLE, ASYNC = 'sync', 'durable', 'async'
+
+# a spill file that fails with these fails the same way on every retry
+UNREPLAYABLE = (ValueError, KeyError, TypeError, IntegrityError, DataError)
+
+logger = logging.getLogger(__name__)
+
+
+def log_options():
+    options = {
+        'DEFAULT_DURABILITY': ASYNC,
+        'DURABILITY': {},
+        'QUEUE_SIZE': 10000,
+        'BATCH_SIZE': 200,
+        'FLUSH_INTERVAL': 0.5,
+        'SPILL_PATH': Path(settings.BASE_DIR) / 'var' / 'payment_logs.spill.jsonl',
+        'SPILL_REPLAY_INTERVAL': 30,
+    }
+    options.update(getattr(settings, 'PAYMENT_LOG', {}))
+    return options
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, owned by another user
+        return True
+    return True
+
+
+def entry_to_json(entry):
+    return json.dumps({**entry, 'created_at': entry['created_at'].isoformat()}, default=str)
+
+
+def entry_from_json(line):
+    entry = json.loads(line)
+    entry['created_at'] = parse_datetime(entry['created_at'])
+    return entry
+
+
+class PaymentLogWriter:
+    """
+    Takes PaymentLog inserts off the request path.
+
+    Entries are queued once the surrounding DB transaction commits and a
+    background thread bulk_creates them every BATCH_SIZE entries or
+    FLUSH_INTERVAL seconds, whichever comes first. Anything that cannot be
+    queued or inserted goes to an append-only JSONL spill file which is
+    replayed into the table later.
+    """
+
+    def __init__(self, options=None, autostart=True):
+        self.options = options or log_options()
+        self.autostart = autostart
+        self.queue = queue.Queue(maxsize=self.options['QUEUE_SIZE'])
+        self.spill_path = Path(self.options['SPILL_PATH'])
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'spilled': 0,
+            'replay_failures': 0,
+            'quarantined': 0,
+            'flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'last_flush_seconds': 0.0,
+        }
+        self.thread = None
+        self.pid = None
+        self.stopping = threading.Event()
+        self.last_replay = 0.0
+
+    def durability(self, event_type):
+        return self.options['DURABILITY'].get(event_type, self.options['DEFAULT_DURABILITY'])
+
+    def log(self, transaction=None, event_type='', payload=None, message='', ip_address=None):
+        entry = {
+            'transaction_id': transaction.pk if transaction is not None else None,
+            'event_type': event_type,
+            'payload': payload,
+            'message': message,
+            'ip_address': ip_address,
+            'created_at': timezone.now(),
+        }
+        mode = self.durability(event_type)
+        if mode == SYNC:
+            return PaymentLog.objects.create(**entry)
+        # rows must not show up for a transaction that is rolled back
+        if mode == DURABLE:
+            db_transaction.on_commit(lambda: self.spill([entry], fsync=True))
+        else:
+            db_transaction.on_commit(lambda: self.enqueue(entry))
+
+    def enqueue(self, entry):
+        self.ensure_started()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.spill([entry])
+            return
+        self.count('enqueued')
+
+    def ensure_started(self):
+        if not self.autostart or (self.thread is not None and self.pid == os.getpid()):
+            return
+        with self.stats_lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            # a forked child inherits the queue object but not the thread
+            self.pid = os.getpid()
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name='payment-log-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stopping.is_set():
+            batch = self.take_batch(self.options['FLUSH_INTERVAL'])
+            if batch:
+                self.flush(batch)
+            if time.monotonic() - self.last_replay > self.options['SPILL_REPLAY_INTERVAL']:
+                try:
+                    self.replay_spill()
+                except Exception:
+                    # the claimed file stays on disk and is retried next interval
+                    logger.exception('Replaying %s failed', self.spill_path)
+            close_old_connections()
+
+    def take_batch(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.options['BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, entries):
+        started = time.perf_counter()
+        try:
+            PaymentLog.objects.bulk_create([PaymentLog(**entry) for entry in entries], batch_size=self.options['BATCH_SIZE'])
+        except Exception:
+            self.spill(entries)
+            return False
+        finally:
+            self.record_flush(time.perf_counter() - started)
+        self.count('written', len(entries))
+        return True
+
+    def drain(self):
+        """Flush everything queued in the calling thread, for shutdown, tests and the management command."""
+        while True:
+            batch = self.take_batch(0)
+            if not batch:
+                return
+            self.flush(batch)
+
+    @contextmanager
+    def spill_lock(self, exclusive):
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.spill_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def spill(self, entries, fsync=False):
+        data = ''.join(entry_to_json(entry) + '\n' for entry in entries)
+        # appends share the lock, replay takes it exclusively while it moves the file away
+        with self.spill_lock(exclusive=False):
+            with open(self.spill_path, 'a') as spill_file:
+                spill_file.write(data)
+                spill_file.flush()
+                if fsync:
+                    os.fsync(spill_file.fileno())
+        self.count('spilled', len(entries))
+
+    def replay_spill(self):
+        """Load the spill file into payment_logs, returns the number of rows written."""
+        self.last_replay = time.monotonic()
+        claimed = self.spill_path.with_name(f"{self.spill_path.name}.{os.getpid()}.replay")
+        if not claimed.exists():
+            with self.spill_lock(exclusive=True):
+                if not self.spill_path.exists():
+                    return 0
+                os.replace(self.spill_path, claimed)
+        return self.replay_file(claimed)
+
+    def claimed_files(self):
+        """Claimed spill files as (pid of the claiming process, path)."""
+        prefix = f"{self.spill_path.name}."
+        for path in sorted(self.spill_path.parent.glob(f"{self.spill_path.name}.*.replay")):
+            owner = path.name[len(prefix):].split('.')[0]
+            if owner.isdigit():
+                yield int(owner), path
+
+    def replay_orphans(self):
+        """
+        Replays the files claimed by processes that have exited, returns the rows written.
+
+        A live owner may be replaying its file right now, so it is left alone.
+        An orphan is renamed to a name of this process before it is read, the
+        rename succeeds for one of two commands racing for it.
+        """
+        written = 0
+        prefix = f"{self.spill_path.name}."
+        for owner, path in self.claimed_files():
+            if owner == os.getpid() or pid_alive(owner):
+                continue
+            adopted = path.with_name(f"{prefix}{os.getpid()}.{path.name[len(prefix):]}")
+            try:
+                os.rename(path, adopted)
+            except FileNotFoundError:
+                continue
+            written += self.replay_file(adopted)
+        return written
+
+    def replay_file(self, path):
+        """
+        Loads one claimed file, all or nothing, returns the rows written.
+
+        A database outage leaves the file for the next attempt. A file with a
+        row that cannot be parsed or inserted is moved to .failed, otherwise
+        it would fail forever and its pid would never claim new spill data.
+        """
+        try:
+            with open(path) as spill_file:
+                entries = [entry_from_json(line) for line in spill_file if line.strip()]
+            with db_transaction.atomic():
+                PaymentLog.objects.bulk_create([PaymentLog(**entry) for entry in entries], batch_size=self.options['BATCH_SIZE'])
+        except UNREPLAYABLE as error:
+            self.count('replay_failures')
+            self.quarantine(path, error)
+            return 0
+        except Exception:
+            self.count('replay_failures')
+            raise
+        path.unlink()
+        self.count('written', len(entries))
+        return len(entries)
+
+    def quarantine(self, path, error):
+        failed = path.with_name(f"{path.name}.failed")
+        os.replace(path, failed)
+        self.count('quarantined')
+        logger.error('Could not replay %s, moved to %s for inspection: %r', path, failed, error)
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def record_flush(self, seconds):
+        with self.stats_lock:
+            self.stats['flushes'] += 1
+            self.stats['flush_seconds_total'] += seconds
+            self.stats['flush_seconds_max'] = max(self.stats['flush_seconds_max'], seconds)
+            self.stats['last_flush_seconds'] = seconds
+        metrics.observe('payment_log_flush_duration_seconds', (), seconds)
+
+    def metrics(self):
+        with self.stats_lock:
+            return {**self.stats, 'queue_depth': self.queue.qsize()}
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None and self.pid == os.getpid():
+            self.thread.join(timeout=self.options['FLUSH_INTERVAL'] * 2)
+        self.drain()
+
+
+writer = PaymentLogWriter()
+atexit.register(lambda: writer.close())
+
+
+def log_payment_event(transaction=None, event_type='', payload=None, message='', ip_address=None):
+    return writer.log(transaction, event_type, payload, message, ip_address)
+
+
+def collect_metrics():
+    """The current writer's numbers for /metrics, registered in PaymentsConfig.ready()."""
+    stats = writer.metrics()
+    return {
+        ('payment_log_queue_depth', ()): stats['queue_depth'],
+        ('payment_log_entries_total', (('outcome', 'written'),)): stats['written'],
+        ('payment_log_entries_total', (('outcome', 'spilled'),)): stats['spilled'],
+        ('payment_log_replay_failures_total', ()): stats['replay_failures'],
+        ('payment_log_quarantined_total', ()): stats['quarantined'],
+    }
+
+
+def reset_writer(**kwargs):
+    global writer
+    if kwargs.get('setting') == 'PAYMENT_LOG':
+        writer = PaymentLogWriter()
+
+
+setting_changed.connect(reset_writer)
@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+
+from . import archive
+from .models import ArchivedTransaction, PaymentLog, Transaction
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# What each export reads, rows come out of values_list as plain tuples in this column order
+EXPORTS = {
+    'transactions': {
+        'model': Transaction,
+        # old finalized transactions, read after the model, see payments/archive.py
+        'archive': ArchivedTransaction,
+        'fields': [
+            'id', 'order_id', 'user_id', 'user__email', 'amount', 'currency', 'status',
+            'razorpay_order_id', 'razorpay_payment_id', 'description', 'created_at', 'updated_at',
+        ],
+        'status_field': 'status',
+        'statuses': [value for value, _ in Transaction.STATUS],
+    },
+    'logs': {
+        'model': PaymentLog,
+        'fields': [
+            'id', 'transaction_id', 'transaction__order_id', 'event_type', 'message', 'ip_address', 'payload', 'created_at',
+        ],
+        'status_field': 'event_type',
+        'statuses': [value for value, _ in PaymentLog.EVENT],
+    },
+}
+
+
+def export_options():
+    options = {
+        'CHUNK_SIZE': 2000,
+        'BUFFER_SIZE': 64 * 1024,
+    }
+    options.update(getattr(settings, 'EXPORTS', {}))
+    return options
+
+
+def header(kind):
+    return [field.replace('__', '_') for field in EXPORTS[kind]['fields']]
+
+
+def filename(kind, fmt, compress=False):
+    return f"{kind}-{datetime.now():%Y%m%d%H%M%S}.{fmt}{'.gz' if compress else ''}"
+
+
+def content_type(fmt, compress=False):
+    return 'application/gzip' if compress else FORMATS[fmt]
+
+
+def export_rows(kind, statuses=None, created_after=None, created_before=None, chunk_size=None):
+    """
+    Row tuples for an export, read in chunk_size batches.
+
+    .iterator() uses a server-side cursor on PostgreSQL and skips the queryset
+    cache, so only one chunk of rows is held at a time. Exports with an
+    archive table merge its rows in by id.
+    """
+    spec = EXPORTS[kind]
+    filters = {}
+    if statuses:
+        filters[f"{spec['status_field']}__in"] = statuses
+    if created_after:
+        filters['created_at__gte'] = created_after
+    if created_before:
+        filters['created_at__lt'] = created_before
+    chunk_size = chunk_size or export_options()['CHUNK_SIZE']
+
+    def read(model):
+        return model.objects.filter(**filters).order_by('id').values_list(*spec['fields']).iterator(chunk_size=chunk_size)
+
+    if 'archive' not in spec:
+        return read(spec['model'])
+    # id is the first field, heapq.merge opens the model's cursor first
+    return archive.merged(read(spec['model']), read(spec['archive']), key=lambda row: row[0])
+
+
+def cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def encode(rows, columns, fmt, buffer_size):
+    """Rows as CSV or JSON lines, yielded in byte chunks of about buffer_size."""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+        def write(row):
+            writer.writerow([cell(value) for value in row])
+    else:
+        def write(row):
+            # payload stays a JSON object here, Decimal amounts are written as strings
+            values = (value.isoformat() if isinstance(value, datetime) else value for value in row)
+            buffer.write(json.dumps(dict(zip(columns, values)), default=str))
+            buffer.write('\n')
+
+    for row in rows:
+        write(row)
+        if buffer.tell() >= buffer_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(kind, rows, fmt='csv', compress=False):
+    """Byte chunks of the whole export, for StreamingHttpResponse or a file."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    chunks = encode(rows, header(kind), fmt, export_options()['BUFFER_SIZE'])
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import razorpay
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from payment_gateway import metrics
+
+
+# Only calls that are safe to repeat get retried, a retried POST /orders would create a second order
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default (connect, read) timeout, razorpay.Client never passes one."""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        # every razorpay.Client call ends up here, retries included in the timing
+        path = urlsplit(request.url).path
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.RequestException as exc:
+            metrics.observe_gateway(request.method, path, time.perf_counter() - started, type(exc).__name__)
+            raise
+        error = response.status_code if response.status_code >= 400 else None
+        metrics.observe_gateway(request.method, path, time.perf_counter() - started, error)
+        return response
+
+
+def gateway_options():
+    options = {
+        'BASE_URL': razorpay.Client.DEFAULTS['base_url'],
+        'POOL_CONNECTIONS': 4,
+        'POOL_MAXSIZE': 16,
+        'CONNECT_TIMEOUT': 3.05,
+        'READ_TIMEOUT': 15,
+        'RETRIES': 3,
+        'BACKOFF_FACTOR': 0.3,
+        'ASYNC_CONCURRENCY': 64,
+    }
+    options.update(getattr(settings, 'RAZORPAY_HTTP', {}))
+    return options
+
+
+def build_session(options=None):
+    options = options or gateway_options()
+    retry = Retry(
+        total=options['RETRIES'],
+        backoff_factor=options['BACKOFF_FACTOR'],
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=options['POOL_CONNECTIONS'],
+        pool_maxsize=options['POOL_MAXSIZE'],
+        max_retries=retry,
+        timeout=(options['CONNECT_TIMEOUT'], options['READ_TIMEOUT']),
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class ClientRegistry:
+    """
+    One razorpay.Client per (key id, key secret, base url) per process.
+
+    Clients share a keep-alive session, so checkouts reuse pooled connections
+    instead of opening a new TLS connection to the gateway every time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.pid = os.getpid()
+
+    def get(self, key_id, key_secret):
+        if self.pid != os.getpid():
+            self.forget()
+        options = gateway_options()
+        key = (key_id, key_secret, options['BASE_URL'])
+        client = self.clients.get(key)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+                if client is None:
+                    client = razorpay.Client(
+                        session=build_session(options),
+                        auth=(key_id, key_secret),
+                        base_url=options['BASE_URL'],
+                    )
+                    self.clients[key] = client
+        return client
+
+    def forget(self):
+        # After fork the sockets are shared with the parent, drop them without closing
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.pid = os.getpid()
+
+    def close(self):
+        with self.lock:
+            clients, self.clients = self.clients, {}
+        for client in clients.values():
+            client.session.close()
+
+
+registry = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.forget)
+
+
+def get_client():
+    return registry.get(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+
+
+def reset_clients(**kwargs):
+    if kwargs.get('setting') in (None, 'RAZORPAY_HTTP', 'RAZORPAY_KEY_ID', 'RAZORPAY_KEY_SECRET'):
+        registry.close()
+
+
+setting_changed.connect(reset_clients)
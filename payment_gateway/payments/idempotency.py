@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+BAD_KEY = {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'}
+KEY_REUSED = {'error': f'{HEADER} was already used for a different request.'}
+IN_PROGRESS = {'error': f'A request with this {HEADER} is still in progress.'}
+
+
+def idempotency_options():
+    options = {
+        'CACHE': 'default',
+        'TTL': 24 * 60 * 60,
+        'WAIT_TIMEOUT': 10,
+        'POLL_INTERVAL': 0.05,
+        'LOCK_TIMEOUT': 60,
+    }
+    options.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return options
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cache_key(user_id, endpoint, key):
+    # keys are client supplied, hash them so any value is a valid memcached key
+    return f"idempotency:{user_id}:{endpoint}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def stored_response(user_id, endpoint, key):
+    """Finished response for a key as {'request_hash', 'status', 'body'}, local cache first, then the table."""
+    options = idempotency_options()
+    cache = caches[options['CACHE']]
+    ck = cache_key(user_id, endpoint, key)
+    stored = cache.get(ck)
+    if stored is not None:
+        return stored
+
+    row = (
+        IdempotencyKey.objects
+        .filter(user_id=user_id, endpoint=endpoint, key=key, status_code__isnull=False,
+                created_at__gte=timezone.now() - timedelta(seconds=options['TTL']))
+        .values('request_hash', 'status_code', 'response')
+        .first()
+    )
+    if row is None:
+        return None
+    stored = {'request_hash': row['request_hash'], 'status': row['status_code'], 'body': row['response']}
+    cache.set(ck, stored, options['TTL'])
+    return stored
+
+
+def claim(user, endpoint, key, request_hash):
+    """
+    Returns the IdempotencyKey row when this request gets to run, else None.
+
+    The unique constraint decides between concurrent duplicates. Expired keys
+    and claims left behind by a crashed worker are taken over.
+    """
+    options = idempotency_options()
+    for _ in range(2):
+        try:
+            with db_transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, endpoint=endpoint, key=key, request_hash=request_hash)
+        except IntegrityError:
+            now = timezone.now()
+            expired = Q(created_at__lt=now - timedelta(seconds=options['TTL']))
+            abandoned = Q(status_code__isnull=True, created_at__lt=now - timedelta(seconds=options['LOCK_TIMEOUT']))
+            stale = IdempotencyKey.objects.filter(expired | abandoned, user=user, endpoint=endpoint, key=key)
+            if not stale.delete()[0]:
+                return None
+    return None
+
+
+def finish(record, status, body):
+    if status >= 500:
+        # nothing was promised to the client, let a retry run the request again
+        release(record)
+        return
+    record.status_code = status
+    record.response = body
+    record.save(update_fields=['status_code', 'response'])
+    options = idempotency_options()
+    caches[options['CACHE']].set(
+        cache_key(record.user_id, record.endpoint, record.key),
+        {'request_hash': record.request_hash, 'status': status, 'body': body},
+        options['TTL'],
+    )
+
+
+def release(record):
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def begin(user, endpoint, key, request_hash):
+    """('run', row) when the caller should handle the request, ('replay', stored) or ('wait', None) otherwise."""
+    stored = stored_response(user.pk, endpoint, key)
+    if stored is not None:
+        return 'replay', stored
+    record = claim(user, endpoint, key, request_hash)
+    if record is not None:
+        return 'run', record
+    stored = stored_response(user.pk, endpoint, key)
+    return ('replay', stored) if stored is not None else ('wait', None)
+
+
+def wait_for(user_id, endpoint, key):
+    options = idempotency_options()
+    deadline = time.monotonic() + options['WAIT_TIMEOUT']
+    while time.monotonic() < deadline:
+        time.sleep(options['POLL_INTERVAL'])
+        stored = stored_response(user_id, endpoint, key)
+        if stored is not None:
+            return stored
+    return None
+
+
+async def await_for(user_id, endpoint, key):
+    options = idempotency_options()
+    deadline = time.monotonic() + options['WAIT_TIMEOUT']
+    while time.monotonic() < deadline:
+        await asyncio.sleep(options['POLL_INTERVAL'])
+        stored = await sync_to_async(stored_response)(user_id, endpoint, key)
+        if stored is not None:
+            return stored
+    return None
+
+
+def replay(stored, request_hash, response_class):
+    if stored is None:
+        return response_class(IN_PROGRESS, status=409)
+    if stored['request_hash'] != request_hash:
+        return response_class(KEY_REUSED, status=422)
+    response = response_class(stored['body'], status=stored['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(endpoint):
+    """
+    Idempotency-Key support for DRF function views, goes under @permission_classes.
+
+    The first request with a key runs the view and its response is kept for
+    IDEMPOTENCY['TTL'] seconds, in the cache and in the idempotency_keys table
+    for other workers. Retries get that response back, duplicates that arrive
+    while the first one is still running wait for it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(BAD_KEY, status=400)
+
+            request_hash = fingerprint(request.data)
+            outcome, value = begin(request.user, endpoint, key, request_hash)
+            if outcome == 'wait':
+                value = wait_for(request.user.pk, endpoint, key)
+            if outcome != 'run':
+                return replay(value, request_hash, Response)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                release(value)
+                raise
+            # store what the client saw on the wire, not the Python objects
+            finish(value, response.status_code, json.loads(JSONRenderer().render(response.data)))
+            return response
+        return wrapper
+    return decorator
+
+
+def async_idempotent(endpoint):
+    """idempotent() for the async_api views in payments/async_views.py, goes under @async_api."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, user, data, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return await view(request, user, data, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return JsonResponse(BAD_KEY, status=400)
+
+            request_hash = fingerprint(data)
+            outcome, value = await sync_to_async(begin)(user, endpoint, key, request_hash)
+            if outcome == 'wait':
+                value = await await_for(user.pk, endpoint, key)
+            if outcome != 'run':
+                return replay(value, request_hash, JsonResponse)
+
+            try:
+                response = await view(request, user, data, *args, **kwargs)
+            except BaseException:
+                await sync_to_async(release)(value)
+                raise
+            await sync_to_async(finish)(value, response.status_code, json.loads(response.content))
+            return response
+        return wrapper
+    return decorator
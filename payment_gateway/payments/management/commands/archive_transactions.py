@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move finalized transactions older than --age-days to transactions_archive in short batches. '
+        'Run it daily from cron'
+    )
+
+    def add_arguments(self, parser):
+        options = archive.archive_options()
+        parser.add_argument('--age-days', type=int, default=options['AGE_DAYS'])
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+        parser.add_argument('--pause', type=float, default=options['PAUSE'], help='Seconds to sleep between batches')
+        parser.add_argument('--limit', type=int, help='Stop after moving this many transactions')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be moved')
+
+    def handle(self, *args, **options):
+        if options['age_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--age-days and --batch-size must be at least 1')
+
+        if options['dry_run']:
+            cutoff = archive.cutoff(options['age_days'])
+            self.stdout.write(f'would archive {archive.candidates(cutoff).count()} transactions created before {cutoff:%Y-%m-%d}')
+            return
+
+        moved = archive.archive(
+            age_days=options['age_days'], batch_size=options['batch_size'], pause=options['pause'], limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} transactions'))
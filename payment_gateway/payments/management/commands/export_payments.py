@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import exports
+from payments.views import parse_date_param
+
+
+class Command(BaseCommand):
+    help = 'Stream transactions or payment logs to a CSV or JSON lines file, same output as /api/payments/export/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(exports.EXPORTS))
+        parser.add_argument('--format', dest='fmt', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--status', help='Comma separated statuses, event types for logs')
+        parser.add_argument('--created-after', help='YYYY-MM-DD or an ISO datetime')
+        parser.add_argument('--created-before', help='YYYY-MM-DD or an ISO datetime')
+        parser.add_argument('--output', help='File to write, stdout when left out')
+        parser.add_argument('--chunk-size', type=int, default=exports.export_options()['CHUNK_SIZE'])
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        statuses = None
+        if options['status']:
+            statuses = options['status'].upper().split(',')
+            unknown = set(statuses) - set(exports.EXPORTS[kind]['statuses'])
+            if unknown:
+                raise CommandError(f"Unknown status: {', '.join(sorted(unknown))}")
+
+        dates = {}
+        for name in ('created_after', 'created_before'):
+            if options[name]:
+                dates[name] = parse_date_param(options[name])
+                if dates[name] is None:
+                    raise CommandError(f"--{name.replace('_', '-')} is not a valid date")
+
+        rows = exports.export_rows(kind, statuses, chunk_size=options['chunk_size'], **dates)
+        chunks = exports.stream(kind, rows, options['fmt'], options['gzip'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                written = self.write(chunks, output)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+        else:
+            self.write(chunks, sys.stdout.buffer)
+
+    def write(self, chunks, output):
+        written = 0
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+        output.flush()
+        return written
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from payments import audit
+
+
+class Command(BaseCommand):
+    help = 'Load spilled PaymentLog entries from the local spill file into the database'
+
+    def handle(self, *args, **options):
+        writer = audit.writer
+        # and the files claimed by workers that died mid replay, live workers replay their own
+        written = writer.replay_spill() + writer.replay_orphans()
+
+        self.stdout.write(self.style.SUCCESS(f'Replayed {written} payment log entries from {writer.spill_path}'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the coming monthly payment_logs partitions, archive the expired ones to gzipped JSON lines '
+        'and drop them. Run it daily from cron, Postgres only'
+    )
+
+    def add_arguments(self, parser):
+        options = partitions.partition_options()
+        parser.add_argument('--months-ahead', type=int, default=options['MONTHS_AHEAD'])
+        parser.add_argument('--retention-months', type=int, default=options['RETENTION_MONTHS'])
+        parser.add_argument('--archive-dir', default=str(options['ARCHIVE_DIR']))
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be created and dropped')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('payment_logs is not a partitioned table, partitioning needs Postgres (migration 0011)')
+        if options['retention_months'] < 1:
+            raise CommandError('--retention-months must be at least 1, the current month is never dropped')
+
+        now = timezone.now()
+        expired = partitions.expired_partitions(options['retention_months'], now)
+
+        if options['dry_run']:
+            for month in partitions.missing_months(options['months_ahead'], now):
+                self.stdout.write(f'would create {partitions.partition_name(month)}')
+            for _, name in expired:
+                self.stdout.write(f'would archive and drop {name}')
+            return
+
+        for name in partitions.ensure_partitions(options['months_ahead'], now):
+            self.stdout.write(f'created {name}')
+
+        for month, name in expired:
+            rows, path = partitions.archive_partition(month, name, options['archive_dir'])
+            self.stdout.write(f'archived {rows} rows of {name} to {path} and dropped it')
+
+        stray = partitions.default_rows()
+        if stray:
+            self.stderr.write(self.style.WARNING(
+                f'{stray} rows are in {partitions.DEFAULT_PARTITION}, creating their month partitions moves them'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'{len(partitions.partitions())} monthly partitions'))
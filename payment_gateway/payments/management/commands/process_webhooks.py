@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.models import WebhookEvent
+from payments.webhooks import process_event
+
+
+class Command(BaseCommand):
+    help = 'Apply webhook events that were stored but never processed, e.g. after a worker restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=60, help='Seconds an event has to be waiting')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry events that failed before')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        statuses = ['RECEIVED', 'FAILED'] if options['retry_failed'] else ['RECEIVED']
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+        events = WebhookEvent.objects.filter(status__in=statuses, received_at__lt=cutoff).order_by('received_at')
+
+        processed = 0
+        for event in events.iterator(chunk_size=options['chunk_size']):
+            # False when the background processor got to it first
+            processed += process_event(event, statuses)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} webhook events'))
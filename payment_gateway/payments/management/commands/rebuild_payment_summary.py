@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments import summary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the payment_summaries table from transactions and check it against a full recompute'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only compare, do not rebuild')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            buckets = summary.rebuild()
+            self.stdout.write(f'Rebuilt {buckets} summary buckets')
+
+        mismatches = summary.differences()
+        for (user_id, day, status, currency), (stored, expected) in sorted(mismatches.items(), key=str):
+            self.stdout.write(f'user={user_id} day={day} status={status} currency={currency}: stored={stored} expected={expected}')
+
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} summary buckets differ from the transactions table')
+        self.stdout.write(self.style.SUCCESS('Payment summary matches transactions'))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.reconciliation import Reconciler, reconcile_options
+
+
+class Command(BaseCommand):
+    help = 'Resolve stale PENDING transactions against the gateway, once or every --every seconds'
+
+    def add_arguments(self, parser):
+        options = reconcile_options()
+        parser.add_argument('--older-than', type=int, default=options['OLDER_THAN_MINUTES'], help='Minutes a transaction has to be pending')
+        parser.add_argument(
+            '--expire-after', type=int, default=options['EXPIRE_AFTER_MINUTES'],
+            help='Minutes after which an order with no payment attempt is marked FAILED',
+        )
+        parser.add_argument('--chunk-size', type=int, default=options['CHUNK_SIZE'])
+        parser.add_argument('--concurrency', type=int, default=options['CONCURRENCY'], help='Gateway lookups in flight')
+        parser.add_argument('--rate-limit', type=float, default=options['RATE_LIMIT'], help='Gateway lookups per second')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+        parser.add_argument('--every', type=int, default=0, help='Keep running, one pass every N seconds')
+
+    def handle(self, *args, **options):
+        settings = {
+            **reconcile_options(),
+            'EXPIRE_AFTER_MINUTES': options['expire_after'],
+            'CHUNK_SIZE': options['chunk_size'],
+            'CONCURRENCY': options['concurrency'],
+            'RATE_LIMIT': options['rate_limit'],
+        }
+        resume = not options['restart']
+        while True:
+            started = time.monotonic()
+            stats = Reconciler(options=settings).run(older_than=options['older_than'], resume=resume)
+            self.stdout.write(self.style.SUCCESS(
+                'Reconciled {checked} pending transactions: {succeeded} succeeded, {failed} failed, '
+                '{expired} of them abandoned, {unchanged} unchanged, {skipped} already resolved, {errors} errors'.format(**stats)
+            ))
+            if not options['every']:
+                return
+            resume = True
+            time.sleep(max(0, options['every'] - (time.monotonic() - started)))
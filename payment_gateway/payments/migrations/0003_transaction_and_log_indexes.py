@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "payments",
+            "0002_alter_paymentlog_options_alter_transaction_options_and_more",
+        ),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="paymentlog",
+            index=models.Index(
+                fields=["transaction", "created_at"], name="plog_txn_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="paymentlog",
+            index=models.Index(fields=["-created_at"], name="plog_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="txn_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["razorpay_order_id"], name="txn_razorpay_order_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["razorpay_payment_id"], name="txn_razorpay_payment_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(("status", "PENDING")),
+                fields=["created_at"],
+                name="txn_pending_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0003_transaction_and_log_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="paymentlog",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
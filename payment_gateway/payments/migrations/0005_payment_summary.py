@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_summaries(apps, schema_editor):
+    Transaction = apps.get_model("payments", "Transaction")
+    PaymentSummary = apps.get_model("payments", "PaymentSummary")
+    rows = (
+        Transaction.objects.annotate(day=TruncDate("created_at"))
+        .values("user_id", "day", "status", "currency")
+        .annotate(count=Count("id"), total=Sum("amount"))
+        .order_by()
+    )
+    PaymentSummary.objects.bulk_create(
+        [PaymentSummary(**row) for row in rows.iterator()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0004_paymentlog_created_at_default"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("SUCCESS", "Success"),
+                            ("FAILED", "Failed"),
+                            ("REFUNDED", "Refunded"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("currency", models.CharField(default="INR", max_length=3)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "payment_summaries",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "day", "status", "currency"),
+                        name="payment_summary_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0007_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="paymentlog",
+            name="event_type",
+            field=models.CharField(
+                choices=[
+                    ("ORDER_CREATED", "Order Created"),
+                    ("PAYMENT_SUCCESS", "Payment Success"),
+                    ("PAYMENT_FAILED", "Payment Failed"),
+                    ("PAYMENT_REFUNDED", "Payment Refunded"),
+                    ("WEBHOOK_RECEIVED", "Webhook Received"),
+                    ("SIGNATURE_VERIFIED", "Signature Verified"),
+                    ("SIGNATURE_FAILED", "Signature Failed"),
+                ],
+                max_length=50,
+            ),
+        ),
+    ]
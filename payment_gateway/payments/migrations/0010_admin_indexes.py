@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+# transactions takes checkout writes the whole time, so on Postgres every index is built
+# and dropped CONCURRENTLY, outside a transaction. The pattern ops indexes replace the
+# plain ones under temporary names first, lookups by Razorpay id always have an index.
+
+from django.conf import settings
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class AddIndexConcurrently(operations.AddIndexConcurrently):
+    # other databases, the SQLite test database for one, have no CONCURRENTLY
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return migrations.AddIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return migrations.AddIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+
+class RemoveIndexConcurrently(operations.RemoveIndexConcurrently):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return migrations.RemoveIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return migrations.RemoveIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("payments", "0009_refund"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(
+                fields=["razorpay_order_id"],
+                name="txn_razorpay_order_new",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(
+                fields=["razorpay_payment_id"],
+                name="txn_razorpay_payment_new",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="transaction",
+            name="txn_razorpay_order_idx",
+        ),
+        RemoveIndexConcurrently(
+            model_name="transaction",
+            name="txn_razorpay_payment_idx",
+        ),
+        migrations.RenameIndex(
+            model_name="transaction",
+            new_name="txn_razorpay_order_idx",
+            old_name="txn_razorpay_order_new",
+        ),
+        migrations.RenameIndex(
+            model_name="transaction",
+            new_name="txn_razorpay_payment_idx",
+            old_name="txn_razorpay_payment_new",
+        ),
+        AddIndexConcurrently(
+            model_name="transaction",
+            index=models.Index(fields=["-created_at", "-id"], name="txn_created_idx"),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Range partitions payment_logs by month on created_at, Postgres only.
+# The model is unchanged, on other databases this migration does nothing.
+
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+MONTHS_AHEAD = 3
+
+COLUMNS = """
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    event_type varchar(50) NOT NULL,
+    payload jsonb NULL,
+    message text NOT NULL,
+    ip_address inet NULL,
+    created_at timestamp with time zone NOT NULL,
+    transaction_id bigint NULL
+"""
+COLUMN_NAMES = (
+    "id, event_type, payload, message, ip_address, created_at, transaction_id"
+)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def rebuild(cursor, create_sql, old_name):
+    """Moves payment_logs to old_name and creates the new table with create_sql."""
+    cursor.execute(f"ALTER TABLE payment_logs RENAME TO {old_name}")
+    # the index names move to the new table
+    cursor.execute(
+        "ALTER INDEX plog_txn_created_idx RENAME TO plog_txn_created_idx_old"
+    )
+    cursor.execute("ALTER INDEX plog_created_idx RENAME TO plog_created_idx_old")
+    cursor.execute(create_sql)
+
+
+def finish(cursor, old_name):
+    """Copies the rows over, drops old_name and puts the indexes and foreign key back."""
+    cursor.execute(
+        f"INSERT INTO payment_logs ({COLUMN_NAMES}) SELECT {COLUMN_NAMES} FROM {old_name}"
+    )
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('payment_logs', 'id'), "
+        "COALESCE((SELECT max(id) FROM payment_logs), 0) + 1, false)"
+    )
+    cursor.execute(f"DROP TABLE {old_name}")
+    cursor.execute(
+        "CREATE INDEX plog_txn_created_idx ON payment_logs (transaction_id, created_at)"
+    )
+    cursor.execute("CREATE INDEX plog_created_idx ON payment_logs (created_at DESC)")
+    cursor.execute(
+        "ALTER TABLE payment_logs ADD CONSTRAINT payment_logs_transaction_id_fk_transactions_id "
+        "FOREIGN KEY (transaction_id) REFERENCES transactions (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE payment_logs IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("SELECT min(created_at) FROM payment_logs")
+        oldest = cursor.fetchone()[0]
+        rebuild(
+            cursor,
+            f"CREATE TABLE payment_logs ({COLUMNS}, PRIMARY KEY (id, created_at)) "
+            "PARTITION BY RANGE (created_at)",
+            "payment_logs_unpartitioned",
+        )
+        now = datetime.now(timezone.utc)
+        month = datetime(
+            (oldest or now).year, (oldest or now).month, 1, tzinfo=timezone.utc
+        )
+        last = add_months(
+            datetime(now.year, now.month, 1, tzinfo=timezone.utc), MONTHS_AHEAD
+        )
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE payment_logs_y{month.year:04d}m{month.month:02d} PARTITION OF payment_logs "
+                "FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+            month = add_months(month, 1)
+        cursor.execute(
+            "CREATE TABLE payment_logs_default PARTITION OF payment_logs DEFAULT"
+        )
+        finish(cursor, "payment_logs_unpartitioned")
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE payment_logs IN ACCESS EXCLUSIVE MODE")
+        rebuild(
+            cursor,
+            f"CREATE TABLE payment_logs ({COLUMNS}, PRIMARY KEY (id))",
+            "payment_logs_partitioned",
+        )
+        finish(cursor, "payment_logs_partitioned")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0010_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
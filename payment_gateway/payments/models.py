@@ -1,4 +1,6 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
@@ -10,7 +12,8 @@ class Transaction(models.Model):
         ("REFUNDED", "Refunded"),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # no index of its own, txn_user_created_idx starts with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     order_id = models.CharField(max_length=100, unique=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, default="INR")
@@ -29,6 +32,18 @@ class Transaction(models.Model):
     class Meta:
         db_table = 'transactions'
         ordering = ["-created_at"]
+        # tests/test_query_plans.py checks each endpoint query still uses these
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='txn_user_created_idx'),
+            # pattern ops serve prefix searches in the admin (LIKE 'pay_abc%') as well as equality
+            models.Index(fields=['razorpay_order_id'], name='txn_razorpay_order_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(
+                fields=['razorpay_payment_id'], name='txn_razorpay_payment_idx', opclasses=['varchar_pattern_ops']
+            ),
+            # the admin changelist, newest first and filtered by date
+            models.Index(fields=['-created_at', '-id'], name='txn_created_idx'),
+            models.Index(fields=['created_at'], name='txn_pending_created_idx', condition=models.Q(status='PENDING')),
+        ]
 
     def __str__(self):
         return f"{self.order_id} | {self.user.email} | {self.status}"
@@ -39,21 +54,165 @@ class PaymentLog(models.Model):
         ("ORDER_CREATED", "Order Created"),
         ("PAYMENT_SUCCESS", "Payment Success"),
         ("PAYMENT_FAILED", "Payment Failed"),
+        ("PAYMENT_REFUNDED", "Payment Refunded"),
         ("WEBHOOK_RECEIVED", "Webhook Received"),
         ("SIGNATURE_VERIFIED", "Signature Verified"),
         ("SIGNATURE_FAILED", "Signature Failed"),
     ]
 
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, null=True, blank=True)
+    # no database constraint, logs keep the id of a transaction moved to transactions_archive
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, null=True, blank=True, db_constraint=False)
     event_type = models.CharField(max_length=50, choices=EVENT)
     payload = models.JSONField(blank=True, null=True)
     message = models.TextField(blank=True, default='')
     ip_address = models.GenericIPAddressField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add, the batched writer in payments/audit.py stamps the time the event happened
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = 'payment_logs'
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['transaction', 'created_at'], name='plog_txn_created_idx'),
+            models.Index(fields=['-created_at'], name='plog_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} | {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class ArchivedTransaction(models.Model):
+    # Finalized transactions moved out of the transactions table by payments/archive.py,
+    # same id and columns. Their refunds are kept inline, payment logs still point at the id
+    id = models.BigIntegerField(primary_key=True)
+    # the history index below starts with user, a second index on it alone would only cost writes
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, related_name='+')
+    order_id = models.CharField(max_length=100, unique=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default="INR")
+    status = models.CharField(max_length=20, choices=Transaction.STATUS)
+
+    razorpay_order_id = models.CharField(max_length=100, blank=True, default='')
+    razorpay_payment_id = models.CharField(max_length=100, blank=True, default='')
+    razorpay_signature = models.CharField(max_length=255, blank=True, default='')
+
+    description = models.TextField(blank=True, default='')
+    receipt = models.CharField(max_length=100, blank=True, default='')
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    refunds = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'transactions_archive'
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='txn_archive_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} | {self.user_id} | {self.status} (archived)"
+
+
+class PaymentSummary(models.Model):
+    # One row per user/day/status/currency, kept in step with Transaction by payments/summary.py
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Transaction.STATUS)
+    currency = models.CharField(max_length=3, default="INR")
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'payment_summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'status', 'currency'], name='payment_summary_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} | {self.day} | {self.status} | {self.count}"
+
+
+class WebhookEvent(models.Model):
+    STATUS = [
+        ("RECEIVED", "Received"),
+        ("PROCESSED", "Processed"),
+        ("IGNORED", "Ignored"),
+        ("FAILED", "Failed"),
+    ]
+
+    # X-Razorpay-Event-Id, the unique key is what makes redelivered webhooks a no-op
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS, default="RECEIVED")
+    error = models.TextField(blank=True, default='')
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'webhook_events'
+        ordering = ["-received_at"]
+        indexes = [
+            models.Index(fields=['received_at'], name='webhook_received_idx', condition=models.Q(status='RECEIVED')),
+        ]
+
+    def __str__(self):
+        return f"{self.event} | {self.event_id} | {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    # First response for an Idempotency-Key, see payments/idempotency.py. status_code is null while the request is in flight
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} | {self.key} | {self.status_code}"
+
+
+class Refund(models.Model):
+    STATUS = [
+        ("PENDING", "Pending"),
+        ("PROCESSED", "Processed"),
+        ("FAILED", "Failed"),
+    ]
+
+    # PENDING until the gateway accepted it. Rows left PENDING by an interrupted
+    # bulk_refund run are looked up on the gateway before being submitted again
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='refunds')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS, default="PENDING")
+    razorpay_refund_id = models.CharField(max_length=100, blank=True, default='')
+    reason = models.CharField(max_length=255, blank=True, default='')
+    batch = models.CharField(max_length=100, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'refunds'
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['transaction', 'status'], name='refund_txn_status_idx'),
+            models.Index(fields=['batch', 'status'], name='refund_batch_status_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.event_type} | {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
\ No newline at end of file
+        return f"{self.transaction_id} | {self.amount} | {self.status}"
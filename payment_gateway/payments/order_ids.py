@@ -0,0 +1,98 @@
+import itertools
+import os
+import random
+import socket
+import time
+import weakref
+import zlib
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+# ORD_<user id>_<token> has to fit in Razorpay's 40 char receipt field
+TIMESTAMP_WIDTH = 9   # milliseconds, good until the year 5188
+WORKER_WIDTH = 2      # 1296 distinct workers
+SEQUENCE_WIDTH = 4    # 1.6M ids per worker per millisecond before wrap around
+
+WORKER_SPACE = 36 ** WORKER_WIDTH
+SEQUENCE_SPACE = 36 ** SEQUENCE_WIDTH
+
+
+def to_base36(value, width):
+    chars = []
+    for _ in range(width):
+        value, rem = divmod(value, 36)
+        chars.append(BASE36[rem])
+    return ''.join(reversed(chars))
+
+
+class OrderIdGenerator:
+    """Base class for order id generators, set ORDER_ID_GENERATOR to swap implementations."""
+
+    prefix = 'ORD'
+
+    def next_token(self):
+        raise NotImplementedError
+
+    def next_id(self, user):
+        return f"{self.prefix}_{user.id}_{self.next_token()}"
+
+
+class TimeOrderedOrderIdGenerator(OrderIdGenerator):
+    """
+    Snowflake style ids: millisecond timestamp + worker id + per process sequence.
+
+    Every call is O(1) and takes no lock, next() on itertools.count is atomic
+    under the GIL so two threads never see the same sequence number, and the
+    worker id keeps processes apart. Tokens sort by creation time.
+    """
+
+    def __init__(self, worker_id=None):
+        self.configured_worker_id = worker_id
+        self.reset()
+        _generators.add(self)
+
+    def reset(self):
+        if self.configured_worker_id is not None:
+            self.worker_id = int(self.configured_worker_id) % WORKER_SPACE
+        else:
+            seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+            self.worker_id = zlib.crc32(seed) % WORKER_SPACE
+        # random start so two workers that hash to the same id are still very unlikely to clash
+        self.sequence = itertools.count(random.randrange(SEQUENCE_SPACE))
+        self.worker = to_base36(self.worker_id, WORKER_WIDTH)
+
+    def next_token(self):
+        seq = next(self.sequence) % SEQUENCE_SPACE
+        ms = time.time_ns() // 1_000_000
+        return to_base36(ms, TIMESTAMP_WIDTH) + self.worker + to_base36(seq, SEQUENCE_WIDTH)
+
+
+_generator = None
+# every TimeOrderedOrderIdGenerator, reset in forked children
+_generators = weakref.WeakSet()
+
+
+def get_order_id_generator():
+    global _generator
+    if _generator is None:
+        path = getattr(settings, 'ORDER_ID_GENERATOR', 'payments.order_ids.TimeOrderedOrderIdGenerator')
+        _generator = import_string(path)(**getattr(settings, 'ORDER_ID_GENERATOR_OPTIONS', {}))
+    return _generator
+
+
+def reset_after_fork():
+    # gunicorn forks workers from a preloaded master, each child needs its own worker id
+    for generator in list(_generators):
+        generator.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def generate_order_id(user):
+    return get_order_id_generator().next_id(user)
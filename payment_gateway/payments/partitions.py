@@ -0,0 +1,170 @@
+import os
+import re
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import exports
+
+# payment_logs is range partitioned by month on created_at in Postgres (migration 0011).
+# Partitions are named payment_logs_y2026m01 and hold [2026-01-01, 2026-02-01) UTC,
+# payment_logs_default catches rows no monthly partition covers.
+
+TABLE = 'payment_logs'
+DEFAULT_PARTITION = f'{TABLE}_default'
+NAME = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def partition_options():
+    options = {
+        # partitions kept ready past the current month
+        'MONTHS_AHEAD': 3,
+        # whole months kept before a partition is archived and dropped
+        'RETENTION_MONTHS': 12,
+        'ARCHIVE_DIR': Path(settings.BASE_DIR) / 'var' / 'archive' / TABLE,
+    }
+    options.update(getattr(settings, 'PAYMENT_LOG_PARTITIONS', {}))
+    return options
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def partition_month(name):
+    match = NAME.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc) if match else None
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partitions():
+    """Monthly partitions as (first day of the month, name), oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [name for name, in cursor.fetchall()]
+    return sorted((partition_month(name), name) for name in names if partition_month(name))
+
+
+def default_rows(start=None, end=None):
+    """Rows in the default partition, within [start, end) when given."""
+    sql, params = f'SELECT count(*) FROM {DEFAULT_PARTITION}', []
+    if start is not None:
+        sql, params = sql + ' WHERE created_at >= %s AND created_at < %s', [start, end]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+@transaction.atomic
+def create_partition(month):
+    """
+    Creates the partition for month, returns its name.
+
+    Rows the default partition took for that month are moved into it, which
+    means detaching the default while they are copied. Partitions created
+    ahead of time find it empty and skip that.
+    """
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    with connection.cursor() as cursor:
+        stray = default_rows(start, end)
+        if stray:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)', [start, end])
+        if stray:
+            where = 'created_at >= %s AND created_at < %s'
+            cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {DEFAULT_PARTITION} WHERE {where}', [start, end])
+            cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE {where}', [start, end])
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+    return name
+
+
+def missing_months(months_ahead, now):
+    """Months from the current one to months_ahead past it that have no partition yet."""
+    existing = {month for month, _ in partitions()}
+    current = month_start(now)
+    return [month for month in (add_months(current, i) for i in range(months_ahead + 1)) if month not in existing]
+
+
+def ensure_partitions(months_ahead, now):
+    """Creates the missing partitions, returns their names."""
+    return [create_partition(month) for month in missing_months(months_ahead, now)]
+
+
+def expired_partitions(retention_months, now):
+    cutoff = add_months(month_start(now), -retention_months)
+    return [(month, name) for month, name in partitions() if month < cutoff]
+
+
+def archive_range(start, end, path):
+    """
+    Writes the payment logs in [start, end) to path as gzipped JSON lines, returns the row count.
+
+    Reads through the PaymentLog model, Postgres only scans the partition
+    that holds the range. The file is written beside path and renamed when
+    complete, a half written archive never has the final name.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    rows = counted(exports.export_rows('logs', created_after=start, created_before=end))
+    partial = path.with_name(path.name + '.partial')
+    with open(partial, 'wb') as output:
+        for chunk in exports.stream('logs', rows, 'jsonl', compress=True):
+            output.write(chunk)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(partial, path)
+    return count
+
+
+def archive_path(directory, name):
+    return Path(directory) / f'{name}.jsonl.gz'
+
+
+@transaction.atomic
+def archive_partition(month, name, directory):
+    """
+    Archives a monthly partition and drops it, returns (rows, archive path).
+
+    Writes to the partition wait until it is gone, so nothing lands in it
+    after the archive was read. Detaching and dropping are catalog changes,
+    they take the same time however many rows the partition held.
+    """
+    path = archive_path(directory, name)
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {name} IN EXCLUSIVE MODE')
+        rows = archive_range(month, add_months(month, 1), path)
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+    return rows, path
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .gateway import get_client
+from .models import Transaction
+from . import state
+
+# Fields the engine reads, enough for the gateway lookup, summary buckets and the log entry
+FIELDS = ['id', 'order_id', 'user_id', 'amount', 'currency', 'status', 'razorpay_order_id', 'created_at']
+
+
+def reconcile_options():
+    options = {
+        'OLDER_THAN_MINUTES': 30,
+        # an order with no payment against it this long after it was created was abandoned, it is marked FAILED
+        'EXPIRE_AFTER_MINUTES': 24 * 60,
+        'CHUNK_SIZE': 500,
+        'CONCURRENCY': 8,
+        'RATE_LIMIT': 20,
+        'MIN_RATE_LIMIT': 1,
+        'CHECKPOINT_PATH': Path(settings.BASE_DIR) / 'var' / 'reconcile.checkpoint.json',
+    }
+    options.update(getattr(settings, 'RECONCILIATION', {}))
+    return options
+
+
+class RateLimiter:
+    """
+    Spaces gateway calls RATE_LIMIT per second across all worker threads.
+
+    slow_down() halves the rate when the gateway answers 429, the rate creeps
+    back up by one per second of clean calls.
+    """
+
+    def __init__(self, rate, min_rate=1):
+        self.max_rate = self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+        self.last_change = self.next_slot
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_change >= 1 and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 1)
+                self.last_change = now
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1 / self.rate
+        time.sleep(max(0.0, slot - now))
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.last_change = time.monotonic()
+
+
+def rate_limited(error):
+    # razorpay.Client raises the final 429 (after urllib3 retries) as a generic error
+    return 'too many requests' in str(error).lower()
+
+
+def resolve(payments, expired=False):
+    """
+    New (status, payment id) for a pending order from its gateway payments, None while still open.
+
+    An expired order nobody ever tried to pay, the checkout closed before a
+    payment was made, is FAILED. One with an authorized payment can still be
+    captured and stays open.
+    """
+    items = payments.get('items', [])
+    for payment in items:
+        if payment.get('status') == 'captured':
+            return 'SUCCESS', payment['id']
+    if items and all(payment.get('status') == 'failed' for payment in items):
+        return 'FAILED', items[0]['id']
+    if expired and not items:
+        return 'FAILED', ''
+    return None
+
+
+class Checkpoint:
+    """Last (created_at, id) a run got through, so an interrupted run carries on instead of starting over."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return parse_datetime(data['created_at']), data['id']
+
+    def save(self, created_at, pk):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({'created_at': created_at.isoformat(), 'id': pk}))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class Reconciler:
+    """
+    Resolves stale PENDING transactions against the gateway.
+
+    Pending rows are streamed oldest first through the partial
+    txn_pending_created_idx index, looked up on a thread pool that shares the
+    pooled razorpay client, and written back a chunk at a time with
+    state.bulk_transition. The checkpoint is saved after each chunk.
+    """
+
+    def __init__(self, client=None, options=None):
+        self.options = options or reconcile_options()
+        self.client = client or get_client()
+        self.limiter = RateLimiter(self.options['RATE_LIMIT'], self.options['MIN_RATE_LIMIT'])
+        self.checkpoint = Checkpoint(self.options['CHECKPOINT_PATH'])
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'checked': 0, 'succeeded': 0, 'failed': 0, 'expired': 0, 'unchanged': 0, 'skipped': 0, 'errors': 0, 'rate_limited': 0,
+        }
+        self.expire_before = None
+
+    def pending(self, cutoff, resume_from=None):
+        rows = Transaction.objects.filter(status='PENDING', created_at__lt=cutoff)
+        if resume_from is not None:
+            created_at, pk = resume_from
+            rows = rows.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        return rows.only(*FIELDS).order_by('created_at', 'id')
+
+    def lookup(self, transaction):
+        if not transaction.razorpay_order_id:
+            # the gateway order was never created, nothing can be paid against it
+            return 'FAILED', ''
+        expired = transaction.created_at < self.expire_before
+        self.limiter.acquire()
+        try:
+            result = resolve(self.client.order.payments(transaction.razorpay_order_id), expired)
+        except Exception as e:
+            if rate_limited(e):
+                self.limiter.slow_down()
+                self.count('rate_limited')
+            self.count('errors')
+            return None
+        if result == ('FAILED', ''):
+            self.count('expired')
+        return result
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def run(self, older_than=None, resume=True):
+        older_than = self.options['OLDER_THAN_MINUTES'] if older_than is None else older_than
+        cutoff = timezone.now() - timedelta(minutes=older_than)
+        self.expire_before = timezone.now() - timedelta(minutes=self.options['EXPIRE_AFTER_MINUTES'])
+        resume_from = self.checkpoint.load() if resume else None
+        chunk_size = self.options['CHUNK_SIZE']
+
+        with ThreadPoolExecutor(max_workers=self.options['CONCURRENCY']) as pool:
+            chunk = []
+            for transaction in self.pending(cutoff, resume_from).iterator(chunk_size=chunk_size):
+                chunk.append(transaction)
+                if len(chunk) == chunk_size:
+                    self.reconcile_chunk(pool, chunk)
+                    chunk = []
+            if chunk:
+                self.reconcile_chunk(pool, chunk)
+        self.checkpoint.clear()
+        return self.stats
+
+    def reconcile_chunk(self, pool, chunk):
+        results = list(pool.map(self.lookup, chunk))
+        changes = {'SUCCESS': [], 'FAILED': []}
+        for transaction, result in zip(chunk, results):
+            if result is None:
+                self.count('unchanged')
+                continue
+            new_status, payment_id = result
+            transaction.status = new_status
+            transaction.razorpay_payment_id = payment_id
+            changes[new_status].append(transaction)
+
+        self.apply(changes)
+        self.count('checked', len(chunk))
+        last = chunk[-1]
+        self.checkpoint.save(last.created_at, last.pk)
+
+    def apply(self, changes):
+        changed = changes['SUCCESS'] + changes['FAILED']
+        if not changed:
+            return
+        moved = 0
+        # verify_payment_api or a webhook may have resolved some of these since they were read,
+        # bulk_transition locks them and only moves the ones still allowed to move
+        with db_transaction.atomic():
+            for new_status, transactions in changes.items():
+                if not transactions:
+                    continue
+                resolved = state.bulk_transition(
+                    [t.pk for t in transactions],
+                    new_status,
+                    payload={'source': 'reconciliation'},
+                    fields={t.pk: {'razorpay_payment_id': t.razorpay_payment_id} for t in transactions},
+                )
+                self.count('succeeded' if new_status == 'SUCCESS' else 'failed', len(resolved))
+                moved += len(resolved)
+        self.count('skipped', len(changed) - moved)
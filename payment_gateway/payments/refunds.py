@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import razorpay
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import Refund, Transaction
+from . import state
+
+# refunds that count against the refundable amount
+ACTIVE = ('PENDING', 'PROCESSED')
+
+# the gateway answered and said no, anything else (timeouts, dropped connections) may have gone through
+GATEWAY_ERRORS = (razorpay.errors.BadRequestError, razorpay.errors.GatewayError, razorpay.errors.ServerError)
+
+
+def refund_options():
+    options = {
+        'CONCURRENCY': 8,
+        'CHUNK_SIZE': 200,
+    }
+    options.update(getattr(settings, 'REFUNDS', {}))
+    return options
+
+
+def refunded_amounts(transaction_ids):
+    rows = (
+        Refund.objects.filter(transaction_id__in=transaction_ids, status__in=ACTIVE)
+        .values('transaction_id').annotate(total=Sum('amount')).order_by()
+    )
+    return {row['transaction_id']: row['total'] for row in rows}
+
+
+def create_refunds(requests, batch='', requested_by=None):
+    """
+    Creates PENDING Refund rows for (transaction, amount or None for the rest, reason) requests.
+
+    Returns (refunds, errors) where errors is a list of (transaction, message).
+    The transaction rows are locked while the amounts are checked so two
+    refunds can never both take the remaining balance.
+    """
+    refunds, errors = [], []
+    with db_transaction.atomic():
+        ids = [transaction.pk for transaction, _, _ in requests]
+        locked = {t.pk: t for t in Transaction.objects.select_for_update().filter(pk__in=ids).only('id', 'status', 'amount')}
+        refunded = refunded_amounts(ids)
+        for transaction, amount, reason in requests:
+            current = locked.get(transaction.pk)
+            if current is None or current.status != 'SUCCESS':
+                errors.append((transaction, 'Only successful payments can be refunded.'))
+                continue
+            remaining = current.amount - refunded.get(transaction.pk, Decimal('0'))
+            amount = remaining if amount is None else amount
+            if amount <= 0 or amount > remaining:
+                errors.append((transaction, f'Refund amount must be more than 0 and at most {remaining}.'))
+                continue
+            refunded[transaction.pk] = refunded.get(transaction.pk, Decimal('0')) + amount
+            refunds.append(Refund(transaction=transaction, amount=amount, reason=reason, batch=batch, requested_by=requested_by))
+        Refund.objects.bulk_create(refunds)
+    return refunds, errors
+
+
+def gateway_payload(refund):
+    return {
+        'amount': int(refund.amount * 100),
+        'receipt': f"RFND_{refund.pk}",
+        # matched by find_submitted when a run is resumed
+        'notes': {'refund_id': str(refund.pk), 'reason': refund.reason},
+    }
+
+
+def find_submitted(client, refund):
+    response = client.payment.fetch_multiple_refund(refund.transaction.razorpay_payment_id)
+    for item in response.get('items', []):
+        if str(item.get('notes', {}).get('refund_id')) == str(refund.pk):
+            return item
+    return None
+
+
+def submit(client, refund, recover=False):
+    """
+    Sends one refund to the gateway and sets its outcome on the instance.
+
+    Only talks to the gateway, so it is safe on worker threads. With recover
+    the gateway is asked first whether an earlier attempt already went through.
+    """
+    try:
+        response = find_submitted(client, refund) if recover else None
+        if response is None:
+            response = client.payment.refund(refund.transaction.razorpay_payment_id, gateway_payload(refund))
+    except GATEWAY_ERRORS as e:
+        refund.status = 'FAILED'
+        refund.error = str(e)
+        return refund
+    except Exception as e:
+        # outcome unknown, stays PENDING for the next bulk_refund run to look up
+        refund.error = str(e)
+        return refund
+    refund.status = 'PROCESSED'
+    refund.razorpay_refund_id = response['id']
+    refund.error = ''
+    return refund
+
+
+def record(refunds):
+    """Stores the outcome of submitted refunds, transactions refunded in full move to REFUNDED. Returns those."""
+    now = timezone.now()
+    for refund in refunds:
+        refund.updated_at = now
+    with db_transaction.atomic():
+        Refund.objects.bulk_update(refunds, ['status', 'razorpay_refund_id', 'error', 'updated_at'])
+        processed = {refund.transaction_id for refund in refunds if refund.status == 'PROCESSED'}
+        if not processed:
+            return []
+        full = (
+            Transaction.objects.filter(pk__in=processed)
+            .annotate(refunded=Sum('refunds__amount', filter=Q(refunds__status='PROCESSED')))
+            .filter(refunded__gte=F('amount'))
+            .values_list('pk', flat=True)
+        )
+        return state.bulk_transition(list(full), 'REFUNDED', message='Refunded in full')
+
+
+class BulkRefunder:
+    """
+    Submits refunds in chunks with CONCURRENCY gateway calls in flight.
+
+    Worker threads only talk to the gateway through the shared pooled client,
+    rows are created and updated from the calling thread with bulk writes.
+    Everything is keyed by batch, a rerun with the same batch first settles
+    the refunds an interrupted run left PENDING and then skips transactions
+    that already have a refund in the batch.
+    """
+
+    def __init__(self, client, options=None):
+        self.options = options or refund_options()
+        self.client = client
+        self.stats = {'submitted': 0, 'processed': 0, 'failed': 0, 'pending': 0, 'skipped': 0, 'refunded': 0}
+        self.errors = []
+
+    def chunks(self, items):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == self.options['CHUNK_SIZE']:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def recover(self, pool, pending):
+        for chunk in self.chunks(pending.select_related('transaction').order_by('pk').iterator()):
+            self.settle(pool, chunk, recover=True)
+
+    def run(self, requests, batch, requested_by=None):
+        with ThreadPoolExecutor(max_workers=self.options['CONCURRENCY']) as pool:
+            self.recover(pool, Refund.objects.filter(batch=batch, status='PENDING'))
+            for chunk in self.chunks(requests):
+                ids = [transaction.pk for transaction, _, _ in chunk]
+                done = set(
+                    Refund.objects.filter(batch=batch, transaction_id__in=ids, status__in=ACTIVE)
+                    .values_list('transaction_id', flat=True)
+                )
+                todo = [request for request in chunk if request[0].pk not in done]
+                self.stats['skipped'] += len(chunk) - len(todo)
+                created, errors = create_refunds(todo, batch=batch, requested_by=requested_by)
+                self.errors.extend((transaction.order_id, message) for transaction, message in errors)
+                self.settle(pool, created)
+        return self.stats
+
+    def run_pending(self):
+        """Settle every PENDING refund, including ones left by the refund endpoint."""
+        with ThreadPoolExecutor(max_workers=self.options['CONCURRENCY']) as pool:
+            self.recover(pool, Refund.objects.filter(status='PENDING'))
+        return self.stats
+
+    def settle(self, pool, refunds, recover=False):
+        if not refunds:
+            return
+        results = list(pool.map(lambda refund: submit(self.client, refund, recover), refunds))
+        self.stats['refunded'] += len(record(results))
+        self.stats['submitted'] += len(results)
+        for refund in results:
+            self.stats[refund.status.lower()] += 1
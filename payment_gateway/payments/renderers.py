@@ -0,0 +1,127 @@
+import json
+import operator
+from collections.abc import Sequence
+from datetime import datetime
+from functools import lru_cache
+from json.encoder import encode_basestring
+
+from rest_framework.compat import SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+from .models import Transaction
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# (template placeholder, encoder) per model field type. The encoders are all C
+# functions, map(call, ...) applies them without a Python frame per value on 3.11+
+FIELD_ENCODERS = {
+    'AutoField': ('%s', str),
+    'BigAutoField': ('%s', str),
+    'IntegerField': ('%s', str),
+    'ForeignKey': ('%s', str),
+    'DecimalField': ('"%s"', str),
+    'CharField': ('%s', encode_basestring),
+    'TextField': ('%s', encode_basestring),
+    'DateTimeField': ('"%s"', datetime.isoformat),
+}
+
+# operator.call is new in Python 3.11
+call = getattr(operator, 'call', lambda encoder, value: encoder(value))
+
+# U+2028 and U+2029 in UTF-8, escaped like JSONRenderer does
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+@lru_cache(maxsize=64)
+def row_encoder(model, fields):
+    """
+    (template, encoders) that turn a values_list() tuple into one JSON object.
+
+    Keys and punctuation are baked into a %-template once per field list, so
+    a row costs one tuple and one string format. Only non-null columns can be
+    encoded this way, there is no placeholder for null.
+    """
+    parts, encoders = [], []
+    for name in fields:
+        placeholder, encoder = FIELD_ENCODERS[model._meta.get_field(name).get_internal_type()]
+        parts.append(f"{encode_basestring(name).replace('%', '%%')}:{placeholder}")
+        encoders.append(encoder)
+    return '{' + ','.join(parts) + '}', tuple(encoders)
+
+
+def encode_rows(model, fields, rows):
+    """JSON array bytes for values_list() rows, orjson when it is installed."""
+    if orjson is not None:
+        # dict(zip()) drops the trailing columns, default=str covers Decimal
+        return orjson.dumps([dict(zip(fields, row)) for row in rows], default=str)
+    template, encoders = row_encoder(model, fields)
+    return ('[' + ','.join([
+        template % tuple(map(call, encoders, row)) for row in rows
+    ]) + ']').encode()
+
+
+class Rows(Sequence):
+    """
+    values_list() rows for FastJSONRenderer, which writes them without a dict per row.
+
+    Rows may carry trailing columns the view needs (cursor keys), only the
+    first len(fields) are rendered. Indexing gives the dict the stock
+    renderer would have produced, for tests and the browsable API.
+    """
+
+    def __init__(self, model, fields, rows):
+        self.model = model
+        self.fields = tuple(fields)
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return json.loads(encode_rows(self.model, self.fields, [self.rows[index]]))[0]
+
+    def __eq__(self, other):
+        return list(self) == list(other) if isinstance(other, (list, Rows)) else NotImplemented
+
+    def encode(self):
+        return encode_rows(self.model, self.fields, self.rows)
+
+
+def transaction_rows(fields, rows):
+    return Rows(Transaction, fields, rows)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that writes Rows values of a top level dict straight to JSON bytes.
+
+    Other data, and indented output for the browsable API, goes through the
+    stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or not any(isinstance(value, Rows) for value in data.values()):
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            data = {key: list(value) if isinstance(value, Rows) else value for key, value in data.items()}
+            return super().render(data, accepted_media_type, renderer_context)
+
+        parts = []
+        for key, value in data.items():
+            if isinstance(value, Rows):
+                encoded = value.encode()
+            else:
+                encoded = json.dumps(
+                    value, cls=self.encoder_class, ensure_ascii=self.ensure_ascii, separators=SHORT_SEPARATORS
+                ).encode()
+            parts.append(encode_basestring(key).encode() + b':' + encoded)
+        ret = b'{' + b','.join(parts) + b'}'
+        for raw, escaped in LINE_SEPARATORS:
+            ret = ret.replace(raw, escaped)
+        return ret
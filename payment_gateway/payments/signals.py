@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from payment_gateway import object_cache
+
+from .models import Transaction
+
+
+# .save() and .delete() only, queryset updates (state.transition, reconciliation) invalidate themselves
+@receiver([post_save, post_delete], sender=Transaction)
+def drop_cached_transaction(sender, instance, **kwargs):
+    object_cache.invalidate_transactions([instance])
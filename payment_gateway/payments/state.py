@@ -0,0 +1,128 @@
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from payment_gateway import object_cache
+
+from .audit import log_payment_event
+from .models import Transaction
+from . import summary
+
+# Legal Transaction.status moves. A capture reported after the checkout failed
+# (dismissed modal, bad signature) still wins, a finished payment only refunds.
+TRANSITIONS = {
+    'PENDING': frozenset(['SUCCESS', 'FAILED']),
+    'FAILED': frozenset(['SUCCESS']),
+    'SUCCESS': frozenset(['REFUNDED']),
+    'REFUNDED': frozenset(),
+}
+
+# PaymentLog event written with each move unless the caller names a more specific one
+EVENTS = {
+    'SUCCESS': 'PAYMENT_SUCCESS',
+    'FAILED': 'PAYMENT_FAILED',
+    'REFUNDED': 'PAYMENT_REFUNDED',
+}
+
+# bounds the re-reads when concurrent writers keep moving the row
+MAX_ATTEMPTS = 3
+
+
+class IllegalTransition(ValueError):
+    pass
+
+
+def allowed(old_status, new_status):
+    return new_status in TRANSITIONS.get(old_status, ())
+
+
+def sources(new_status):
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+def transition(transaction, new_status, event_type=None, message='', payload=None, ip_address=None, **fields):
+    """
+    Moves transaction to new_status, returns False when the move is not legal from its current status.
+
+    Each attempt is one UPDATE ... WHERE id = %s AND status = <status on the
+    instance>, so no row lock is taken and a concurrent writer that got there
+    first makes the UPDATE match nothing. The instance is then refreshed and
+    the move retried if it is still legal from the new status. The summary
+    bucket and the PaymentLog entry are written in the same atomic block.
+    """
+    if new_status not in TRANSITIONS:
+        raise IllegalTransition(f"Unknown status {new_status!r}")
+
+    with db_transaction.atomic():
+        for _ in range(MAX_ATTEMPTS):
+            old_status = transaction.status
+            if not allowed(old_status, new_status):
+                return False
+            now = timezone.now()
+            updated = Transaction.objects.filter(pk=transaction.pk, status=old_status).update(
+                status=new_status, updated_at=now, **fields
+            )
+            if updated:
+                break
+            transaction.refresh_from_db(fields=['status', 'razorpay_payment_id', 'razorpay_signature', 'updated_at'])
+        else:
+            return False
+
+        for name, value in fields.items():
+            setattr(transaction, name, value)
+        transaction.status = new_status
+        transaction.updated_at = now
+        summary.record_status_change(transaction, old_status, new_status)
+        object_cache.invalidate_transactions([transaction])
+        log_payment_event(
+            transaction=transaction,
+            event_type=event_type or EVENTS[new_status],
+            payload=payload,
+            message=message or f"{old_status} -> {new_status}",
+            ip_address=ip_address,
+        )
+    return True
+
+
+def bulk_transition(transaction_ids, new_status, event_type=None, message='', payload=None, fields=None):
+    """
+    transition() for many transactions, returns the ones that moved.
+
+    bulk writers cannot use the per row compare-and-set without losing track
+    of which rows matched, so the candidates are locked with select_for_update
+    and moved with one UPDATE per source status. fields maps a transaction id
+    to the other columns to set on that row, they are added to its log payload.
+    """
+    if new_status not in TRANSITIONS:
+        raise IllegalTransition(f"Unknown status {new_status!r}")
+
+    fields = fields or {}
+    names = sorted({name for values in fields.values() for name in values})
+    moved = []
+    with db_transaction.atomic():
+        rows = list(
+            Transaction.objects.select_for_update()
+            .filter(pk__in=transaction_ids, status__in=sources(new_status))
+            .only('id', 'user_id', 'amount', 'currency', 'status', 'created_at', *names)
+        )
+        now = timezone.now()
+        for old_status in {row.status for row in rows}:
+            group = [row for row in rows if row.status == old_status]
+            for row in group:
+                for name, value in fields.get(row.pk, {}).items():
+                    setattr(row, name, value)
+                row.status = new_status
+                row.updated_at = now
+            if names:
+                Transaction.objects.bulk_update(group, ['status', 'updated_at', *names], batch_size=1000)
+            else:
+                Transaction.objects.filter(pk__in=[row.pk for row in group]).update(status=new_status, updated_at=now)
+            summary.record_status_changes(group, old_status, new_status)
+            object_cache.invalidate_transactions(group)
+            for row in group:
+                log_payment_event(
+                    transaction=row,
+                    event_type=event_type or EVENTS[new_status],
+                    payload={**payload, **fields.get(row.pk, {})} if payload is not None else None,
+                    message=message or f"{old_status} -> {new_status}",
+                )
+            moved.extend(group)
+    return moved
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, connection, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedTransaction, PaymentSummary, Transaction
+
+
+def bucket(transaction, status):
+    return {
+        'user_id': transaction.user_id,
+        'day': timezone.localdate(transaction.created_at),
+        'status': status,
+        'currency': transaction.currency,
+    }
+
+
+def bump_bucket(key, count, total):
+    # Callers run this inside the atomic block that writes the transactions themselves
+    delta = {'count': F('count') + count, 'total': F('total') + total}
+    if PaymentSummary.objects.filter(**key).update(**delta):
+        return
+    try:
+        with db_transaction.atomic():
+            PaymentSummary.objects.create(**key, count=count, total=total)
+    except IntegrityError:
+        # another request created the bucket first
+        PaymentSummary.objects.filter(**key).update(**delta)
+
+
+def bump(transaction, status, sign):
+    bump_bucket(bucket(transaction, status), sign, sign * transaction.amount)
+
+
+def record_created(transaction):
+    bump(transaction, transaction.status, 1)
+
+
+def record_status_change(transaction, old_status, new_status):
+    if old_status == new_status:
+        return
+    bump(transaction, old_status, -1)
+    bump(transaction, new_status, 1)
+
+
+def record_status_changes(transactions, old_status, new_status):
+    """record_status_change for many transactions, one UPDATE per bucket instead of two per row."""
+    if old_status == new_status:
+        return
+    deltas = defaultdict(lambda: [0, 0])
+    for transaction in transactions:
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            delta = deltas[tuple(bucket(transaction, status).items())]
+            delta[0] += sign
+            delta[1] += sign * transaction.amount
+    for key, (count, total) in deltas.items():
+        bump_bucket(dict(key), count, total)
+
+
+def recompute():
+    """Summary buckets computed straight from the transactions and transactions_archive tables, keyed like bucket()."""
+    buckets = defaultdict(lambda: (0, 0))
+    for model in (Transaction, ArchivedTransaction):
+        rows = (
+            model.objects
+            .annotate(day=TruncDate('created_at'))
+            .values('user_id', 'day', 'status', 'currency')
+            .annotate(count=Count('id'), total=Sum('amount'))
+            .order_by()
+        )
+        for r in rows:
+            key = (r['user_id'], r['day'], r['status'], r['currency'])
+            count, total = buckets[key]
+            buckets[key] = (count + r['count'], total + r['total'])
+    return dict(buckets)
+
+
+def stored():
+    rows = PaymentSummary.objects.filter(count__gt=0).values_list('user_id', 'day', 'status', 'currency', 'count', 'total')
+    return {(user_id, day, status, currency): (count, total) for user_id, day, status, currency, count, total in rows}
+
+
+def rebuild():
+    """
+    Replaces every bucket with recompute(), returns how many there are.
+
+    Computed and written under one lock on Postgres. Requests that bump a
+    bucket wait and land on the new rows, requests that already bumped one
+    commit first, so recompute() counts their transactions. The archive is
+    locked too, a batch moved between recompute()'s two reads would count
+    twice.
+    """
+    with db_transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {PaymentSummary._meta.db_table}, {ArchivedTransaction._meta.db_table} IN EXCLUSIVE MODE'
+                )
+        expected = recompute()
+        PaymentSummary.objects.all().delete()
+        PaymentSummary.objects.bulk_create([
+            PaymentSummary(user_id=user_id, day=day, status=status, currency=currency, count=count, total=total)
+            for (user_id, day, status, currency), (count, total) in expected.items()
+        ], batch_size=1000)
+    return len(expected)
+
+
+def differences():
+    expected, actual = recompute(), stored()
+    return {
+        key: (actual.get(key), expected.get(key))
+        for key in expected.keys() | actual.keys()
+        if actual.get(key) != expected.get(key)
+    }
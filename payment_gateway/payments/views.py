@@ -1,18 +1,36 @@
 from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q, Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 
-from .models import Transaction, PaymentLog
+from payment_gateway import object_cache
+
+from .models import ArchivedTransaction, Transaction, PaymentSummary
+from .audit import log_payment_event
+from . import archive, exports, refunds, state, summary, webhooks
+from .order_ids import generate_order_id
+from .gateway import get_client
+from .idempotency import idempotent
+from .renderers import FastJSONRenderer, transaction_rows
 import razorpay
 import hmac # signature verification
 import hashlib # hash function
+import base64
+import binascii
+import json
+from datetime import datetime, time, timedelta
 from decimal import Decimal, InvalidOperation
 
 
 def get_razorpay_client():
-    return razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+    return get_client()
 
 
 def get_client_ip(request):
@@ -35,70 +53,178 @@ def serialize_transaction(transaction):
     }
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def create_order_api(request):
-    amount_str = request.data.get('amount')
-    description = request.data.get('description', 'Payment')
-    
+def serialize_refund(refund):
+    return {
+        'id': refund.id,
+        'transaction_id': refund.transaction_id,
+        'amount': str(refund.amount),
+        'status': refund.status,
+        'razorpay_refund_id': refund.razorpay_refund_id,
+        'reason': refund.reason,
+        'error': refund.error,
+        'created_at': refund.created_at.isoformat(),
+    }
+
+
+TRANSACTION_FIELDS = [
+    'id', 'order_id', 'razorpay_order_id', 'razorpay_payment_id', 'amount',
+    'currency', 'description', 'status', 'created_at', 'updated_at',
+]
+
+
+# History cursors point at the last row of a page, the (created_at, id) pair the next page starts after
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        created_at, pk = parse_datetime(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+# parse_date_param accepts a date or a datetime, dates mean midnight in the current timezone
+def parse_date_param(value):
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+# parse_amount validates the checkout amount, it returns (amount, None) or (None, error message)
+def parse_amount(amount_str):
     if not amount_str:
-        return Response({'amount': ['This field is required.']}, status=400)
-    
+        return None, 'This field is required.'
     try:
         amount = Decimal(str(amount_str))
-        if amount < 1:
-            return Response({'amount': ['Amount must be at least 1.']}, status=400)
     except (InvalidOperation, ValueError):
-        return Response({'amount': ['Enter a valid number.']}, status=400)
+        return None, 'Enter a valid number.'
+    if amount < 1:
+        return None, 'Amount must be at least 1.'
+    return amount, None
+
+
+def payment_signature(razorpay_order_id, razorpay_payment_id):
+    return hmac.new(
+        settings.RAZORPAY_KEY_SECRET.encode(),
+        f"{razorpay_order_id}|{razorpay_payment_id}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def order_response(user, transaction, razorpay_order, amount, description):
+    user_name = user.get_full_name() or user.username or user.email.split('@')[0]
+
+    return {
+        'transaction': serialize_transaction(transaction),
+        'razorpay_key_id': settings.RAZORPAY_KEY_ID,
+        'razorpay_order_id': razorpay_order['id'],
+        'amount': str(amount),
+        'amount_in_paise': int(amount * 100),
+        'currency': 'INR',
+        'description': description,
+        'user_name': user_name,
+        'user_email': user.email,
+    }
+
+
+# Written once the gateway order exists, so the row is a single INSERT instead of INSERT then UPDATE.
+# The transaction, its summary bucket and the ORDER_CREATED log share one DB transaction
+def record_order(user, order_id, amount, description, razorpay_order, ip_address):
+    with db_transaction.atomic():
+        transaction = Transaction.objects.create(
+            user=user,
+            order_id=order_id,
+            amount=amount,
+            currency='INR',
+            description=description,
+            status='PENDING',
+            razorpay_order_id=razorpay_order['id'],
+            receipt=razorpay_order['receipt'],
+        )
+        summary.record_created(transaction)
+        log_payment_event(
+            transaction=transaction,
+            event_type='ORDER_CREATED',
+            payload=razorpay_order,
+            message=f"Order created: {razorpay_order['id']}",
+            ip_address=ip_address
+        )
+    return transaction
+
+
+# apply_verification records the outcome of a checkout signature check, returns True when it matched
+def apply_verification(transaction, razorpay_order_id, razorpay_payment_id, razorpay_signature, ip_address):
+    if payment_signature(razorpay_order_id, razorpay_payment_id) == razorpay_signature:
+        moved = state.transition(
+            transaction, 'SUCCESS',
+            payload={
+                'order_id': razorpay_order_id,
+                'payment_id': razorpay_payment_id,
+                'signature': razorpay_signature
+            },
+            message='Payment verified successfully',
+            ip_address=ip_address,
+            razorpay_payment_id=razorpay_payment_id,
+            razorpay_signature=razorpay_signature,
+        )
+        # a repeated verify, or a webhook that got there first, still reports success
+        return moved or transaction.status == 'SUCCESS'
+
+    # a bad signature never downgrades a payment that already succeeded
+    if not state.transition(transaction, 'FAILED', event_type='SIGNATURE_FAILED',
+                            message='Signature verification failed', ip_address=ip_address):
+        log_payment_event(
+            transaction=transaction,
+            event_type='SIGNATURE_FAILED',
+            message='Signature verification failed',
+            ip_address=ip_address
+        )
+    return False
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent('create-order')
+def create_order_api(request):
+    description = request.data.get('description', 'Payment')
+    amount, error = parse_amount(request.data.get('amount'))
+    if error:
+        return Response({'amount': [error]}, status=400)
     
     try:
         if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
             return Response({'error': 'Razorpay keys not configured.'}, status=500)
         
         amount_in_paise = int(amount * 100)
-              
-        transaction = Transaction.objects.create(
-            user=request.user,
-            order_id=f"ORD_{request.user.id}_{Transaction.objects.count() + 1}",
-            amount=amount,
-            currency='INR',
-            description=description,
-            status='PENDING'
-        )
+        order_id = generate_order_id(request.user)
         
         client = get_razorpay_client()
         razorpay_order = client.order.create({
             'amount': amount_in_paise,
             'currency': 'INR',
-            'receipt': transaction.order_id,
+            'receipt': order_id,
             'payment_capture': 1
         })
         
-        transaction.razorpay_order_id = razorpay_order['id']
-        transaction.receipt = razorpay_order['receipt']
-        transaction.save()
+        transaction = record_order(request.user, order_id, amount, description, razorpay_order, get_client_ip(request))
         
-        PaymentLog.objects.create(
-            transaction=transaction,
-            event_type='ORDER_CREATED',
-            payload=razorpay_order,
-            message=f"Order created: {razorpay_order['id']}",
-            ip_address=get_client_ip(request)
-        )
-        
-        user_name = request.user.get_full_name() or request.user.username or request.user.email.split('@')[0]
-        
-        return Response({
-            'transaction': serialize_transaction(transaction),
-            'razorpay_key_id': settings.RAZORPAY_KEY_ID,
-            'razorpay_order_id': razorpay_order['id'],
-            'amount': str(amount),
-            'amount_in_paise': amount_in_paise,
-            'currency': 'INR',
-            'description': description,
-            'user_name': user_name,
-            'user_email': request.user.email,
-        })
+        return Response(order_response(request.user, transaction, razorpay_order, amount, description))
         
     except razorpay.errors.BadRequestError:
         return Response({'error': 'Authentication failed. Check Razorpay credentials.'}, status=500)
@@ -108,6 +234,7 @@ def create_order_api(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('verify')
 def verify_payment_api(request):
     try:
         razorpay_order_id = request.data.get('razorpay_order_id')
@@ -116,45 +243,12 @@ def verify_payment_api(request):
         
         transaction = Transaction.objects.get(razorpay_order_id=razorpay_order_id, user=request.user)
         
-        generated_signature = hmac.new(
-            settings.RAZORPAY_KEY_SECRET.encode(),
-            f"{razorpay_order_id}|{razorpay_payment_id}".encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        if generated_signature == razorpay_signature:
-            transaction.razorpay_payment_id = razorpay_payment_id
-            transaction.razorpay_signature = razorpay_signature
-            transaction.status = 'SUCCESS'
-            transaction.save()
-            
-            PaymentLog.objects.create(
-                transaction=transaction,
-                event_type='PAYMENT_SUCCESS',
-                payload={
-                    'order_id': razorpay_order_id,
-                    'payment_id': razorpay_payment_id,
-                    'signature': razorpay_signature
-                },
-                message='Payment verified successfully',
-                ip_address=get_client_ip(request)
-            )
-            
+        if apply_verification(transaction, razorpay_order_id, razorpay_payment_id, razorpay_signature, get_client_ip(request)):
             return Response({
                 'message': 'Payment successful.',
                 'transaction': serialize_transaction(transaction)
             })
         else:
-            transaction.status = 'FAILED'
-            transaction.save()
-            
-            PaymentLog.objects.create(
-                transaction=transaction,
-                event_type='SIGNATURE_FAILED',
-                message='Signature verification failed',
-                ip_address=get_client_ip(request)
-            )
-            
             return Response({'error': 'Payment verification failed.'}, status=400)
             
     except Transaction.DoesNotExist:
@@ -170,16 +264,9 @@ def payment_failure_api(request):
         transaction_id = request.data.get('transaction_id')
         transaction = Transaction.objects.get(id=transaction_id, user=request.user)
         
+        # only a checkout that is still open can be abandoned, a late call after verify is a no-op
         if transaction.status == 'PENDING':
-            transaction.status = 'FAILED'
-            transaction.save()
-            
-            PaymentLog.objects.create(
-                transaction=transaction,
-                event_type='PAYMENT_FAILED',
-                message='Payment failed or cancelled',
-                ip_address=get_client_ip(request)
-            )
+            state.transition(transaction, 'FAILED', message='Payment failed or cancelled', ip_address=get_client_ip(request))
         
         return Response({
             'message': 'Payment marked as failed.',
@@ -189,18 +276,206 @@ def payment_failure_api(request):
         return Response({'error': 'Transaction not found.'}, status=404)
 
 
+# Staff only, ops refunds in bulk with the bulk_refund command
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@idempotent('refund')
+def refund_api(request):
+    amount = None
+    if request.data.get('amount'):
+        amount, error = parse_amount(request.data.get('amount'))
+        if error:
+            return Response({'amount': [error]}, status=400)
+
+    try:
+        transaction = Transaction.objects.get(id=request.data.get('transaction_id'))
+    except (Transaction.DoesNotExist, ValueError):
+        return Response({'error': 'Transaction not found.'}, status=404)
+
+    created, errors = refunds.create_refunds(
+        [(transaction, amount, request.data.get('reason', ''))], requested_by=request.user
+    )
+    if errors:
+        return Response({'error': errors[0][1]}, status=400)
+
+    refund = refunds.submit(get_razorpay_client(), created[0])
+    refunds.record([refund])
+    transaction.refresh_from_db(fields=['status', 'updated_at'])
+    body = {'refund': serialize_refund(refund), 'transaction': serialize_transaction(transaction)}
+
+    if refund.status == 'FAILED':
+        return Response({'error': f'Refund failed: {refund.error}', **body}, status=502)
+    # PENDING means the gateway did not answer, bulk_refund --pending looks it up later
+    return Response(body, status=201 if refund.status == 'PROCESSED' else 202)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 def transaction_history_api(request):
-    transactions = Transaction.objects.filter(user=request.user).order_by('-created_at')
-    return Response([serialize_transaction(t) for t in transactions])
+    params = request.query_params
+
+    fields = list(dict.fromkeys(f.strip() for f in params.get('fields', '').split(',') if f.strip())) or TRANSACTION_FIELDS
+    unknown = [f for f in fields if f not in TRANSACTION_FIELDS]
+    if unknown:
+        return Response({'fields': [f"Unknown field(s): {', '.join(unknown)}."]}, status=400)
+
+    try:
+        page_size = int(params.get('page_size', settings.TRANSACTION_HISTORY_PAGE_SIZE))
+    except ValueError:
+        return Response({'page_size': ['Enter a valid number.']}, status=400)
+    if page_size < 1:
+        return Response({'page_size': ['Page size must be at least 1.']}, status=400)
+    page_size = min(page_size, settings.TRANSACTION_HISTORY_MAX_PAGE_SIZE)
+
+    filters = Q(user=request.user)
 
+    if params.get('status'):
+        statuses = params['status'].upper().split(',')
+        if not set(statuses) <= {value for value, _ in Transaction.STATUS}:
+            return Response({'status': ['Unknown status.']}, status=400)
+        filters &= Q(status__in=statuses)
 
+    for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+        if params.get(param):
+            value = parse_date_param(params[param])
+            if value is None:
+                return Response({param: ['Enter a valid date.']}, status=400)
+            filters &= Q(**{lookup: value})
+
+    if params.get('cursor'):
+        cursor = decode_cursor(params['cursor'])
+        if cursor is None:
+            return Response({'cursor': ['Invalid cursor.']}, status=400)
+        created_at, pk = cursor
+        filters &= Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+
+    # .values_list() keeps unused columns out of the SELECT, id and created_at go last for the cursor
+    columns = fields + ['id', 'created_at']
+    rows = list(Transaction.objects.filter(filters).order_by('-created_at', '-id').values_list(*columns)[:page_size + 1])
+    # old finalized rows live in transactions_archive, the page is merged from both
+    rows = archive.history(filters, columns, page_size + 1, rows)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1][-1], rows[-1][-2])
+
+    # FastJSONRenderer writes the tuples straight to JSON
+    return Response({
+        'results': transaction_rows(fields, rows),
+        'next_cursor': next_cursor,
+    })
+
+
+# Read through the object cache, state.transition and the Transaction signals drop the entry on every change.
+# Transactions moved to the archive keep their id and are served from there
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def transaction_detail_api(request, transaction_id):
-    try:
-        transaction = Transaction.objects.get(id=transaction_id, user=request.user)
-        return Response(serialize_transaction(transaction))
-    except Transaction.DoesNotExist:
+    def render():
+        transaction = (
+            Transaction.objects.filter(id=transaction_id, user=request.user).first()
+            or ArchivedTransaction.objects.filter(id=transaction_id, user=request.user).first()
+        )
+        return None if transaction is None else JSONRenderer().render(serialize_transaction(transaction))
+
+    cached = object_cache.cached_body(object_cache.transaction_key(request.user.pk, transaction_id), render)
+    if cached is None:
         return Response({'error': 'Transaction not found.'}, status=404)
+    return object_cache.json_response(request, *cached)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def object_cache_stats_api(request):
+    return Response(object_cache.counters.snapshot())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def payment_summary_api(request):
+    # Reads the pre-aggregated payment_summaries rows, never the transactions table
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        return Response({'days': ['Enter a valid number.']}, status=400)
+
+    buckets = PaymentSummary.objects.filter(user=request.user, count__gt=0)
+
+    def totals(group_by):
+        rows = buckets.values(group_by).annotate(count=Sum('count'), total=Sum('total')).order_by(group_by)
+        return {row[group_by]: {'count': row['count'], 'total': f"{row['total']:.2f}"} for row in rows}
+
+    by_status = totals('status')
+    since = timezone.localdate() - timedelta(days=max(days, 1) - 1)
+    by_day = (
+        buckets.filter(day__gte=since)
+        .values('day', 'status')
+        .annotate(count=Sum('count'), total=Sum('total'))
+        .order_by('day', 'status')
+    )
+
+    return Response({
+        'by_status': by_status,
+        'by_currency': totals('currency'),
+        'by_day': [
+            {'day': row['day'].isoformat(), 'status': row['status'], 'count': row['count'], 'total': f"{row['total']:.2f}"}
+            for row in by_day
+        ],
+        'total_count': sum(row['count'] for row in by_status.values()),
+    })
+
+
+# Staff only, streams the whole export without loading it, the export_payments command writes the same files
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_api(request, kind, fmt):
+    if kind not in exports.EXPORTS:
+        return Response({'error': 'Unknown export.'}, status=404)
+    if fmt not in exports.FORMATS:
+        return Response({'error': f"Format must be one of {', '.join(exports.FORMATS)}."}, status=404)
+    params = request.query_params
+
+    statuses = None
+    if params.get('status'):
+        statuses = params['status'].upper().split(',')
+        if not set(statuses) <= set(exports.EXPORTS[kind]['statuses']):
+            return Response({'status': ['Unknown status.']}, status=400)
+
+    dates = {}
+    for param in ('created_after', 'created_before'):
+        if params.get(param):
+            dates[param] = parse_date_param(params[param])
+            if dates[param] is None:
+                return Response({param: ['Enter a valid date.']}, status=400)
+
+    compress = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    rows = exports.export_rows(kind, statuses, **dates)
+    response = StreamingHttpResponse(exports.stream(kind, rows, fmt, compress), content_type=exports.content_type(fmt, compress))
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(kind, fmt, compress)}"'
+    return response
+
+
+# Razorpay calls this directly, the request is authenticated by its HMAC signature instead of a session
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def razorpay_webhook_api(request):
+    if not settings.RAZORPAY_WEBHOOK_SECRET:
+        return Response({'error': 'Webhook secret not configured.'}, status=500)
+
+    body = request.body
+    if not webhooks.valid_signature(body, request.META.get('HTTP_X_RAZORPAY_SIGNATURE')):
+        return Response({'error': 'Invalid webhook signature.'}, status=400)
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return Response({'error': 'Invalid JSON.'}, status=400)
+
+    # Razorpay resends the same event id on retries, fall back to the body hash without it
+    event_id = request.META.get('HTTP_X_RAZORPAY_EVENT_ID') or hashlib.sha256(body).hexdigest()
+    queued = webhooks.receive(event_id, payload)
+
+    return Response({'status': 'queued' if queued else 'duplicate'})
@@ -0,0 +1,225 @@
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, close_old_connections, transaction as db_transaction
+from django.utils import timezone
+
+from .models import Transaction, WebhookEvent
+from . import state
+
+# Razorpay event -> the Transaction status it reports, payments/state.py decides whether the move is legal
+EVENT_STATUS = {
+    'payment.captured': 'SUCCESS',
+    'order.paid': 'SUCCESS',
+    'payment.failed': 'FAILED',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def webhook_options():
+    options = {
+        'ASYNC': True,
+        'DEDUP_CACHE_SIZE': 10000,
+        'QUEUE_SIZE': 10000,
+        'BATCH_SIZE': 100,
+        'POLL_INTERVAL': 0.5,
+    }
+    options.update(getattr(settings, 'RAZORPAY_WEBHOOK', {}))
+    return options
+
+
+def valid_signature(body, signature):
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+class RecentEvents:
+    """Bounded LRU of event ids already stored, redeliveries are answered without touching the DB."""
+
+    def __init__(self, size):
+        self.size = size
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, event_id):
+        with self.lock:
+            if event_id in self.ids:
+                self.ids.move_to_end(event_id)
+                return True
+            return False
+
+    def add(self, event_id):
+        with self.lock:
+            self.ids[event_id] = None
+            self.ids.move_to_end(event_id)
+            if len(self.ids) > self.size:
+                self.ids.popitem(last=False)
+
+
+def payment_entity(payload):
+    return payload.get('payload', {}).get('payment', {}).get('entity', {})
+
+
+def apply_event(event):
+    """Moves the matching Transaction for one webhook, returns False when there is nothing to do."""
+    new_status = EVENT_STATUS.get(event.event)
+    if new_status is None:
+        return False
+
+    payment = payment_entity(event.payload)
+    if not payment.get('order_id'):
+        return False
+    transaction = Transaction.objects.filter(razorpay_order_id=payment['order_id']).first()
+    if transaction is None:
+        return False
+
+    fields = {'razorpay_payment_id': payment['id']} if payment.get('id') else {}
+    return state.transition(
+        transaction, new_status,
+        event_type='WEBHOOK_RECEIVED',
+        payload=event.payload,
+        message=f"{event.event}: {transaction.status} -> {new_status}",
+        **fields,
+    )
+
+
+def process_event(event, statuses=('RECEIVED',)):
+    """
+    Applies one stored event, returns False when it was not in statuses anymore.
+
+    The row lock is the claim. The background processor and process_webhooks
+    can select the same event, the second one skips it or finds it done. An
+    event that fails to apply is marked FAILED, process_webhooks --retry-failed
+    runs it again. If even that update fails the lock goes with the rollback
+    and the event stays RECEIVED for process_webhooks.
+    """
+    try:
+        with db_transaction.atomic():
+            event = WebhookEvent.objects.select_for_update(skip_locked=True).filter(pk=event.pk, status__in=statuses).first()
+            if event is None:
+                return False
+            event.status = 'PROCESSED' if apply_event(event) else 'IGNORED'
+            event.processed_at = timezone.now()
+            event.save(update_fields=['status', 'processed_at'])
+    except Exception as e:
+        WebhookEvent.objects.filter(pk=event.pk, status__in=statuses).update(
+            status='FAILED', error=str(e), processed_at=timezone.now()
+        )
+    return True
+
+
+class WebhookProcessor:
+    """
+    Applies stored webhook events in a background thread.
+
+    The endpoint only stores the event and hands its id over, so Razorpay gets
+    its 200 without waiting on transaction updates. Events that never reach the
+    queue stay RECEIVED and are picked up by the process_webhooks command.
+    """
+
+    def __init__(self, options=None, autostart=True):
+        self.options = options or webhook_options()
+        self.autostart = autostart
+        self.queue = queue.Queue(maxsize=self.options['QUEUE_SIZE'])
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.processed = 0
+
+    def submit(self, event_pk):
+        if not self.options['ASYNC']:
+            self.process([event_pk])
+            return
+        self.ensure_started()
+        try:
+            self.queue.put_nowait(event_pk)
+        except queue.Full:
+            pass  # stays RECEIVED for process_webhooks
+
+    def ensure_started(self):
+        if not self.autostart or (self.thread is not None and self.pid == os.getpid()):
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='webhook-processor', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            batch = self.take_batch(self.options['POLL_INTERVAL'])
+            if batch:
+                self.process_batch(batch)
+            close_old_connections()
+
+    def process_batch(self, event_pks):
+        try:
+            return self.process(event_pks)
+        except Exception:
+            # the claims were rolled back, the events not processed stay RECEIVED for process_webhooks
+            logger.exception('Processing webhook events %s failed, process_webhooks retries them', event_pks)
+            return 0
+
+    def take_batch(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.options['BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def process(self, event_pks):
+        events = WebhookEvent.objects.filter(pk__in=event_pks, status='RECEIVED').order_by('pk')
+        processed = sum(process_event(event) for event in events)
+        self.processed += processed
+        return processed
+
+    def drain(self):
+        while True:
+            batch = self.take_batch(0)
+            if not batch:
+                return
+            self.process(batch)
+
+
+recent_events = RecentEvents(webhook_options()['DEDUP_CACHE_SIZE'])
+processor = WebhookProcessor()
+
+
+def receive(event_id, payload):
+    """Stores a verified webhook once, returns False for a redelivery."""
+    if event_id in recent_events:
+        return False
+    try:
+        with db_transaction.atomic():
+            event = WebhookEvent.objects.create(event_id=event_id, event=payload.get('event', ''), payload=payload)
+    except IntegrityError:
+        recent_events.add(event_id)
+        return False
+    recent_events.add(event_id)
+    db_transaction.on_commit(lambda: processor.submit(event.pk))
+    return True
+
+
+def reset_processor(**kwargs):
+    global processor, recent_events
+    if kwargs.get('setting') == 'RAZORPAY_WEBHOOK':
+        processor = WebhookProcessor()
+        recent_events = RecentEvents(webhook_options()['DEDUP_CACHE_SIZE'])
+
+
+setting_changed.connect(reset_processor)
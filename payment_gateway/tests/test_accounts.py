@@ -0,0 +1,167 @@
+"""
+Account email tests: normalized unique emails, indexed login lookup, atomic signup
+Run: pytest tests/test_accounts.py -v
+"""
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from accounts.backends import EmailBackend
+from accounts.models import Account
+from tests.test_query_plans import explain
+from unittest.mock import patch
+
+USERS = 20000
+LOOKUPS = 200
+
+
+def signup(client, email, password='testpass123'):
+    return client.post('/api/auth/signup/', {
+        'first_name': 'Test', 'last_name': 'User', 'email': email, 'password1': password, 'password2': password,
+    }, content_type='application/json')
+
+
+@pytest.fixture
+def many_users(db):
+    users = User.objects.bulk_create(
+        [User(username=f'user{i}@test.com', email=f'user{i}@test.com') for i in range(USERS)], batch_size=2000
+    )
+    Account.objects.bulk_create([Account(user=user, email=user.email) for user in users], batch_size=2000)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE' if connection.vendor == 'sqlite' else 'ANALYZE accounts')
+    return users
+
+
+@pytest.mark.django_db
+class TestAccountEmail:
+
+    def test_signup_stores_the_normalized_email(self, client):
+        assert signup(client, '  New.User@Test.COM ').status_code == 201
+
+        user = User.objects.get()
+        assert user.email == user.username == 'new.user@test.com'
+        assert user.account.email == 'new.user@test.com'
+
+    def test_duplicate_in_another_case_is_rejected(self, client):
+        assert signup(client, 'dup@test.com').status_code == 201
+
+        response = signup(client, 'DUP@Test.com')
+
+        assert response.status_code == 400
+        assert response.json()['error'] == 'Email already registered.'
+        assert User.objects.count() == 1
+
+    def test_signup_that_loses_the_race_gets_400_and_leaves_no_user(self, client):
+        assert signup(client, 'race@test.com').status_code == 201
+
+        # a second request that passed the pre-check before the first one committed
+        with patch('accounts.views.Account.objects.filter') as precheck:
+            precheck.return_value.exists.return_value = False
+            response = signup(client, 'Race@test.com')
+
+        assert response.status_code == 400
+        assert User.objects.count() == Account.objects.count() == 1
+
+    def test_email_changes_follow_the_user(self):
+        user = User.objects.create_user(username='a@test.com', email='a@test.com', password='x')
+
+        user.email = 'B@Test.com'
+        user.save()
+        assert Account.objects.get(user=user).email == 'b@test.com'
+
+        other = User.objects.create_user(username='c@test.com', email='c@test.com', password='x')
+        other.email = 'b@test.com'
+        with pytest.raises(IntegrityError):
+            other.save()
+
+    def test_admin_rejects_an_email_another_user_has(self, admin_client):
+        User.objects.create_user(username='a@test.com', email='a@test.com', password='x')
+        other = User.objects.create_user(username='c@test.com', email='c@test.com', password='x')
+        form = {'username': other.username, 'email': 'A@test.com', 'date_joined_0': '2026-01-01',
+                'date_joined_1': '00:00:00', 'is_active': 'on'}
+
+        response = admin_client.post(f'/admin/auth/user/{other.pk}/change/', form)
+
+        assert response.status_code == 200
+        assert 'Another user already has this email.' in response.content.decode()
+        assert Account.objects.get(user=other).email == 'c@test.com'
+        form['email'] = 'new@test.com'
+        assert admin_client.post(f'/admin/auth/user/{other.pk}/change/', form).status_code == 302
+        assert Account.objects.get(user=other).email == 'new@test.com'
+
+    def test_last_login_saves_skip_the_account(self):
+        user = User.objects.create_user(username='a@test.com', email='a@test.com', password='x')
+
+        with CaptureQueriesContext(connection) as context:
+            user.save(update_fields=['last_login'])
+
+        assert not any('"accounts"' in q['sql'] for q in context.captured_queries)
+
+
+@pytest.mark.django_db
+class TestEmailBackend:
+
+    def test_login_is_case_insensitive(self, client):
+        User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+
+        response = client.post('/api/auth/login/', {'email': 'Test@TEST.com', 'password': 'testpass123'},
+                               content_type='application/json')
+
+        assert response.status_code == 200
+
+    def test_usernames_without_an_at_still_log_in(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='adminpass')
+
+        assert authenticate(username='admin', password='adminpass') == admin
+        assert authenticate(username='ADMIN@test.com', password='adminpass') == admin
+
+    def test_users_sharing_an_email_from_before_accounts_log_in_by_username(self):
+        oldest = User.objects.create_user(username='Dup@test.com', email='dup@test.com', password='first')
+        # created before accounts.email was unique, the backfill gave the email to the oldest user
+        newer = User.objects.create_user(username='dup@test.com', email='other@test.com', password='second')
+        User.objects.filter(pk=newer.pk).update(email='dup@test.com')
+        Account.objects.filter(user=newer).delete()
+
+        assert authenticate(username='dup@test.com', password='first') == oldest
+        assert authenticate(username='dup@test.com', password='second') == newer
+        assert authenticate(username='DUP@test.com', password='second') is None
+
+    def test_unknown_email_still_hashes(self):
+        with patch('django.contrib.auth.models.User.set_password') as set_password:
+            assert authenticate(username='nobody@test.com', password='x') is None
+
+        set_password.assert_called_once_with('x')
+
+    def test_lookup_is_one_indexed_query_on_a_large_table(self, many_users):
+        backend = EmailBackend()
+        with CaptureQueriesContext(connection) as context:
+            assert backend.get_by_email('USER12345@test.com') == many_users[12345]
+
+        assert len(context.captured_queries) == 1
+        plan = explain(context.captured_queries[0]['sql'])
+        assert 'accounts' in plan and ('INDEX' in plan or 'Index' in plan), plan
+        assert 'Seq Scan' not in plan and 'SCAN auth_user' not in plan and 'SCAN accounts' not in plan, plan
+
+        emails = [f'user{i * 97 % USERS}@test.com' for i in range(LOOKUPS)]
+        started = time.perf_counter()
+        for email in emails:
+            backend.get_by_email(email)
+        per_lookup = (time.perf_counter() - started) / LOOKUPS
+        # a scan of 20k rows takes several milliseconds, an index probe well under one
+        assert per_lookup < 0.005, f"{per_lookup * 1000:.2f} ms per lookup"
+
+
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite test databases lock on concurrent connections')
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_signups_register_the_email_once():
+    emails = ['race@test.com', 'RACE@test.com', 'Race@Test.com', ' race@test.com'] * 2
+
+    with ThreadPoolExecutor(max_workers=len(emails)) as pool:
+        statuses = list(pool.map(lambda email: signup(Client(), email).status_code, emails))
+
+    assert sorted(statuses) == [201] + [400] * (len(emails) - 1)
+    assert User.objects.count() == Account.objects.count() == 1
@@ -0,0 +1,171 @@
+"""
+Admin changelist tests for the large payment tables
+Run: pytest tests/test_admin.py -v
+"""
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from payments.admin import EstimatedCountPaginator
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+from unittest.mock import patch
+from tests.test_query_plans import assert_index_scan
+
+ROWS = 30
+
+
+@pytest.fixture
+def transactions():
+    users = [User.objects.create_user(username=f'user{i}@test.com', email=f'user{i}@test.com', password='x')
+             for i in range(3)]
+    now = timezone.now()
+    transactions = Transaction.objects.bulk_create([
+        Transaction(
+            user=users[i % 3],
+            order_id=f'ORD_{i}',
+            amount=Decimal('10.00'),
+            razorpay_order_id=f'order_Abc{i:03d}',
+            razorpay_payment_id=f'pay_Xyz{i:03d}',
+        )
+        for i in range(ROWS)
+    ])
+    # created_at is auto_now_add, one row a day back from now
+    for i, transaction in enumerate(transactions):
+        transaction.created_at = now - timedelta(days=i)
+        Transaction.objects.filter(pk=transaction.pk).update(created_at=transaction.created_at)
+    PaymentLog.objects.bulk_create([
+        PaymentLog(transaction=t, event_type='ORDER_CREATED', payload={'blob': 'x' * 1000}, message='created')
+        for t in transactions
+    ])
+    return transactions
+
+
+@pytest.fixture
+def admin_client(client):
+    admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='adminpass')
+    client.force_login(admin)
+    return client
+
+
+def changelist(client, model, **params):
+    response = client.get(f'/admin/payments/{model}/', params)
+    assert response.status_code == 200
+    return response.context['cl']
+
+
+@pytest.mark.django_db
+class TestTransactionChangelist:
+
+    def test_one_count_and_no_scans_for_filter_values(self, admin_client, transactions):
+        with CaptureQueriesContext(connection) as context:
+            cl = changelist(admin_client, 'transaction')
+
+        assert cl.result_count == ROWS
+        counts = [q['sql'] for q in context.captured_queries if 'COUNT(' in q['sql'] and '"transactions"' in q['sql']]
+        assert len(counts) == 1
+        assert not any('DISTINCT' in q['sql'] for q in context.captured_queries)
+
+    def test_search_by_exact_order_id(self, admin_client, transactions):
+        assert [t.order_id for t in changelist(admin_client, 'transaction', q='ORD_1').result_list] == ['ORD_1']
+
+    def test_search_by_razorpay_id_prefix(self, admin_client, transactions):
+        cl = changelist(admin_client, 'transaction', q='pay_Xyz01')
+
+        assert sorted(t.razorpay_payment_id for t in cl.result_list) == [f'pay_Xyz{i:03d}' for i in range(10, 20)]
+        # no substring matches
+        assert changelist(admin_client, 'transaction', q='Xyz01').result_count == 0
+
+    def test_search_by_email(self, admin_client, transactions):
+        cl = changelist(admin_client, 'transaction', q='USER1@test.com')
+
+        assert cl.result_count == ROWS // 3
+        assert {t.user.email for t in cl.result_list} == {'user1@test.com'}
+
+    def test_date_filter(self, admin_client, transactions):
+        since = timezone.now() - timedelta(days=6, hours=12)
+        cl = changelist(admin_client, 'transaction', created_at__gte=since.isoformat(sep=' '))
+
+        assert cl.result_count == 7
+
+
+@pytest.mark.django_db
+class TestPaymentLogChangelist:
+
+    def test_payload_is_not_loaded(self, admin_client, transactions):
+        with CaptureQueriesContext(connection) as context:
+            cl = changelist(admin_client, 'paymentlog')
+
+        assert cl.result_count == ROWS
+        selects = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT "payment_logs"."id"')]
+        assert selects and all('"payload"' not in sql for sql in selects)
+
+    def test_search_by_order_id(self, admin_client, transactions):
+        assert changelist(admin_client, 'paymentlog', q='ORD_3').result_count == 1
+
+    def test_change_form_still_shows_the_payload(self, admin_client, transactions):
+        log = PaymentLog.objects.first()
+
+        response = admin_client.get(f'/admin/payments/paymentlog/{log.id}/change/')
+
+        assert response.status_code == 200
+        assert 'x' * 1000 in response.content.decode()
+
+
+@pytest.mark.django_db
+class TestEstimatedCountPaginator:
+
+    def test_large_estimate_replaces_the_count(self, transactions):
+        with patch('payments.admin.estimated_count', return_value=5_000_000):
+            paginator = EstimatedCountPaginator(Transaction.objects.all(), 100)
+
+            assert paginator.count == 5_000_000
+            assert paginator.num_pages == 50_000
+
+    def test_small_estimate_is_counted_exactly(self, transactions):
+        with patch('payments.admin.estimated_count', return_value=25):
+            assert EstimatedCountPaginator(Transaction.objects.all(), 100).count == ROWS
+
+    def test_exact_count_without_an_estimate(self, transactions):
+        # SQLite has no planner statistics to read
+        with patch('payments.admin.estimated_count', return_value=None):
+            assert EstimatedCountPaginator(Transaction.objects.all(), 100).count == ROWS
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='planner statistics and pattern ops indexes are Postgres only')
+@pytest.mark.django_db
+class TestPostgresPlans:
+
+    @pytest.fixture
+    def analyzed(self, transactions):
+        Transaction.objects.bulk_create([
+            Transaction(user=transactions[0].user, order_id=f'BULK_{i}', amount=Decimal('1.00'),
+                        razorpay_order_id=f'order_bulk{i}', razorpay_payment_id=f'pay_bulk{i}')
+            for i in range(20000)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE transactions')
+        return transactions
+
+    def test_estimate_reads_pg_class(self, analyzed):
+        from payments.admin import estimated_count
+
+        assert estimated_count(Transaction.objects.all()) == pytest.approx(20000 + ROWS, rel=0.1)
+
+    def test_prefix_search_uses_the_pattern_ops_index(self, analyzed):
+        sql, params = Transaction.objects.filter(razorpay_payment_id__startswith='pay_Xyz01').query.sql_with_params()
+        with connection.cursor() as cursor:
+            sql = cursor.mogrify(sql, params).decode()
+
+        assert_index_scan(sql, 'txn_razorpay_payment_idx')
+
+    def test_date_filter_uses_the_created_index(self, analyzed):
+        since = timezone.now() - timedelta(days=3)
+        queryset = Transaction.objects.filter(created_at__gte=since, created_at__lt=since + timedelta(days=1))
+        sql, params = queryset.order_by('-created_at', '-id')[:100].query.sql_with_params()
+        with connection.cursor() as cursor:
+            sql = cursor.mogrify(sql, params).decode()
+
+        assert_index_scan(sql, 'txn_created_idx')
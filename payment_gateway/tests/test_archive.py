@@ -0,0 +1,142 @@
+"""
+Transaction archive tests
+Run: pytest tests/test_archive.py -v
+"""
+import json
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Q
+from django.utils import timezone
+from payment_gateway import object_cache
+from payments import archive, summary
+from payments.models import ArchivedTransaction, Transaction, PaymentLog, Refund
+from decimal import Decimal
+
+
+def make_transaction(user, name, days_old, status='SUCCESS'):
+    transaction = Transaction.objects.create(user=user, order_id=f'ORD_{name}', amount=Decimal('10.00'), status=status)
+    # created_at is auto_now_add
+    transaction.created_at = timezone.now() - timedelta(days=days_old)
+    Transaction.objects.filter(pk=transaction.pk).update(created_at=transaction.created_at)
+    return transaction
+
+
+def history_ids(client, **params):
+    ids, cursor = [], None
+    while True:
+        response = client.get('/api/payments/transactions/', {**params, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids += [row['id'] for row in response.data['results']]
+        cursor = response.data['next_cursor']
+        if not cursor:
+            return ids
+
+
+@pytest.mark.django_db
+class TestArchive:
+
+    def test_only_old_finalized_transactions_move(self, user):
+        moved = [make_transaction(user, status, 400, status) for status in ('SUCCESS', 'FAILED', 'REFUNDED')]
+        kept = [make_transaction(user, 'PENDING', 400, 'PENDING'), make_transaction(user, 'RECENT', 10)]
+
+        assert archive.archive(age_days=365, pause=0) == 3
+
+        assert set(ArchivedTransaction.objects.values_list('id', flat=True)) == {t.id for t in moved}
+        assert set(Transaction.objects.values_list('id', flat=True)) == {t.id for t in kept}
+        archived = ArchivedTransaction.objects.get(id=moved[0].id)
+        assert (archived.order_id, archived.amount, archived.created_at) == (moved[0].order_id, Decimal('10.00'), moved[0].created_at)
+
+    def test_moves_in_batches(self, user):
+        for i in range(7):
+            make_transaction(user, i, 400)
+
+        assert archive.archive(age_days=365, batch_size=3, pause=0, limit=5) == 5
+        assert archive.archive(age_days=365, batch_size=3, pause=0) == 2
+        assert not Transaction.objects.exists()
+
+    def test_refunds_go_inline_and_logs_stay(self, user):
+        refunded = make_transaction(user, 'REFUNDED', 400, 'REFUNDED')
+        Refund.objects.create(transaction=refunded, amount=Decimal('10.00'), status='PROCESSED', razorpay_refund_id='rfnd_1')
+        log = PaymentLog.objects.create(transaction=refunded, event_type='PAYMENT_REFUNDED', message='refunded')
+        waiting = make_transaction(user, 'WAITING', 400)
+        Refund.objects.create(transaction=waiting, amount=Decimal('5.00'))
+
+        assert archive.archive(age_days=365, pause=0) == 1
+
+        [refund] = ArchivedTransaction.objects.get(id=refunded.id).refunds
+        assert (refund['amount'], refund['status'], refund['razorpay_refund_id']) == ('10.00', 'PROCESSED', 'rfnd_1')
+        assert not Refund.objects.filter(transaction_id=refunded.id).exists()
+        # a refund still PENDING keeps the transaction in place
+        assert Transaction.objects.filter(id=waiting.id).exists()
+        assert PaymentLog.objects.get(id=log.id).transaction_id == refunded.id
+
+    def test_summary_counts_both_tables(self, user):
+        for i in range(3):
+            make_transaction(user, i, 400 - i)
+        make_transaction(user, 'RECENT', 1)
+        summary.rebuild()
+
+        archive.archive(age_days=365, pause=0)
+
+        assert summary.differences() == {}
+
+    def test_command(self, user):
+        make_transaction(user, 'OLD', 100)
+
+        call_command('archive_transactions', age_days=200, pause=0)
+        assert Transaction.objects.count() == 1
+        call_command('archive_transactions', age_days=50, dry_run=True)
+        assert Transaction.objects.count() == 1
+        call_command('archive_transactions', age_days=50, pause=0)
+        assert ArchivedTransaction.objects.count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestArchivedLookups:
+
+    def test_detail_is_unchanged_after_archiving(self, client, user, settings):
+        settings.OBJECT_CACHE = {**settings.OBJECT_CACHE, 'ENABLED': True}
+        transaction = make_transaction(user, 'OLD', 400)
+        before = client.get(f'/api/payments/transactions/{transaction.id}/')
+
+        archive.archive(age_days=365, pause=0)
+        # the cached body stays valid, read from the archive table once it is gone
+        cached = client.get(f'/api/payments/transactions/{transaction.id}/')
+        object_cache.cache().clear()
+        archived = client.get(f'/api/payments/transactions/{transaction.id}/')
+
+        assert before.status_code == cached.status_code == archived.status_code == 200
+        assert json.loads(archived.content) == json.loads(before.content)
+
+    def test_detail_of_another_users_archived_transaction(self, client, user):
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        transaction = make_transaction(other, 'OTHER', 400)
+        archive.archive(age_days=365, pause=0)
+
+        assert client.get(f'/api/payments/transactions/{transaction.id}/').status_code == 404
+
+    def test_history_merges_both_tables(self, client, user):
+        transactions = [make_transaction(user, i, days) for i, days in enumerate([1, 500, 2, 400, 3, 450])]
+        pending = make_transaction(user, 'PENDING', 420, 'PENDING')
+        newest_first = [t.id for t in sorted(Transaction.objects.filter(user=user), key=lambda t: t.created_at, reverse=True)]
+
+        assert archive.archive(age_days=365, pause=0) == 3
+
+        assert history_ids(client, page_size=2) == newest_first
+        assert history_ids(client, status='PENDING') == [pending.id]
+        old = timezone.now() - timedelta(days=410)
+        assert history_ids(client, created_before=old.isoformat()) == [pending.id, transactions[5].id, transactions[1].id]
+
+    def test_history_keeps_rows_archived_between_the_reads(self, user):
+        for i in range(4):
+            make_transaction(user, i, 400 + i)
+        filters = Q(user=user)
+        columns = ['order_id', 'id', 'created_at']
+        hot = list(Transaction.objects.filter(filters).order_by('-created_at', '-id').values_list(*columns)[:10])
+
+        archive.archive(age_days=365, pause=0, limit=2)
+
+        assert [row[0] for row in archive.history(filters, columns, 10, hot)] == ['ORD_0', 'ORD_1', 'ORD_2', 'ORD_3']
@@ -0,0 +1,62 @@
+"""
+Async payment endpoint tests
+Run: pytest tests/test_async_payments.py -v
+"""
+import pytest
+from asgiref.sync import async_to_sync
+from payments.models import Transaction, PaymentLog
+from payments.views import payment_signature
+from decimal import Decimal
+from unittest.mock import patch, AsyncMock, MagicMock
+
+
+@pytest.mark.django_db
+class TestAsyncPayments:
+
+    @patch('payments.async_views.get_async_client')
+    def test_create_order(self, mock_gateway, async_client, user):
+        async_client.force_login(user)
+        mock_gateway.return_value = MagicMock(create_order=AsyncMock(
+            side_effect=lambda data: {'id': 'order_async_1', 'receipt': data['receipt']}
+        ))
+
+        response = async_to_sync(async_client.post)('/api/payments/async/create-order/', {
+            'amount': '250.00',
+            'description': 'Async payment'
+        }, content_type='application/json')
+
+        assert response.status_code == 200
+        transaction = Transaction.objects.get(user=user)
+        assert transaction.razorpay_order_id == 'order_async_1'
+        assert transaction.amount == Decimal('250.00')
+        assert PaymentLog.objects.filter(transaction=transaction, event_type='ORDER_CREATED').exists()
+
+    def test_create_order_validates_amount(self, async_client, user):
+        async_client.force_login(user)
+
+        response = async_to_sync(async_client.post)('/api/payments/async/create-order/', {
+            'amount': '0.50'
+        }, content_type='application/json')
+
+        assert response.status_code == 400
+        assert response.json() == {'amount': ['Amount must be at least 1.']}
+
+    def test_unauthenticated_cannot_create_order(self, async_client):
+        response = async_to_sync(async_client.post)('/api/payments/async/create-order/', {
+            'amount': '500.00'
+        }, content_type='application/json')
+
+        assert response.status_code == 403
+
+    def test_verify_payment(self, async_client, user):
+        async_client.force_login(user)
+        Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'), razorpay_order_id='order_1')
+
+        response = async_to_sync(async_client.post)('/api/payments/async/verify/', {
+            'razorpay_order_id': 'order_1',
+            'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': payment_signature('order_1', 'pay_1'),
+        }, content_type='application/json')
+
+        assert response.status_code == 200
+        assert Transaction.objects.get(order_id='ORD_1').status == 'SUCCESS'
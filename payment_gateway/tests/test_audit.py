@@ -0,0 +1,177 @@
+"""
+Batched PaymentLog writer tests
+Run: pytest tests/test_audit.py -v
+"""
+import os
+import pytest
+import subprocess
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from payments import audit
+from payments.audit import PaymentLogWriter
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+
+
+@pytest.fixture
+def transaction():
+    user = User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+    return Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'))
+
+
+@pytest.fixture
+def make_writer(tmp_path):
+    def make(**options):
+        return PaymentLogWriter({**audit.log_options(), 'SPILL_PATH': tmp_path / 'spill.jsonl', **options}, autostart=False)
+    return make
+
+
+@pytest.mark.django_db
+class TestPaymentLogWriter:
+
+    def test_async_entries_are_batched_after_commit(self, make_writer, transaction, django_capture_on_commit_callbacks):
+        writer = make_writer(DEFAULT_DURABILITY='async', BATCH_SIZE=50)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            for i in range(120):
+                writer.log(transaction, 'ORDER_CREATED', message=f'event {i}')
+        assert PaymentLog.objects.count() == 0
+        assert writer.metrics()['queue_depth'] == 120
+
+        writer.drain()
+
+        assert PaymentLog.objects.count() == 120
+        metrics = writer.metrics()
+        assert metrics['queue_depth'] == 0
+        assert metrics['written'] == 120
+        assert metrics['flushes'] == 3
+
+    def test_rolled_back_entries_are_never_queued(self, make_writer, transaction, django_capture_on_commit_callbacks):
+        writer = make_writer(DEFAULT_DURABILITY='async')
+
+        with django_capture_on_commit_callbacks(execute=False):
+            writer.log(transaction, 'ORDER_CREATED')
+
+        assert writer.metrics()['queue_depth'] == 0
+
+    def test_sync_events_skip_the_queue(self, make_writer, transaction):
+        writer = make_writer(DEFAULT_DURABILITY='async', DURABILITY={'PAYMENT_SUCCESS': 'sync'})
+
+        writer.log(transaction, 'PAYMENT_SUCCESS', message='paid')
+
+        assert PaymentLog.objects.filter(event_type='PAYMENT_SUCCESS').count() == 1
+
+    def test_full_queue_spills_to_disk(self, make_writer, transaction, django_capture_on_commit_callbacks):
+        writer = make_writer(DEFAULT_DURABILITY='async', QUEUE_SIZE=5)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            for i in range(8):
+                writer.log(transaction, 'ORDER_CREATED', payload={'n': i})
+
+        assert writer.metrics()['spilled'] == 3
+        assert len(writer.spill_path.read_text().splitlines()) == 3
+
+        writer.drain()
+        assert writer.replay_spill() == 3
+        assert PaymentLog.objects.count() == 8
+        assert not writer.spill_path.exists()
+
+    def test_failed_flush_spills_entries(self, make_writer, transaction, monkeypatch):
+        writer = make_writer()
+        entry = {'transaction_id': transaction.id, 'event_type': 'ORDER_CREATED', 'payload': None,
+                 'message': '', 'ip_address': '10.0.0.1', 'created_at': transaction.created_at}
+
+        def db_down(*args, **kwargs):
+            raise RuntimeError('database unavailable')
+        monkeypatch.setattr(PaymentLog.objects, 'bulk_create', db_down)
+
+        assert writer.flush([entry]) is False
+        assert writer.metrics()['spilled'] == 1
+
+    def test_durable_events_survive_in_spill_file(self, make_writer, transaction, django_capture_on_commit_callbacks):
+        writer = make_writer(DURABILITY={'PAYMENT_FAILED': 'durable'})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            writer.log(transaction, 'PAYMENT_FAILED', message='cancelled')
+
+        # a fresh writer, as after a crash and restart, picks the entry up from disk
+        restarted = make_writer()
+        assert restarted.replay_spill() == 1
+        log = PaymentLog.objects.get()
+        assert log.event_type == 'PAYMENT_FAILED'
+        assert log.transaction_id == transaction.id
+
+    def test_flush_payment_logs_command(self, make_writer, transaction, settings, tmp_path):
+        settings.PAYMENT_LOG = {**settings.PAYMENT_LOG, 'SPILL_PATH': tmp_path / 'spill.jsonl'}
+        make_writer().spill([{'transaction_id': transaction.id, 'event_type': 'ORDER_CREATED', 'payload': {'id': 'order_1'},
+                              'message': '', 'ip_address': None, 'created_at': transaction.created_at}])
+
+        call_command('flush_payment_logs')
+
+        assert PaymentLog.objects.get().payload == {'id': 'order_1'}
+
+    def test_only_files_of_exited_workers_are_taken_over(self, make_writer, transaction):
+        writer = make_writer()
+        entry = {'transaction_id': transaction.id, 'event_type': 'ORDER_CREATED', 'payload': None,
+                 'message': '', 'ip_address': None, 'created_at': transaction.created_at}
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        for pid in (os.getppid(), exited.pid):
+            writer.spill([entry])
+            os.replace(writer.spill_path, writer.spill_path.with_name(f'spill.jsonl.{pid}.replay'))
+
+        assert writer.replay_orphans() == 1
+
+        assert PaymentLog.objects.count() == 1
+        # the live parent may be replaying its file right now
+        assert [path.name for path in writer.spill_path.parent.iterdir() if path.name.endswith('.replay')] \
+            == [f'spill.jsonl.{os.getppid()}.replay']
+
+    def test_unreplayable_file_is_quarantined(self, make_writer, transaction, caplog):
+        writer = make_writer()
+        entry = {'transaction_id': transaction.id, 'event_type': 'ORDER_CREATED', 'payload': None,
+                 'message': '', 'ip_address': None, 'created_at': transaction.created_at}
+        writer.spill([entry])
+        with open(writer.spill_path, 'a') as spill_file:
+            spill_file.write('{"truncated": \n')
+
+        assert writer.replay_spill() == 0
+
+        failed = writer.spill_path.with_name(f'spill.jsonl.{os.getpid()}.replay.failed')
+        assert failed.exists()
+        assert 'moved to' in caplog.text
+        assert (writer.metrics()['replay_failures'], writer.metrics()['quarantined']) == (1, 1)
+        # the pid claims new spill data again
+        writer.spill([entry])
+        assert writer.replay_spill() == 1
+        assert PaymentLog.objects.count() == 1
+
+    def test_database_errors_keep_the_file_for_a_retry(self, make_writer, transaction, monkeypatch):
+        writer = make_writer()
+        writer.spill([{'transaction_id': transaction.id, 'event_type': 'ORDER_CREATED', 'payload': None,
+                       'message': '', 'ip_address': None, 'created_at': transaction.created_at}])
+
+        def db_down(*args, **kwargs):
+            raise OperationalError('database unavailable')
+        monkeypatch.setattr(PaymentLog.objects, 'bulk_create', db_down)
+
+        with pytest.raises(OperationalError):
+            writer.replay_spill()
+
+        monkeypatch.undo()
+        assert writer.metrics()['replay_failures'] == 1
+        assert writer.replay_spill() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_background_thread_flushes_on_interval(make_writer, transaction):
+    writer = make_writer(DEFAULT_DURABILITY='async', FLUSH_INTERVAL=0.05)
+    writer.autostart = True
+
+    for i in range(10):
+        writer.log(transaction, 'ORDER_CREATED', message=f'event {i}')
+    writer.close()
+
+    assert PaymentLog.objects.count() == 10
+    assert writer.metrics()['queue_depth'] == 0
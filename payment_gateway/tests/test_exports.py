@@ -0,0 +1,150 @@
+"""
+Export tests
+Run: pytest tests/test_exports.py -v
+"""
+import csv
+import gzip
+import io
+import json
+import subprocess
+import sys
+import pytest
+from django.conf import settings
+from django.contrib.auth.models import User
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from payments import archive
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+
+# Streams rows from a generator through payments.exports and prints the peak RSS in KB
+PEAK_RSS_SCRIPT = """
+import resource, sys
+from datetime import datetime, timezone
+import django
+django.setup()
+from payments import exports
+
+count, fmt, compress = int(sys.argv[1]), sys.argv[2], sys.argv[3] == 'gzip'
+now = datetime.now(timezone.utc)
+rows = (
+    (i, f'ORD_{i:012d}', i % 1000, f'user{i % 1000}@test.com', '499.00', 'INR', 'SUCCESS',
+     f'order_{i}', f'pay_{i}', 'Synthetic export row', now, now)
+    for i in range(count)
+)
+size = 0
+for chunk in exports.stream('transactions', rows, fmt, compress):
+    size += len(chunk)
+assert size > 0
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss_kb(count, fmt, compress):
+    result = subprocess.run(
+        [sys.executable, '-c', PEAK_RSS_SCRIPT, str(count), fmt, 'gzip' if compress else 'plain'],
+        cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    return int(result.stdout.split()[-1])
+
+
+@pytest.fixture
+def staff(client):
+    user = User.objects.create_user(username='ops@test.com', email='ops@test.com', password='testpass123', is_staff=True)
+    client.force_login(user)
+    return user
+
+
+@pytest.fixture
+def customer():
+    return User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+
+
+@pytest.fixture
+def transactions(customer):
+    transactions = Transaction.objects.bulk_create([
+        Transaction(user=customer, order_id=f'ORD_{i}', amount=Decimal('100.50'), status='SUCCESS' if i % 2 else 'FAILED')
+        for i in range(10)
+    ])
+    PaymentLog.objects.bulk_create([
+        PaymentLog(transaction=t, event_type='ORDER_CREATED', payload={'amount': '100.50'}, message='Order created')
+        for t in transactions
+    ])
+    return transactions
+
+
+def body(response):
+    return b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestExports:
+
+    def test_csv_export_streams_every_row(self, client, staff, transactions):
+        response = client.get('/api/payments/export/transactions.csv')
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'] == 'text/csv'
+        assert 'attachment; filename="transactions-' in response['Content-Disposition']
+        rows = list(csv.DictReader(io.StringIO(body(response).decode())))
+        assert [row['order_id'] for row in rows] == [t.order_id for t in transactions]
+        assert rows[0]['amount'] == '100.50'
+        assert rows[0]['user_email'] == 'test@test.com'
+
+    def test_gzipped_jsonl_with_filters(self, client, staff, transactions):
+        response = client.get('/api/payments/export/transactions.jsonl', {'gzip': '1', 'status': 'success'})
+
+        assert response['Content-Type'] == 'application/gzip'
+        lines = gzip.decompress(body(response)).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        assert len(rows) == 5
+        assert {row['status'] for row in rows} == {'SUCCESS'}
+        assert rows[0]['amount'] == '100.50'
+
+    def test_archived_transactions_are_exported_in_id_order(self, client, staff, transactions):
+        assert archive.archive(age_days=0, pause=0, limit=4, now=timezone.now() + timedelta(days=1)) == 4
+
+        response = client.get('/api/payments/export/transactions.csv', {'status': 'SUCCESS,FAILED'})
+
+        rows = list(csv.DictReader(io.StringIO(body(response).decode())))
+        assert [row['order_id'] for row in rows] == [t.order_id for t in transactions]
+        assert rows[0]['user_email'] == 'test@test.com'
+
+    def test_log_export_keeps_payload_json(self, client, staff, transactions):
+        response = client.get('/api/payments/export/logs.csv', {'status': 'ORDER_CREATED', 'created_after': '2000-01-01'})
+
+        rows = list(csv.DictReader(io.StringIO(body(response).decode())))
+        assert len(rows) == 10
+        assert json.loads(rows[0]['payload']) == {'amount': '100.50'}
+        assert rows[0]['transaction_order_id'] == 'ORD_0'
+
+    def test_bad_requests(self, client, staff):
+        assert client.get('/api/payments/export/refunds.csv').status_code == 404
+        assert client.get('/api/payments/export/transactions.xml').status_code == 404
+        assert client.get('/api/payments/export/transactions.csv', {'status': 'LOST'}).status_code == 400
+        assert client.get('/api/payments/export/logs.csv', {'created_before': 'soon'}).status_code == 400
+
+    def test_customers_cannot_export(self, client, customer):
+        client.force_login(customer)
+
+        assert client.get('/api/payments/export/transactions.csv').status_code == 403
+
+    def test_command(self, transactions, tmp_path):
+        output = tmp_path / 'transactions.jsonl.gz'
+
+        call_command('export_payments', 'transactions', '--format', 'jsonl', '--gzip', '--status', 'FAILED',
+                     '--output', str(output), '--chunk-size', '3')
+
+        with gzip.open(output, 'rt') as export:
+            rows = [json.loads(line) for line in export]
+        assert [row['order_id'] for row in rows] == [t.order_id for t in transactions if t.status == 'FAILED']
+
+
+def test_memory_stays_flat_for_a_million_rows():
+    baseline = peak_rss_kb(10_000, 'csv', True)
+    peak = peak_rss_kb(1_000_000, 'csv', True)
+
+    # holding the rows or the output would take hundreds of MB
+    assert peak - baseline < 16 * 1024
@@ -0,0 +1,36 @@
+"""
+Razorpay client registry tests
+Run: pytest tests/test_gateway.py -v
+"""
+from payments import gateway
+from payments.gateway import ClientRegistry, IDEMPOTENT_METHODS
+
+
+class TestClientRegistry:
+
+    def test_client_is_reused(self, settings):
+        settings.RAZORPAY_KEY_ID = 'rzp_test_key'
+        settings.RAZORPAY_KEY_SECRET = 'secret'
+
+        assert gateway.get_client() is gateway.get_client()
+
+    def test_keys_change_gives_new_client(self):
+        registry = ClientRegistry()
+
+        assert registry.get('key_a', 'secret') is not registry.get('key_b', 'secret')
+
+    def test_registry_forgets_clients_after_fork(self):
+        registry = ClientRegistry()
+        client = registry.get('key', 'secret')
+        registry.pid = -1  # pretend we are now a forked child
+
+        assert registry.get('key', 'secret') is not client
+
+    def test_session_is_pooled_with_timeouts(self, settings):
+        settings.RAZORPAY_HTTP = {**settings.RAZORPAY_HTTP, 'POOL_MAXSIZE': 32, 'CONNECT_TIMEOUT': 1, 'READ_TIMEOUT': 5}
+        adapter = ClientRegistry().get('key', 'secret').session.get_adapter('https://api.razorpay.com')
+
+        assert adapter._pool_maxsize == 32
+        assert adapter.timeout == (1, 5)
+        assert 'POST' not in adapter.max_retries.allowed_methods
+        assert adapter.max_retries.allowed_methods == IDEMPOTENT_METHODS
@@ -0,0 +1,172 @@
+"""
+Idempotency-Key tests
+Run: pytest tests/test_idempotency.py -v
+"""
+import asyncio
+import pytest
+import time
+from asgiref.sync import async_to_sync
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from payments.models import Transaction, PaymentLog, IdempotencyKey
+from payments.views import payment_signature
+from decimal import Decimal
+from unittest.mock import patch, AsyncMock, MagicMock
+
+
+@pytest.fixture(autouse=True)
+def idempotency_settings(settings):
+    settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET = 'key', 'secret'
+    caches[settings.IDEMPOTENCY['CACHE']].clear()
+
+
+@pytest.fixture
+def gateway():
+    with patch('payments.views.get_razorpay_client') as mock_razorpay:
+        mock_client = MagicMock()
+        mock_client.order.create.side_effect = lambda data: {'id': f"order_{data['receipt']}", 'receipt': data['receipt']}
+        mock_razorpay.return_value = mock_client
+        yield mock_client
+
+
+def create_order(client, key, amount='100.00'):
+    return client.post('/api/payments/create-order/', {'amount': amount}, content_type='application/json',
+                       HTTP_IDEMPOTENCY_KEY=key)
+
+
+@pytest.mark.django_db
+class TestIdempotency:
+
+    def test_retry_replays_first_response(self, client, user, gateway):
+        client.force_login(user)
+
+        first = create_order(client, 'key-1')
+        second = create_order(client, 'key-1')
+
+        assert first.status_code == second.status_code == 200
+        assert second.json() == first.json()
+        assert second['Idempotent-Replayed'] == 'true'
+        assert Transaction.objects.count() == 1
+        assert gateway.order.create.call_count == 1
+
+    def test_replay_falls_back_to_database(self, client, user, gateway, settings):
+        client.force_login(user)
+        first = create_order(client, 'key-1')
+
+        # another worker has nothing in its local cache
+        caches[settings.IDEMPOTENCY['CACHE']].clear()
+        second = create_order(client, 'key-1')
+
+        assert second.json() == first.json()
+        assert gateway.order.create.call_count == 1
+
+    def test_key_reused_with_different_body(self, client, user, gateway):
+        client.force_login(user)
+        create_order(client, 'key-1', '100.00')
+
+        response = create_order(client, 'key-1', '200.00')
+
+        assert response.status_code == 422
+        assert Transaction.objects.count() == 1
+
+    def test_keys_are_scoped_per_user(self, client, user, gateway):
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='testpass123')
+        client.force_login(user)
+        create_order(client, 'key-1')
+        client.force_login(other)
+        create_order(client, 'key-1')
+
+        assert Transaction.objects.count() == 2
+
+    def test_server_error_is_not_stored(self, client, user, gateway):
+        client.force_login(user)
+        gateway.order.create.side_effect = [Exception('gateway down'), {'id': 'order_1', 'receipt': 'r'}]
+
+        assert create_order(client, 'key-1').status_code == 500
+        assert create_order(client, 'key-1').status_code == 200
+        assert IdempotencyKey.objects.get().status_code == 200
+
+    def test_request_in_flight_elsewhere(self, client, user, gateway, settings):
+        settings.IDEMPOTENCY = {**settings.IDEMPOTENCY, 'WAIT_TIMEOUT': 0.1}
+        client.force_login(user)
+        IdempotencyKey.objects.create(user=user, endpoint='create-order', key='key-1', request_hash='x')
+
+        response = create_order(client, 'key-1')
+
+        assert response.status_code == 409
+        assert gateway.order.create.call_count == 0
+
+    def test_abandoned_claim_is_taken_over(self, client, user, gateway):
+        client.force_login(user)
+        IdempotencyKey.objects.create(user=user, endpoint='create-order', key='key-1', request_hash='x',
+                                      created_at=timezone.now() - timedelta(minutes=5))
+
+        assert create_order(client, 'key-1').status_code == 200
+        assert Transaction.objects.count() == 1
+
+    def test_verify_replay_logs_once(self, client, user):
+        client.force_login(user)
+        Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'), razorpay_order_id='order_1')
+        body = {
+            'razorpay_order_id': 'order_1',
+            'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': payment_signature('order_1', 'pay_1'),
+        }
+
+        for _ in range(2):
+            response = client.post('/api/payments/verify/', body, content_type='application/json', HTTP_IDEMPOTENCY_KEY='pay_1')
+            assert response.status_code == 200
+
+        assert PaymentLog.objects.filter(event_type='PAYMENT_SUCCESS').count() == 1
+
+    def test_parallel_async_duplicates_create_one_order(self, async_client, user):
+        async_client.force_login(user)
+
+        async def slow_order(data):
+            await asyncio.sleep(0.2)
+            return {'id': 'order_async_1', 'receipt': data['receipt']}
+        gateway = MagicMock(create_order=AsyncMock(side_effect=slow_order))
+
+        async def fire():
+            return await asyncio.gather(*(
+                async_client.post('/api/payments/async/create-order/', {'amount': '100.00'},
+                                  content_type='application/json', headers={'Idempotency-Key': 'key-1'})
+                for _ in range(10)
+            ))
+
+        with patch('payments.async_views.get_async_client', return_value=gateway):
+            responses = async_to_sync(fire)()
+
+        assert [r.status_code for r in responses] == [200] * 10
+        assert len({r.content for r in responses}) == 1
+        assert gateway.create_order.await_count == 1
+        assert Transaction.objects.count() == 1
+
+
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite test databases lock on concurrent connections')
+@pytest.mark.django_db(transaction=True)
+def test_parallel_sync_duplicates_create_one_order(user, gateway):
+    create = gateway.order.create.side_effect
+
+    def slow_create(data):
+        time.sleep(0.2)
+        return create(data)
+    gateway.order.create.side_effect = slow_create
+
+    def fire(_):
+        client = Client()
+        client.force_login(user)
+        return create_order(client, 'key-1')
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        responses = list(pool.map(fire, range(5)))
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert len({r.content for r in responses}) == 1
+    assert gateway.order.create.call_count == 1
+    assert Transaction.objects.count() == 1
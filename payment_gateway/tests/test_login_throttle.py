@@ -0,0 +1,127 @@
+"""
+Password hashing and login throttling tests
+Run: pytest tests/test_login_throttle.py -v
+"""
+import pytest
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from accounts import throttle
+from accounts.throttle import TokenBuckets
+from unittest.mock import patch
+
+
+def login(client, email='test@test.com', password='testpass123', ip='10.0.0.1'):
+    return client.post('/api/auth/login/', {'email': email, 'password': password},
+                       content_type='application/json', REMOTE_ADDR=ip)
+
+
+@pytest.mark.django_db
+class TestPasswordHashing:
+
+    def test_new_passwords_use_the_preferred_hasher(self, user, settings):
+        assert identify_hasher(user.password).algorithm == get_hasher().algorithm
+        assert get_hasher().__class__.__module__ == 'accounts.hashers'
+
+    def test_old_hashes_are_upgraded_on_login(self, client, user, settings):
+        user.password = make_password('testpass123', hasher='pbkdf2_sha1')
+        user.save()
+
+        assert login(client).status_code == 200
+
+        user.refresh_from_db()
+        assert not user.password.startswith('pbkdf2_sha1$')
+        assert user.check_password('testpass123')
+
+    def test_changed_cost_parameters_rehash_on_login(self, client, user, settings):
+        settings.PASSWORD_HASHER = 'pbkdf2'
+        settings.PASSWORD_HASHERS = ['accounts.hashers.TunedPBKDF2PasswordHasher']
+        settings.PASSWORD_HASHING = {'PBKDF2_ITERATIONS': 1000}
+        user.set_password('testpass123')
+        user.save()
+        assert user.password.startswith('pbkdf2_sha256$1000$')
+
+        settings.PASSWORD_HASHING = {'PBKDF2_ITERATIONS': 2000}
+        assert login(client).status_code == 200
+
+        user.refresh_from_db()
+        assert user.password.startswith('pbkdf2_sha256$2000$')
+
+
+@pytest.mark.django_db
+class TestLoginThrottle:
+
+    def test_failed_attempts_are_throttled_before_hashing(self, client, user, settings):
+        settings.LOGIN_THROTTLE = {'EMAIL_BURST': 3, 'EMAIL_PER_MINUTE': 1}
+        for _ in range(3):
+            assert login(client, password='wrong').status_code == 401
+
+        with patch('accounts.views.authenticate', wraps=authenticate) as hashed:
+            responses = [login(client, password='wrong') for _ in range(5)] + [login(client)]
+
+        assert [r.status_code for r in responses] == [429] * 6
+        assert int(responses[0]['Retry-After']) > 0
+        hashed.assert_not_called()
+
+    def test_one_ip_cannot_spray_many_emails(self, client, settings):
+        settings.LOGIN_THROTTLE = {'IP_BURST': 5, 'IP_PER_MINUTE': 1}
+
+        statuses = [login(client, email=f'user{i}@test.com', password='wrong').status_code for i in range(8)]
+
+        assert statuses == [401] * 5 + [429] * 3
+        assert login(client, email='user0@test.com', password='wrong', ip='10.0.0.2').status_code == 401
+
+    def test_forwarded_for_is_only_trusted_behind_proxies(self, client, settings):
+        settings.LOGIN_THROTTLE = {'IP_BURST': 2, 'IP_PER_MINUTE': 1}
+
+        def attempt(forwarded_for):
+            return client.post('/api/auth/login/', {'email': 'nobody@test.com', 'password': 'wrong'},
+                               content_type='application/json', REMOTE_ADDR='10.0.0.9',
+                               HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        # a rotated header does not buy new buckets
+        assert [attempt(f'192.0.2.{i}') for i in range(3)] == [401, 401, 429]
+
+        settings.LOGIN_THROTTLE = {'IP_BURST': 2, 'IP_PER_MINUTE': 1, 'TRUSTED_PROXIES': 1}
+        # the load balancer appends the real client last
+        assert [attempt(f'192.0.2.{i}, 198.51.100.7') for i in range(3)] == [401, 401, 429]
+        assert attempt('198.51.100.8') == 401
+
+    def test_successful_logins_do_not_count(self, client, user, settings):
+        settings.LOGIN_THROTTLE = {'EMAIL_BURST': 2, 'IP_BURST': 2}
+
+        assert [login(client).status_code for _ in range(6)] == [200] * 6
+
+    def test_email_limit_ignores_case(self, client, user, settings):
+        settings.LOGIN_THROTTLE = {'EMAIL_BURST': 2, 'EMAIL_PER_MINUTE': 1}
+
+        statuses = [login(client, email=email, password='wrong').status_code
+                    for email in ['test@test.com', 'TEST@test.com', 'Test@Test.com']]
+
+        assert statuses == [401, 401, 429]
+        assert throttle.login_limits('10.0.0.1', ' Test@TEST.com\t')[1][0] == 'email:test@test.com'
+
+
+class TestTokenBuckets:
+
+    def test_refills_over_time(self):
+        buckets = TokenBuckets(max_keys=10)
+        limits = [('ip:1', 1.0, 2)]
+
+        assert buckets.take(limits, now=0) == 0
+        assert buckets.take(limits, now=0) == 0
+        assert buckets.take(limits, now=0) == pytest.approx(1.0)
+        assert buckets.take(limits, now=1.5) == 0
+
+    def test_rejection_takes_no_token_from_any_bucket(self):
+        buckets = TokenBuckets(max_keys=10)
+        buckets.take([('email:a', 1.0, 1)], now=0)
+
+        assert buckets.take([('ip:1', 1.0, 1), ('email:a', 1.0, 1)], now=0) > 0
+        assert buckets.take([('ip:1', 1.0, 1)], now=0) == 0
+
+    def test_least_recently_used_buckets_are_evicted(self):
+        buckets = TokenBuckets(max_keys=2)
+        for key in ['a', 'b', 'c']:
+            buckets.take([(key, 1.0, 1)], now=0)
+
+        assert list(buckets.buckets) == ['b', 'c']
@@ -0,0 +1,127 @@
+"""
+Request, database and gateway metrics tests
+Run: pytest tests/test_metrics.py -v
+"""
+import pytest
+import re
+import threading
+from benchmarks.stub_gateway import StubGateway
+from payment_gateway import metrics
+from payments import audit, gateway
+from payments.models import Transaction
+from decimal import Decimal
+
+
+@pytest.fixture
+def stub(settings):
+    stub = StubGateway().start()
+    settings.RAZORPAY_HTTP = {**settings.RAZORPAY_HTTP, 'BASE_URL': stub.url, 'RETRIES': 0}
+    settings.RAZORPAY_KEY_ID = 'rzp_test_key'
+    settings.RAZORPAY_KEY_SECRET = 'secret'
+    yield stub
+    gateway.registry.close()
+    stub.stop()
+
+
+def sample(text, name, **labels):
+    """Value of one series in the exposition text, 0 when it is not there."""
+    for line in text.splitlines():
+        match = re.fullmatch(rf'{name}(?:\{{(.*)\}})? (\S+)', line)
+        if match and dict(re.findall(r'(\w+)="([^"]*)"', match.group(1) or '')) == labels:
+            return float(match.group(2))
+    return 0
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestRequestMetrics:
+
+    def test_latency_and_queries_by_route(self, client, user):
+        for _ in range(3):
+            assert client.get('/api/payments/transactions/').status_code == 200
+
+        text = metrics.render()
+        route = 'api/payments/transactions/'
+        assert sample(text, 'http_request_duration_seconds_count', endpoint=route, method='GET', status='200') == 3
+        assert sample(text, 'http_request_duration_seconds_bucket',
+                      endpoint=route, method='GET', status='200', le='+Inf') == 3
+        assert sample(text, 'db_queries_per_request_count', endpoint=route) == 3
+        assert sample(text, 'db_query_duration_seconds_count', endpoint=route) == \
+            sample(text, 'db_queries_per_request_sum', endpoint=route) > 0
+        assert sample(text, 'http_request_app_seconds_count', endpoint=route) == 3
+
+    def test_ids_do_not_make_new_series(self, client, user):
+        client.get('/api/payments/transactions/1/')
+        client.get('/api/payments/transactions/2/')
+
+        text = metrics.render()
+        assert sample(text, 'http_request_duration_seconds_count',
+                      endpoint='api/payments/transactions/<int:transaction_id>/', method='GET', status='404') == 2
+
+    def test_gateway_latency_and_errors(self, client, user, stub):
+        assert client.post('/api/payments/create-order/', {'amount': '100.00'},
+                           content_type='application/json').status_code == 200
+        stub.failure_rate = 1.0
+        assert client.post('/api/payments/create-order/', {'amount': '100.00'},
+                           content_type='application/json').status_code == 500
+
+        text = metrics.render()
+        assert sample(text, 'gateway_request_duration_seconds_count', operation='POST /v1/orders') == 2
+        assert sample(text, 'gateway_errors_total', operation='POST /v1/orders', error='502') == 1
+
+    def test_gateway_ids_are_collapsed(self, stub):
+        gateway.get_client().order.fetch('order_abc123')
+
+        assert sample(metrics.render(), 'gateway_request_duration_seconds_count', operation='GET /v1/orders/{id}') == 1
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+
+    def test_token(self, client, settings):
+        settings.METRICS = {**settings.METRICS, 'TOKEN': 'scrape-token'}
+
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+        response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert '# TYPE http_request_duration_seconds histogram' in response.content.decode()
+
+    @pytest.mark.usefixtures('logged_in_user')
+    def test_staff_only_without_a_token(self, client, user, settings):
+        settings.METRICS = {**settings.METRICS, 'TOKEN': ''}
+        assert client.get('/metrics').status_code == 403
+
+        user.is_staff = True
+        user.save()
+        assert client.get('/metrics').status_code == 200
+
+
+class TestRegistry:
+
+    def test_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        for value in [0.001, 0.02, 0.02, 3.0, 60.0]:
+            registry.observe('latency', (), value, (0.01, 0.1, 1))
+
+        counts = registry.collect().histograms[('latency', ())]
+        assert counts[:-1] == [1, 2, 0, 2]
+        assert counts[-1] == pytest.approx(63.041)
+
+    def test_threads_write_their_own_shard_and_are_merged_when_they_exit(self):
+        registry = metrics.Registry()
+
+        def work():
+            for _ in range(1000):
+                registry.inc('calls', ())
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert registry.collect().counters[('calls', ())] == 8000
+        assert registry.shards == []
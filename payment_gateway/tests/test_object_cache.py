@@ -0,0 +1,178 @@
+"""
+Object cache tests
+Run: pytest tests/test_object_cache.py -v
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from payment_gateway import caches, object_cache
+from payments import state
+from payments.models import Transaction
+from decimal import Decimal
+
+
+@pytest.fixture(autouse=True)
+def enabled(settings):
+    # the tests run in one process, locmem is shared by every request and change here
+    settings.OBJECT_CACHE = {**settings.OBJECT_CACHE, 'ENABLED': True}
+
+
+@pytest.fixture
+def transaction(user):
+    return Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'), razorpay_order_id='order_1')
+
+
+def detail(client, transaction, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(f'/api/payments/transactions/{transaction.id}/', headers=headers)
+
+
+def table_queries(context, table):
+    return [q['sql'] for q in context.captured_queries if f'"{table}"' in q['sql']]
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestTransactionDetailCache:
+
+    def test_second_read_comes_from_cache(self, client, transaction):
+        first = detail(client, transaction)
+        with CaptureQueriesContext(connection) as context:
+            second = detail(client, transaction)
+
+        assert second.status_code == 200
+        assert second.json() == first.json() == {**first.json(), 'order_id': 'ORD_1', 'status': 'PENDING'}
+        assert second['ETag'] == first['ETag']
+        assert table_queries(context, 'transactions') == []
+        assert object_cache.counters.snapshot()['hits'] == 1
+
+    def test_matching_etag_gets_304(self, client, transaction):
+        etag = detail(client, transaction)['ETag']
+
+        response = detail(client, transaction, etag)
+
+        assert response.status_code == 304
+        assert response.content == b''
+        assert object_cache.counters.snapshot()['not_modified'] == 1
+
+    def test_status_change_invalidates(self, client, transaction):
+        etag = detail(client, transaction)['ETag']
+
+        state.transition(transaction, 'SUCCESS', razorpay_payment_id='pay_1')
+        response = detail(client, transaction, etag)
+
+        assert response.status_code == 200
+        assert response.json()['status'] == 'SUCCESS'
+        assert response['ETag'] != etag
+
+    def test_save_and_bulk_transition_invalidate(self, client, transaction):
+        detail(client, transaction)
+        transaction.description = 'Edited in the admin'
+        transaction.save()
+        assert detail(client, transaction).json()['description'] == 'Edited in the admin'
+
+        state.bulk_transition([transaction.id], 'FAILED')
+        assert detail(client, transaction).json()['status'] == 'FAILED'
+
+    def test_other_users_transaction_is_not_found_or_cached(self, client, transaction):
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        client.force_login(other)
+
+        assert detail(client, transaction).status_code == 404
+        assert object_cache.cache().get(object_cache.transaction_key(other.id, transaction.id)) is None
+
+    def test_disabled_cache_still_sends_etags(self, client, transaction, settings):
+        settings.OBJECT_CACHE = {**settings.OBJECT_CACHE, 'ENABLED': False}
+        etag = detail(client, transaction)['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            assert detail(client, transaction, etag).status_code == 304
+        assert table_queries(context, 'transactions')
+        assert object_cache.counters.snapshot()['hits'] == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestCurrentUserCache:
+
+    def test_body_is_cached_and_the_user_is_not(self, client, user):
+        first = client.get('/api/auth/user/')
+        with CaptureQueriesContext(connection) as context:
+            second = client.get('/api/auth/user/', headers={'If-None-Match': first['ETag']})
+
+        assert first.json()['email'] == 'test@test.com'
+        assert second.status_code == 304
+        assert object_cache.counters.snapshot()['hits'] == 1
+        # request.user is read from the database every time, deactivation applies on the next request
+        assert table_queries(context, 'auth_user')
+
+    def test_deactivated_user_is_logged_out(self, client, user):
+        client.get('/api/auth/user/')
+
+        User.objects.filter(pk=user.pk).update(is_active=False)
+
+        assert client.get('/api/auth/user/').status_code == 403
+
+    def test_saving_the_user_invalidates(self, client, user):
+        etag = client.get('/api/auth/user/')['ETag']
+
+        user.first_name = 'Renamed'
+        user.save()
+        response = client.get('/api/auth/user/', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.json()['first_name'] == 'Renamed'
+
+    def test_password_change_still_logs_the_session_out(self, client, user):
+        client.get('/api/auth/user/')
+
+        user.set_password('changed-password')
+        user.save()
+
+        assert client.get('/api/auth/user/').status_code == 403
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestCounters:
+
+    def test_stats_endpoint(self, client, transaction):
+        detail(client, transaction)
+        detail(client, transaction)
+        staff = User.objects.create_user(username='ops@test.com', email='ops@test.com', password='x', is_staff=True)
+        client.force_login(staff)
+
+        stats = client.get('/api/payments/cache-stats/').json()
+
+        # transaction miss + hit
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_ratio'] == 0.5
+        assert stats['invalidations'] > 0
+
+    def test_customers_cannot_read_stats(self, client, user):
+        assert client.get('/api/payments/cache-stats/').status_code == 403
+
+
+class TestSharedCacheCheck:
+
+    @pytest.mark.parametrize('backend', [
+        'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.filebased.FileBasedCache',
+    ])
+    def test_per_process_cache_is_refused(self, settings, backend):
+        settings.CACHES = {**settings.CACHES, 'objects': {'BACKEND': backend, 'LOCATION': 'objects'}}
+        # commands change transactions from other processes, one web worker is not enough
+        settings.WEB_CONCURRENCY = 1
+
+        with pytest.raises(ImproperlyConfigured, match='OBJECT_CACHE_ENABLED'):
+            caches.check_object_cache()
+
+    def test_shared_or_disabled_cache_passes(self, settings):
+        settings.CACHES = {**settings.CACHES, 'objects': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        caches.check_object_cache()
+
+        settings.OBJECT_CACHE = {**settings.OBJECT_CACHE, 'ENABLED': False}
+        settings.CACHES = {**settings.CACHES, 'objects': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        caches.check_object_cache()
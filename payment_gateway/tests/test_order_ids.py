@@ -0,0 +1,154 @@
+"""
+Order id generation tests
+Run: pytest tests/test_order_ids.py -v
+"""
+import multiprocessing
+import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from payments.models import Transaction
+from payments.order_ids import TIMESTAMP_WIDTH, TimeOrderedOrderIdGenerator
+from unittest.mock import patch, MagicMock
+
+THREADS = 16
+PROCESSES = 4
+ORDERS_PER_CLIENT = 10
+TOKENS_PER_PROCESS = 2500
+
+# created before the pool forks, like the generator of a gunicorn --preload master
+PRELOADED = TimeOrderedOrderIdGenerator()
+
+
+def fake_razorpay():
+    mock_client = MagicMock()
+    mock_client.order.create.side_effect = lambda data: {'id': f"order_{data['receipt']}", 'receipt': data['receipt']}
+    return patch('payments.views.get_razorpay_client', return_value=mock_client)
+
+
+def create_orders(user_id):
+    """Status codes of ORDERS_PER_CLIENT create-order requests from one logged in client."""
+    client = Client()
+    client.force_login(User.objects.get(pk=user_id))
+    statuses = [
+        client.post('/api/payments/create-order/', {'amount': '10.00'}, content_type='application/json').status_code
+        for _ in range(ORDERS_PER_CLIENT)
+    ]
+    connection.close()
+    return statuses
+
+
+def timed_tokens(count):
+    """(ms before, token, ms after) for count tokens of PRELOADED, generated by four threads."""
+    def generate(_):
+        tokens = []
+        for _ in range(count // 4):
+            before = time.time_ns() // 1_000_000
+            token = PRELOADED.next_token()
+            tokens.append((before, token, time.time_ns() // 1_000_000))
+        return tokens
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        return sum(pool.map(generate, range(4)), [])
+
+
+class TestOrderIdGenerator:
+
+    def test_ids_fit_razorpay_receipt(self):
+        generator = TimeOrderedOrderIdGenerator(worker_id=7)
+        user = MagicMock(id=1234567890)
+
+        assert len(generator.next_id(user)) <= 40
+
+    def test_ids_are_time_ordered(self):
+        generator = TimeOrderedOrderIdGenerator(worker_id=1)
+        tokens = [generator.next_token() for _ in range(100)]
+
+        assert [t[:9] for t in tokens] == sorted(t[:9] for t in tokens)
+
+    def test_parallel_generation_has_no_collisions(self):
+        generator = TimeOrderedOrderIdGenerator(worker_id=3)
+        user = MagicMock(id=1)
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            ids = list(pool.map(lambda _: generator.next_id(user), range(20000)))
+
+        assert len(set(ids)) == len(ids)
+
+    def test_workers_do_not_collide(self):
+        generators = [TimeOrderedOrderIdGenerator(worker_id=i) for i in range(8)]
+        user = MagicMock(id=1)
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            ids = list(pool.map(lambda i: generators[i % 8].next_id(user), range(8000)))
+
+        assert len(set(ids)) == len(ids)
+
+    def test_threads_and_forked_workers_are_unique_and_time_ordered(self):
+        with multiprocessing.get_context('fork').Pool(PROCESSES) as pool:
+            generated = sum(pool.map(timed_tokens, [TOKENS_PER_PROCESS] * PROCESSES), [])
+        generated += timed_tokens(TOKENS_PER_PROCESS)
+        tokens = [token for _, token, _ in generated]
+
+        assert len(tokens) >= 10000
+        assert len(set(tokens)) == len(tokens)
+        # the prefix is the generation millisecond, so string order is time order
+        assert all(before <= int(token[:TIMESTAMP_WIDTH], 36) <= after for before, token, after in generated)
+        assert sorted(tokens) == sorted(tokens, key=lambda t: (int(t[:TIMESTAMP_WIDTH], 36), t))
+
+
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite test databases lock on concurrent connections')
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentCreateOrder:
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+
+    def assert_unique_orders(self, statuses, count):
+        # a duplicate order_id fails its request on the unique constraint
+        assert statuses == [200] * count
+        order_ids = list(Transaction.objects.values_list('order_id', flat=True))
+        assert len(order_ids) == len(set(order_ids)) == count
+
+    def test_threads(self, user):
+        with fake_razorpay(), ThreadPoolExecutor(max_workers=THREADS) as pool:
+            statuses = sum(pool.map(create_orders, [user.id] * THREADS), [])
+
+        self.assert_unique_orders(statuses, THREADS * ORDERS_PER_CLIENT)
+
+    def test_worker_processes(self, user):
+        # forked children open their own connections
+        connection.close()
+        with fake_razorpay(), multiprocessing.get_context('fork').Pool(PROCESSES) as pool:
+            statuses = sum(pool.map(create_orders, [user.id] * PROCESSES * 2), [])
+
+        self.assert_unique_orders(statuses, PROCESSES * 2 * ORDERS_PER_CLIENT)
+
+
+@pytest.mark.django_db
+class TestCreateOrderIds:
+
+    @patch('payments.views.get_razorpay_client')
+    def test_create_order_does_not_count_transactions(self, mock_razorpay, client):
+        user = User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+        client.force_login(user)
+
+        mock_client = MagicMock()
+        mock_client.order.create.side_effect = lambda data: {'id': f"order_{data['receipt']}", 'receipt': data['receipt']}
+        mock_razorpay.return_value = mock_client
+
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(50):
+                response = client.post('/api/payments/create-order/', {'amount': '10.00'}, content_type='application/json')
+                assert response.status_code == 200
+
+        assert not any('COUNT(' in q['sql'] for q in queries.captured_queries)
+
+        order_ids = list(Transaction.objects.values_list('order_id', flat=True))
+        assert len(order_ids) == 50
+        assert len(set(order_ids)) == 50
+        assert all(o.startswith(f"ORD_{user.id}_") for o in order_ids)
@@ -0,0 +1,133 @@
+"""
+payment_logs partitioning, retention and archive tests
+Run: pytest tests/test_partitions.py -v
+
+Partitions only exist on Postgres, the month arithmetic and the archive
+writer are covered on any database.
+"""
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+from payments import partitions
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+
+
+def utc(year, month, day=1):
+    return datetime(year, month, day, tzinfo=dt_timezone.utc)
+
+
+@pytest.fixture
+def transaction():
+    user = User.objects.create_user(username='test@test.com', email='test@test.com', password='x')
+    return Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'))
+
+
+def log_at(transaction, created_at, message='event'):
+    return PaymentLog.objects.create(transaction=transaction, event_type='ORDER_CREATED', message=message,
+                                     payload={'at': created_at.isoformat()}, created_at=created_at)
+
+
+class TestMonths:
+
+    def test_add_months_crosses_years(self):
+        assert partitions.add_months(utc(2026, 11), 3) == utc(2027, 2)
+        assert partitions.add_months(utc(2026, 1), -13) == utc(2024, 12)
+
+    def test_names_round_trip(self):
+        assert partitions.partition_name(utc(2026, 3)) == 'payment_logs_y2026m03'
+        assert partitions.partition_month('payment_logs_y2026m03') == utc(2026, 3)
+        assert partitions.partition_month('payment_logs_default') is None
+
+
+@pytest.mark.django_db
+class TestArchive:
+
+    def test_archive_holds_only_the_range(self, transaction, tmp_path):
+        for day in [1, 15, 31]:
+            log_at(transaction, utc(2025, 1, day), message=f'jan {day}')
+        log_at(transaction, utc(2025, 2, 1), message='feb')
+        path = tmp_path / 'payment_logs_y2025m01.jsonl.gz'
+
+        rows = partitions.archive_range(utc(2025, 1), utc(2025, 2), path)
+
+        with gzip.open(path, 'rt') as archive:
+            lines = [json.loads(line) for line in archive]
+        assert rows == 3
+        assert [line['message'] for line in lines] == ['jan 1', 'jan 15', 'jan 31']
+        assert lines[0]['transaction_order_id'] == 'ORD_1'
+        assert lines[0]['payload'] == {'at': '2025-01-01T00:00:00+00:00'}
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_command_needs_a_partitioned_table(self):
+        if connection.vendor == 'postgresql':
+            pytest.skip('payment_logs is partitioned on Postgres')
+        with pytest.raises(CommandError, match='not a partitioned table'):
+            call_command('partition_payment_logs')
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='declarative partitioning is Postgres only')
+@pytest.mark.django_db
+class TestPartitions:
+
+    def partition_of(self, log):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM payment_logs WHERE id = %s', [log.id])
+            return cursor.fetchone()[0]
+
+    def test_rows_land_in_their_month(self, transaction):
+        assert partitions.is_partitioned()
+        log = log_at(transaction, timezone.now())
+
+        assert self.partition_of(log) == partitions.partition_name(timezone.now())
+        assert PaymentLog.objects.filter(transaction=transaction).get() == log
+
+    def test_ensure_partitions_is_idempotent(self):
+        now = timezone.now()
+        partitions.ensure_partitions(6, now)
+
+        assert partitions.ensure_partitions(6, now) == []
+        months = {month for month, _ in partitions.partitions()}
+        assert partitions.add_months(partitions.month_start(now), 6) in months
+
+    def test_stray_rows_move_out_of_the_default_partition(self, transaction):
+        far = partitions.add_months(partitions.month_start(timezone.now()), 24)
+        log = log_at(transaction, far + timedelta(days=3))
+        assert self.partition_of(log) == partitions.DEFAULT_PARTITION
+
+        name = partitions.create_partition(far)
+
+        assert self.partition_of(log) == name
+        assert partitions.default_rows() == 0
+
+    def test_expired_partitions_are_archived_and_dropped(self, transaction, tmp_path):
+        now = timezone.now()
+        old = partitions.add_months(partitions.month_start(now), -14)
+        partitions.create_partition(old)
+        for day in range(1, 6):
+            log_at(transaction, old + timedelta(days=day))
+        recent = log_at(transaction, now)
+
+        call_command('partition_payment_logs', retention_months=12, archive_dir=str(tmp_path))
+
+        name = partitions.partition_name(old)
+        assert name not in [n for _, n in partitions.partitions()]
+        with gzip.open(tmp_path / f'{name}.jsonl.gz', 'rt') as archive:
+            assert len(archive.readlines()) == 5
+        assert list(PaymentLog.objects.all()) == [recent]
+
+    def test_dry_run_changes_nothing(self, transaction, tmp_path):
+        old = partitions.add_months(partitions.month_start(timezone.now()), -14)
+        partitions.create_partition(old)
+        before = partitions.partitions()
+
+        call_command('partition_payment_logs', dry_run=True, archive_dir=str(tmp_path))
+
+        assert partitions.partitions() == before
+        assert not any(tmp_path.iterdir())
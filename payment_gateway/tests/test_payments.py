@@ -57,7 +57,7 @@ class TestPayments:
         response = client.get('/api/payments/transactions/')
         
         assert response.status_code == 200
-        assert len(response.data) == 1
+        assert len(response.data['results']) == 1
     
     def test_unauthenticated_cannot_create_order(self, client):
         response = client.post('/api/payments/create-order/', {
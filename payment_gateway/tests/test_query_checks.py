@@ -0,0 +1,114 @@
+"""
+N+1 and slow query detection tests
+Run: pytest tests/test_query_checks.py -v
+
+conftest.py runs every test with the checks on in raise mode, these tests
+cover the detector itself and the admin pages it found.
+"""
+import logging
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from payment_gateway import query_checks
+from payment_gateway.query_checks import QueryProblems, fingerprint
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+
+ROWS = 10
+
+
+@pytest.fixture
+def transactions():
+    users = [User.objects.create_user(username=f'user{i}@test.com', email=f'user{i}@test.com', password='x')
+             for i in range(ROWS)]
+    transactions = [
+        Transaction.objects.create(user=user, order_id=f'ORD_{i}', amount=Decimal('10.00'))
+        for i, user in enumerate(users)
+    ]
+    for transaction in transactions:
+        PaymentLog.objects.create(transaction=transaction, event_type='ORDER_CREATED', message='created')
+    return transactions
+
+
+@pytest.fixture
+def admin_client(client):
+    admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='adminpass')
+    client.force_login(admin)
+    return client
+
+
+class TestFingerprint:
+
+    def test_values_are_taken_out(self):
+        assert fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'it''s'") == \
+            fingerprint("SELECT * FROM t WHERE id = 17 AND name = 'other'")
+
+    def test_list_lengths_are_taken_out(self):
+        assert fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)') == fingerprint('SELECT * FROM t WHERE id IN (%s)')
+        assert fingerprint('INSERT INTO t VALUES (%s, %s), (%s, %s)') == fingerprint('INSERT INTO t VALUES (%s, %s)')
+
+    def test_different_shapes_differ(self):
+        assert fingerprint('SELECT * FROM t WHERE id = %s') != fingerprint('SELECT * FROM t WHERE user_id = %s')
+
+
+@pytest.mark.django_db
+class TestDetector:
+
+    def test_n_plus_one_raises_with_its_origin(self, transactions):
+        with pytest.raises(QueryProblems) as problems:
+            with query_checks.inspect('printing transactions'):
+                [str(t) for t in Transaction.objects.all()]
+
+        assert f'N+1: {ROWS} x SELECT' in str(problems.value)
+        assert 'auth_user' in str(problems.value)
+        assert 'payments/models.py' in str(problems.value)
+
+    def test_select_related_passes(self, transactions):
+        with query_checks.inspect('printing transactions') as report:
+            [str(t) for t in Transaction.objects.select_related('user')]
+
+        assert sum(report.counts.values()) == 1
+
+    def test_slow_queries(self, transactions):
+        with pytest.raises(QueryProblems, match='slow query'):
+            with query_checks.inspect('everything is slow', SLOW_QUERY_MS=0):
+                Transaction.objects.count()
+
+    def test_log_mode_only_warns(self, transactions, caplog):
+        with caplog.at_level(logging.WARNING, logger='payment_gateway.query_checks'):
+            with query_checks.inspect('printing transactions', MODE='log'):
+                [str(t) for t in Transaction.objects.all()]
+
+        assert 'N+1' in caplog.text
+
+    @pytest.mark.query_checks(N_PLUS_ONE=1)
+    def test_requests_are_checked(self, client, transactions):
+        client.force_login(transactions[0].user)
+
+        with pytest.raises(QueryProblems, match='GET /api/payments/transactions/'):
+            client.get('/api/payments/transactions/')
+
+    @pytest.mark.query_checks(N_PLUS_ONE=1)
+    def test_async_requests_are_checked(self, async_client, transactions):
+        async_client.force_login(transactions[0].user)
+
+        # the session and user are read on a sync_to_async thread's connection
+        with pytest.raises(QueryProblems, match='POST /api/payments/async/create-order/: N[+]1: 1 x SELECT'):
+            async_to_sync(async_client.post)('/api/payments/async/create-order/', {'amount': '0.50'},
+                                             content_type='application/json')
+
+
+@pytest.mark.django_db
+class TestAdminChangelists:
+
+    def test_transactions(self, admin_client, transactions):
+        response = admin_client.get('/admin/payments/transaction/')
+
+        assert response.status_code == 200
+        assert 'ORD_9' in response.content.decode()
+
+    def test_payment_logs(self, admin_client, transactions):
+        response = admin_client.get('/admin/payments/paymentlog/')
+
+        assert response.status_code == 200
+        assert 'ORD_9' in response.content.decode()
@@ -0,0 +1,117 @@
+"""
+Query budget tests for the payment write endpoints
+Run: pytest tests/test_query_counts.py -v
+
+Counts include the session read of the default db session engine and the
+user lookup of every request. Sessions are not rewritten on every request
+(payment_gateway/middleware.py). Inside the test transaction each
+atomic block shows up as a SAVEPOINT / RELEASE pair.
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.utils import timezone
+from payments.models import Transaction, PaymentSummary
+from payments import state
+from payments.views import payment_signature
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+# session SELECT, user SELECT
+REQUEST_OVERHEAD = 2
+
+
+@pytest.fixture
+def user(client, settings):
+    settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET = 'key', 'secret'
+    user = User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+    # through the endpoint, force_login skips the middleware that stamps a new session
+    client.post('/api/auth/login/', {'email': 'test@test.com', 'password': 'testpass123'}, content_type='application/json')
+    # steady state, the summary buckets for today already exist
+    for status in ['PENDING', 'SUCCESS', 'FAILED']:
+        PaymentSummary.objects.create(user=user, day=timezone.localdate(), status=status, count=0, total=0)
+    return user
+
+
+@pytest.fixture
+def transaction(user):
+    return Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'), razorpay_order_id='order_1')
+
+
+def verify_body(signature=None):
+    return {
+        'razorpay_order_id': 'order_1',
+        'razorpay_payment_id': 'pay_1',
+        'razorpay_signature': signature or payment_signature('order_1', 'pay_1'),
+    }
+
+
+@pytest.mark.django_db
+class TestQueryBudget:
+
+    @patch('payments.views.get_razorpay_client')
+    def test_create_order(self, mock_razorpay, client, user, django_assert_num_queries):
+        mock_client = MagicMock()
+        mock_client.order.create.side_effect = lambda data: {'id': 'order_1', 'receipt': data['receipt']}
+        mock_razorpay.return_value = mock_client
+
+        # SAVEPOINT, INSERT transaction, UPDATE summary, INSERT log, RELEASE
+        with django_assert_num_queries(REQUEST_OVERHEAD + 5):
+            response = client.post('/api/payments/create-order/', {'amount': '10.00'}, content_type='application/json')
+
+        assert response.status_code == 200
+        assert Transaction.objects.get().razorpay_order_id == 'order_1'
+
+    def test_verify(self, client, transaction, django_assert_num_queries):
+        # SELECT transaction, SAVEPOINT, conditional UPDATE, 2 summary UPDATEs, INSERT log, RELEASE
+        with django_assert_num_queries(REQUEST_OVERHEAD + 7):
+            response = client.post('/api/payments/verify/', verify_body(), content_type='application/json')
+
+        assert response.status_code == 200
+        transaction.refresh_from_db()
+        assert transaction.status == 'SUCCESS'
+
+    def test_verify_bad_signature(self, client, transaction, django_assert_num_queries):
+        with django_assert_num_queries(REQUEST_OVERHEAD + 7):
+            response = client.post('/api/payments/verify/', verify_body('bad'), content_type='application/json')
+
+        assert response.status_code == 400
+
+    def test_repeated_verify_writes_nothing(self, client, transaction, django_assert_num_queries):
+        client.post('/api/payments/verify/', verify_body(), content_type='application/json')
+
+        # SELECT transaction and an empty SAVEPOINT / RELEASE
+        with django_assert_num_queries(REQUEST_OVERHEAD + 3):
+            response = client.post('/api/payments/verify/', verify_body(), content_type='application/json')
+
+        assert response.status_code == 200
+
+    def test_failure(self, client, transaction, django_assert_num_queries):
+        # SELECT transaction, SAVEPOINT, conditional UPDATE, 2 summary UPDATEs, INSERT log, RELEASE
+        with django_assert_num_queries(REQUEST_OVERHEAD + 7):
+            response = client.post('/api/payments/failure/', {'transaction_id': transaction.id}, content_type='application/json')
+
+        assert response.data['transaction']['status'] == 'FAILED'
+
+    def test_failure_of_finished_payment_writes_nothing(self, client, transaction, django_assert_num_queries):
+        Transaction.objects.filter(pk=transaction.pk).update(status='SUCCESS')
+
+        with django_assert_num_queries(REQUEST_OVERHEAD + 1):
+            response = client.post('/api/payments/failure/', {'transaction_id': transaction.id}, content_type='application/json')
+
+        assert response.data['transaction']['status'] == 'SUCCESS'
+
+
+@pytest.mark.django_db
+class TestTransition:
+
+    def test_lost_race_writes_nothing(self, transaction, django_assert_num_queries):
+        # verify completed the payment after this instance was read
+        Transaction.objects.filter(pk=transaction.pk).update(status='SUCCESS', razorpay_payment_id='pay_verify')
+
+        # SAVEPOINT, conditional UPDATE matching no row, the refresh, RELEASE
+        with django_assert_num_queries(4):
+            assert not state.transition(transaction, 'FAILED')
+
+        assert transaction.status == 'SUCCESS'
+        assert transaction.razorpay_payment_id == 'pay_verify'
+        assert PaymentSummary.objects.get(status='FAILED').count == 0
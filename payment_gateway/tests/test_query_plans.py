@@ -0,0 +1,167 @@
+"""
+Query plan regression tests, every hot endpoint query has to be served by an index
+Run: pytest tests/test_query_plans.py -v
+
+The SQL each endpoint actually runs is captured and fed back through EXPLAIN,
+so a migration that drops or changes an index fails here.
+"""
+import pytest
+import re
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+
+USERS = 20
+TRANSACTIONS_PER_USER = 500
+
+
+def explain(sql):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def assert_index_scan(sql, index):
+    plan = explain(sql)
+    assert index in plan, plan
+    assert 'Seq Scan' not in plan, plan
+    return plan
+
+
+def partitions(table):
+    """Names of the partitions of table, or of the indexes attached to a partitioned index."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = inhrelid JOIN pg_class parent ON parent.oid = inhparent "
+            "WHERE parent.relname = %s",
+            [table],
+        )
+        return {name for name, in cursor.fetchall()}
+
+
+def assert_partitioned_index_scan(sql, table, index):
+    """
+    assert_index_scan for payment_logs, range partitioned on Postgres by migration 0011.
+
+    The plan names each partition's own index, those are mapped back to the
+    parent index through pg_inherits. Empty partitions, the DEFAULT one for
+    instance, are cheapest to read sequentially and are left out.
+    """
+    if connection.vendor == 'sqlite':
+        return assert_index_scan(sql, index)
+    plan = explain(sql)
+    assert {index, *partitions(index)} & set(re.findall(r'(?:Index (?:Only )?Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)', plan)), plan
+    empty = set()
+    with connection.cursor() as cursor:
+        for partition in partitions(table):
+            cursor.execute(f'SELECT NOT EXISTS (SELECT 1 FROM "{partition}")')
+            if cursor.fetchone()[0]:
+                empty.add(partition)
+    assert set(re.findall(r'Seq Scan on (\w+)', plan)) <= empty, plan
+    return plan
+
+
+def table_query(queries, table):
+    selects = [q['sql'] for q in queries.captured_queries
+               if q['sql'].startswith('SELECT') and f'FROM "{table}"' in q['sql']]
+    assert selects, f"no query on {table}"
+    return selects[-1]
+
+
+@pytest.fixture
+def dataset(db):
+    users = User.objects.bulk_create([User(username=f'user{i}@test.com', email=f'user{i}@test.com') for i in range(USERS)])
+    now = timezone.now()
+    Transaction.objects.bulk_create([
+        Transaction(
+            user=user,
+            order_id=f'ORD_{user.id}_{i}',
+            amount=Decimal('10.00'),
+            status='PENDING' if i % 50 == 0 else 'SUCCESS',
+            razorpay_order_id=f'order_{user.id}_{i}',
+            razorpay_payment_id=f'pay_{user.id}_{i}',
+            created_at=now - timedelta(minutes=i),
+        )
+        for user in users for i in range(TRANSACTIONS_PER_USER)
+    ], batch_size=2000)
+    transactions = Transaction.objects.only('id')
+    PaymentLog.objects.bulk_create([
+        PaymentLog(transaction=t, event_type='ORDER_CREATED', message='seed') for t in transactions
+    ], batch_size=2000)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('ANALYZE')
+        else:
+            cursor.execute('ANALYZE transactions')
+            cursor.execute('ANALYZE payment_logs')
+    return users
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+
+    def test_history_uses_user_created_index(self, client, dataset):
+        client.force_login(dataset[0])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/payments/transactions/')
+        assert response.status_code == 200
+        assert_index_scan(table_query(queries, 'transactions'), 'txn_user_created_idx')
+        assert_index_scan(table_query(queries, 'transactions_archive'), 'txn_archive_user_created_idx')
+
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/payments/transactions/', {'cursor': response.data['next_cursor']})
+        assert_index_scan(table_query(queries, 'transactions'), 'txn_user_created_idx')
+
+    def test_verify_uses_razorpay_order_index(self, client, dataset, settings):
+        settings.RAZORPAY_KEY_SECRET = 'secret'
+        user = dataset[3]
+        client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            client.post('/api/payments/verify/', {
+                'razorpay_order_id': f'order_{user.id}_7',
+                'razorpay_payment_id': 'pay_x',
+                'razorpay_signature': 'bad',
+            }, content_type='application/json')
+        assert_index_scan(table_query(queries, 'transactions'), 'txn_razorpay_order_idx')
+
+    def test_detail_uses_primary_key(self, client, dataset):
+        user = dataset[5]
+        client.force_login(user)
+        transaction = Transaction.objects.filter(user=user).first()
+
+        with CaptureQueriesContext(connection) as queries:
+            client.get(f'/api/payments/transactions/{transaction.id}/')
+        plan = explain(table_query(queries, 'transactions'))
+        assert 'PRIMARY KEY' in plan or 'transactions_pkey' in plan, plan
+
+    def test_payment_id_lookup_uses_index(self, dataset):
+        with CaptureQueriesContext(connection) as queries:
+            Transaction.objects.filter(razorpay_payment_id='pay_1_1').first()
+        assert_index_scan(table_query(queries, 'transactions'), 'txn_razorpay_payment_idx')
+
+    def test_stale_pending_scan_uses_partial_index(self, dataset):
+        cutoff = timezone.now() - timedelta(hours=1)
+        queryset = Transaction.objects.filter(status='PENDING', created_at__lt=cutoff).order_by('created_at')
+        with CaptureQueriesContext(connection) as queries:
+            list(queryset[:100])
+        assert_index_scan(table_query(queries, 'transactions'), 'txn_pending_created_idx')
+
+    def test_transaction_logs_use_transaction_index(self, dataset):
+        transaction = Transaction.objects.filter(user=dataset[0]).first()
+        with CaptureQueriesContext(connection) as queries:
+            list(PaymentLog.objects.filter(transaction=transaction).order_by('created_at'))
+        assert_partitioned_index_scan(table_query(queries, 'payment_logs'), 'payment_logs', 'plog_txn_created_idx')
+
+    def test_latest_logs_use_created_index(self, dataset):
+        with CaptureQueriesContext(connection) as queries:
+            list(PaymentLog.objects.all()[:100])
+        assert_partitioned_index_scan(table_query(queries, 'payment_logs'), 'payment_logs', 'plog_created_idx')
@@ -0,0 +1,184 @@
+"""
+Pending transaction reconciliation tests
+Run: pytest tests/test_reconciliation.py -v
+"""
+import pytest
+import threading
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from payments import summary
+from payments.models import Transaction, PaymentLog
+from payments.reconciliation import Reconciler, reconcile_options
+from decimal import Decimal
+from razorpay.errors import BadRequestError
+from unittest.mock import patch
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class FakeOrders:
+    """Stands in for razorpay.Client.order, the order number picks the outcome."""
+
+    def __init__(self, fail_after=None):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.fail_after = fail_after
+
+    def payments(self, order_id):
+        with self.lock:
+            self.count += 1
+            if self.count > (self.fail_after or float('inf')):
+                raise Interrupted()
+        n = int(order_id.rsplit('_', 1)[1])
+        outcome = [
+            [{'id': f'pay_{n}', 'status': 'captured'}],
+            [{'id': f'pay_{n}', 'status': 'failed'}],
+            [{'id': f'pay_{n}', 'status': 'authorized'}],
+            [],
+        ][n % 4]
+        return {'entity': 'collection', 'count': len(outcome), 'items': outcome}
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.order = FakeOrders(**kwargs)
+
+
+@pytest.fixture
+def options(tmp_path):
+    return {**reconcile_options(), 'CHUNK_SIZE': 1000, 'RATE_LIMIT': 1_000_000, 'CHECKPOINT_PATH': tmp_path / 'checkpoint.json'}
+
+
+def seed(user, count, minutes_ago=60):
+    Transaction.objects.bulk_create([
+        Transaction(user=user, order_id=f'ORD_{i}', razorpay_order_id=f'order_{i}', amount=Decimal('10.00'))
+        for i in range(count)
+    ], batch_size=1000)
+    Transaction.objects.update(created_at=timezone.now() - timedelta(minutes=minutes_ago))
+    summary.rebuild()
+
+
+@pytest.mark.django_db
+class TestReconciliation:
+
+    def test_resolves_tens_of_thousands_of_pending_orders(self, user, options):
+        seed(user, 20_000)
+        fresh = Transaction.objects.create(user=user, order_id='ORD_fresh', razorpay_order_id='order_20000', amount=Decimal('10.00'))
+        summary.record_created(fresh)
+
+        stats = Reconciler(client=FakeClient(), options=options).run(older_than=30)
+
+        assert stats['checked'] == 20_000
+        assert stats['succeeded'] == 5000
+        assert stats['failed'] == 5000
+        assert stats['unchanged'] == 10_000
+        assert Transaction.objects.filter(status='SUCCESS', razorpay_payment_id__startswith='pay_').count() == 5000
+        assert Transaction.objects.get(order_id='ORD_2').status == 'PENDING'
+        assert Transaction.objects.get(pk=fresh.pk).status == 'PENDING'
+        assert PaymentLog.objects.filter(event_type__in=['PAYMENT_SUCCESS', 'PAYMENT_FAILED']).count() == 10_000
+        assert summary.differences() == {}
+        assert not options['CHECKPOINT_PATH'].exists()
+
+    def test_interrupted_run_resumes_from_checkpoint(self, user, options):
+        seed(user, 5000)
+        options = {**options, 'CONCURRENCY': 1}
+
+        with pytest.raises(Interrupted):
+            Reconciler(client=FakeClient(fail_after=2500), options=options).run(older_than=30)
+        assert options['CHECKPOINT_PATH'].exists()
+        # the first two chunks were written before the interruption
+        assert Transaction.objects.exclude(status='PENDING').count() == 1000
+
+        client = FakeClient()
+        stats = Reconciler(client=client, options=options).run(older_than=30)
+
+        assert stats['checked'] == 3000
+        assert client.order.count == 3000
+        assert Transaction.objects.exclude(status='PENDING').count() == 2500
+        assert not options['CHECKPOINT_PATH'].exists()
+
+    def test_rows_resolved_meanwhile_are_left_alone(self, user, options):
+        seed(user, 8)
+        reconciler = Reconciler(client=FakeClient(), options=options)
+        apply = reconciler.apply
+
+        def verified_by_browser_first(changes):
+            Transaction.objects.update(status='SUCCESS', razorpay_payment_id='pay_browser')
+            apply(changes)
+
+        with patch.object(reconciler, 'apply', verified_by_browser_first):
+            stats = reconciler.run(older_than=30)
+
+        assert stats['skipped'] == 4
+        assert Transaction.objects.get(order_id='ORD_1').razorpay_payment_id == 'pay_browser'
+        assert not PaymentLog.objects.exists()
+
+    def test_moves_follow_the_state_transitions(self, user, options):
+        seed(user, 2)
+        reconciler = Reconciler(client=FakeClient(), options=options)
+        apply = reconciler.apply
+
+        def failed_by_checkout_first(changes):
+            Transaction.objects.update(status='FAILED')
+            apply(changes)
+
+        with patch.object(reconciler, 'apply', failed_by_checkout_first):
+            stats = reconciler.run(older_than=30)
+
+        # a capture still wins over a failed checkout, a failed payment has nothing left to do
+        assert (stats['succeeded'], stats['failed'], stats['skipped']) == (1, 0, 1)
+        assert Transaction.objects.get(order_id='ORD_0').status == 'SUCCESS'
+        log = PaymentLog.objects.get()
+        assert log.message == 'FAILED -> SUCCESS'
+        assert log.payload == {'source': 'reconciliation', 'razorpay_payment_id': 'pay_0'}
+
+    def test_abandoned_orders_expire(self, user, options):
+        seed(user, 4, minutes_ago=25 * 60)
+        options = {**options, 'EXPIRE_AFTER_MINUTES': 24 * 60}
+
+        stats = Reconciler(client=FakeClient(), options=options).run(older_than=30)
+
+        assert stats['expired'] == 1
+        # no payment was ever made against order_3
+        assert Transaction.objects.get(order_id='ORD_3').status == 'FAILED'
+        assert Transaction.objects.get(order_id='ORD_3').razorpay_payment_id == ''
+        # an authorized payment can still be captured
+        assert Transaction.objects.get(order_id='ORD_2').status == 'PENDING'
+        assert summary.differences() == {}
+
+        stats = Reconciler(client=FakeClient(), options=options).run(older_than=30)
+        assert stats['checked'] == 1
+
+    def test_missing_gateway_order_fails_without_lookup(self, user, options):
+        seed(user, 1)
+        Transaction.objects.update(razorpay_order_id='')
+        client = FakeClient()
+
+        Reconciler(client=client, options=options).run(older_than=30)
+
+        assert Transaction.objects.get().status == 'FAILED'
+        assert client.order.count == 0
+
+    def test_rate_limited_gateway_slows_down(self, user, options):
+        seed(user, 4)
+        client = FakeClient()
+        client.order.payments = lambda order_id: (_ for _ in ()).throw(BadRequestError('Too many requests'))
+        reconciler = Reconciler(client=client, options={**options, 'RATE_LIMIT': 1000, 'CONCURRENCY': 1})
+
+        stats = reconciler.run(older_than=30)
+
+        assert stats['rate_limited'] == 4
+        assert reconciler.limiter.rate < 1000
+        assert not Transaction.objects.exclude(status='PENDING').exists()
+
+    def test_command(self, user, settings, tmp_path):
+        settings.RECONCILIATION = {**settings.RECONCILIATION, 'CHECKPOINT_PATH': tmp_path / 'checkpoint.json'}
+        seed(user, 4)
+
+        with patch('payments.reconciliation.get_client', return_value=FakeClient()):
+            call_command('reconcile_payments', '--older-than', '30', '--rate-limit', '1000')
+
+        assert list(Transaction.objects.order_by('order_id').values_list('status', flat=True)) == ['SUCCESS', 'FAILED', 'PENDING', 'PENDING']
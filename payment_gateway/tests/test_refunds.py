@@ -0,0 +1,225 @@
+"""
+Refund tests
+Run: pytest tests/test_refunds.py -v
+"""
+import itertools
+import pytest
+import requests
+import threading
+from django.contrib.auth.models import User
+from datetime import datetime, timezone
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from payments import summary
+from payments.models import Transaction, PaymentLog, Refund
+from decimal import Decimal
+from razorpay.errors import BadRequestError
+from unittest.mock import patch
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class FakePayments:
+    """Stands in for razorpay.Client.payment, keeps the refunds it accepted."""
+
+    def __init__(self, reject=(), drop_response=(), fail_after=None):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.refunds = {}
+        self.calls = 0
+        self.reject = set(reject)
+        self.drop_response = set(drop_response)
+        self.fail_after = fail_after
+
+    def refund(self, payment_id, data):
+        with self.lock:
+            self.calls += 1
+            if self.fail_after is not None and self.calls > self.fail_after:
+                raise Interrupted()
+            if payment_id in self.reject:
+                raise BadRequestError('The refund amount provided is greater than amount captured')
+            refund = {'id': f'rfnd_{next(self.ids)}', 'payment_id': payment_id, 'amount': data['amount'], 'notes': data['notes']}
+            self.refunds.setdefault(payment_id, []).append(refund)
+        if payment_id in self.drop_response:
+            raise requests.exceptions.ReadTimeout('read timed out')
+        return refund
+
+    def fetch_multiple_refund(self, payment_id):
+        with self.lock:
+            return {'items': list(self.refunds.get(payment_id, []))}
+
+    @property
+    def refunded(self):
+        return sum(len(items) for items in self.refunds.values())
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.payment = FakePayments(**kwargs)
+
+
+@pytest.fixture
+def staff(client):
+    user = User.objects.create_user(username='ops@test.com', email='ops@test.com', password='testpass123', is_staff=True)
+    client.force_login(user)
+    return user
+
+
+@pytest.fixture
+def customer():
+    return User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+
+
+def paid(user, count=1, amount='100.00'):
+    transactions = Transaction.objects.bulk_create([
+        Transaction(user=user, order_id=f'ORD_{i}', amount=Decimal(amount), status='SUCCESS',
+                    razorpay_order_id=f'order_{i}', razorpay_payment_id=f'pay_{i}')
+        for i in range(count)
+    ], batch_size=1000)
+    summary.rebuild()
+    return transactions
+
+
+def refund(client, transaction, amount=None, gateway=None):
+    body = {'transaction_id': transaction.id}
+    if amount:
+        body['amount'] = amount
+    with patch('payments.views.get_razorpay_client', return_value=gateway or FakeClient()):
+        return client.post('/api/payments/refund/', body, content_type='application/json')
+
+
+@pytest.mark.django_db
+class TestRefundApi:
+
+    def test_full_refund(self, client, staff, customer):
+        transaction, = paid(customer)
+
+        response = refund(client, transaction)
+
+        assert response.status_code == 201
+        assert response.data['refund']['amount'] == '100.00'
+        assert response.data['transaction']['status'] == 'REFUNDED'
+        assert Refund.objects.get().razorpay_refund_id == 'rfnd_1'
+        assert PaymentLog.objects.filter(transaction=transaction, event_type='PAYMENT_REFUNDED').count() == 1
+        assert summary.differences() == {}
+
+    def test_partial_refunds(self, client, staff, customer):
+        transaction, = paid(customer)
+        gateway = FakeClient()
+
+        first = refund(client, transaction, '40.00', gateway)
+        assert first.data['transaction']['status'] == 'SUCCESS'
+
+        too_much = refund(client, transaction, '70.00', gateway)
+        assert too_much.status_code == 400
+
+        rest = refund(client, transaction, None, gateway)
+        assert rest.data['refund']['amount'] == '60.00'
+        assert rest.data['transaction']['status'] == 'REFUNDED'
+
+    def test_gateway_rejection_frees_the_amount(self, client, staff, customer):
+        transaction, = paid(customer)
+
+        response = refund(client, transaction, gateway=FakeClient(reject=['pay_0']))
+        assert response.status_code == 502
+        assert Refund.objects.get().status == 'FAILED'
+
+        assert refund(client, transaction).status_code == 201
+
+    def test_only_successful_payments(self, client, staff, customer):
+        transaction = Transaction.objects.create(user=customer, order_id='ORD_1', amount=Decimal('10.00'))
+
+        response = refund(client, transaction)
+
+        assert response.status_code == 400
+        assert not Refund.objects.exists()
+
+    def test_staff_only(self, client, customer):
+        transaction, = paid(customer)
+        client.force_login(customer)
+
+        assert refund(client, transaction).status_code == 403
+
+
+@pytest.mark.django_db
+class TestBulkRefund:
+
+    def run(self, gateway, *args):
+        with patch('payments.management.commands.bulk_refund.get_client', return_value=gateway):
+            call_command('bulk_refund', *args)
+
+    def test_refunds_a_users_payments(self, customer):
+        paid(customer, 2000)
+        gateway = FakeClient()
+
+        self.run(gateway, '--user', 'test@test.com', '--batch', 'b1', '--chunk-size', '300')
+
+        assert gateway.payment.refunded == 2000
+        assert Transaction.objects.filter(status='REFUNDED').count() == 2000
+        assert Refund.objects.filter(batch='b1', status='PROCESSED').count() == 2000
+        assert summary.differences() == {}
+
+    def test_csv_with_partial_amounts(self, customer, tmp_path):
+        paid(customer, 3)
+        path = tmp_path / 'refunds.csv'
+        path.write_text('order_id,amount,reason\nORD_0,25.00,damaged\nORD_1,,\nORD_missing,,\n')
+
+        self.run(FakeClient(), '--csv', str(path), '--batch', 'b1')
+
+        assert Refund.objects.get(transaction__order_id='ORD_0').amount == Decimal('25.00')
+        assert Refund.objects.get(transaction__order_id='ORD_0').reason == 'damaged'
+        assert list(Transaction.objects.order_by('order_id').values_list('status', flat=True)) == ['SUCCESS', 'REFUNDED', 'SUCCESS']
+
+    def test_interrupted_run_resumes_without_refunding_twice(self, customer):
+        paid(customer, 500)
+
+        with pytest.raises(Interrupted):
+            self.run(FakeClient(fail_after=250), '--user', 'test@test.com', '--batch', 'b1', '--chunk-size', '100')
+        gateway = FakeClient()
+        # what the gateway accepted before the crash
+        interrupted = Refund.objects.filter(batch='b1', status='PENDING')
+        for row in interrupted.select_related('transaction')[:50]:
+            gateway.payment.refunds[row.transaction.razorpay_payment_id] = [
+                {'id': f'rfnd_old{row.pk}', 'notes': {'refund_id': str(row.pk)}}
+            ]
+
+        self.run(gateway, '--user', 'test@test.com', '--batch', 'b1', '--chunk-size', '100')
+
+        assert Transaction.objects.filter(status='REFUNDED').count() == 500
+        assert Refund.objects.filter(batch='b1').count() == 500
+        assert Refund.objects.filter(razorpay_refund_id__startswith='rfnd_old').count() == 50
+        assert summary.differences() == {}
+
+    def test_unknown_outcome_is_settled_later(self, customer):
+        paid(customer, 2)
+        gateway = FakeClient(drop_response=['pay_1'])
+
+        self.run(gateway, '--user', 'test@test.com', '--batch', 'b1')
+        assert Refund.objects.get(transaction__order_id='ORD_1').status == 'PENDING'
+
+        gateway.payment.drop_response.clear()
+        self.run(gateway, '--pending')
+
+        assert Refund.objects.get(transaction__order_id='ORD_1').status == 'PROCESSED'
+        assert gateway.payment.refunded == 2
+
+    def test_created_window_compares_created_at_directly(self, customer):
+        transactions = paid(customer, 4)
+        days = [datetime(2024, 3, day, 23, 59, tzinfo=timezone.utc) for day in (1, 2, 3, 4)]
+        for transaction, day in zip(transactions, days):
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=day)
+        gateway = FakeClient()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.run(gateway, '--created-after', '2024-03-02', '--created-before', '2024-03-04', '--batch', 'b1')
+
+        assert sorted(Refund.objects.values_list('transaction__order_id', flat=True)) == ['ORD_1', 'ORD_2']
+        # a date cast on created_at rules out txn_created_idx
+        assert not any('cast_date' in q['sql'] or '::date' in q['sql'] for q in queries.captured_queries)
+
+    def test_invalid_created_window(self, customer):
+        with pytest.raises(CommandError):
+            self.run(FakeClient(), '--created-after', 'soon')
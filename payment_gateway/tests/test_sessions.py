@@ -0,0 +1,116 @@
+"""
+Session tests
+Run: pytest tests/test_sessions.py -v
+"""
+import time
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from payment_gateway import caches
+from payment_gateway.middleware import REFRESHED_AT
+
+CACHED_DB = 'django.contrib.sessions.backends.cached_db'
+
+
+@pytest.fixture
+def cached_db(settings):
+    # the test run is a single process, so the locmem session cache is shared by every request
+    settings.SESSION_ENGINE = CACHED_DB
+
+
+@pytest.fixture
+def user(client):
+    user = User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+    response = client.post('/api/auth/login/', {'email': 'test@test.com', 'password': 'testpass123'}, content_type='application/json')
+    assert response.status_code == 200
+    return user
+
+
+def session_queries(client, path='/api/auth/user/'):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path)
+    assert response.status_code == 200
+    return [q['sql'] for q in context.captured_queries if 'django_session' in q['sql']]
+
+
+@pytest.mark.django_db
+class TestSlidingSessions:
+
+    def test_requests_do_not_touch_the_session_table(self, client, cached_db, user):
+        assert client.session[REFRESHED_AT]
+
+        assert session_queries(client) == []
+        assert session_queries(client, '/api/payments/transactions/') == []
+
+    def test_session_is_rewritten_near_expiry(self, client, cached_db, user, settings):
+        session = client.session
+        session[REFRESHED_AT] = int(time.time()) - settings.SESSION_COOKIE_AGE + settings.SESSION_REFRESH_THRESHOLD - 60
+        session.save()
+
+        queries = session_queries(client)
+
+        assert any(sql.startswith('UPDATE') for sql in queries)
+        assert client.session[REFRESHED_AT] >= int(time.time()) - 5
+        assert session_queries(client) == []
+
+    def test_logout_ends_the_session(self, client, user):
+        assert client.post('/api/auth/logout/').status_code == 200
+
+        assert client.get('/api/auth/user/').status_code == 403
+
+    def test_db_sessions_are_the_default(self, client, user):
+        assert Session.objects.count() == 1
+        assert session_queries(client)
+
+    def test_signed_cookie_sessions(self, client, settings):
+        settings.SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+        User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+        client.post('/api/auth/login/', {'email': 'test@test.com', 'password': 'testpass123'}, content_type='application/json')
+
+        assert session_queries(client) == []
+        assert not Session.objects.exists()
+
+
+class TestSessionCacheCheck:
+
+    def test_cached_db_refuses_a_per_worker_cache(self, settings):
+        settings.SESSION_ENGINE = CACHED_DB
+        settings.WEB_CONCURRENCY = 0
+
+        with pytest.raises(ImproperlyConfigured, match='shared between processes'):
+            caches.check_session_cache()
+
+    def test_cached_db_with_a_single_worker_or_shared_cache(self, settings):
+        settings.SESSION_ENGINE = CACHED_DB
+        settings.WEB_CONCURRENCY = 1
+        caches.check_session_cache()
+
+        settings.WEB_CONCURRENCY = 4
+        settings.CACHES = {**settings.CACHES, 'sessions': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        caches.check_session_cache()
+
+    def test_db_sessions_need_no_cache(self, settings):
+        settings.SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+        settings.WEB_CONCURRENCY = 0
+        caches.check_session_cache()
+
+
+@pytest.mark.django_db
+class TestPurgeSessions:
+
+    def test_deletes_expired_rows_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i:04d}', session_data='', expire_date=now - timedelta(days=1)) for i in range(25)]
+            + [Session(session_key=f'live{i:04d}', session_data='', expire_date=now + timedelta(days=1)) for i in range(5)]
+        )
+
+        call_command('purge_sessions', '--batch-size', '10')
+
+        assert sorted(Session.objects.values_list('session_key', flat=True)) == [f'live{i:04d}' for i in range(5)]
@@ -0,0 +1,103 @@
+"""
+Transaction state machine tests
+Run: pytest tests/test_state.py -v
+"""
+import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, connections
+from payments import state, summary
+from payments.models import Transaction, PaymentLog
+from decimal import Decimal
+
+
+@pytest.fixture
+def transaction(user):
+    transaction = Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'), razorpay_order_id='order_1')
+    summary.record_created(transaction)
+    return transaction
+
+
+@pytest.mark.django_db
+class TestStateMachine:
+
+    @pytest.mark.parametrize('old_status, new_status, legal', [
+        ('PENDING', 'SUCCESS', True),
+        ('PENDING', 'FAILED', True),
+        ('FAILED', 'SUCCESS', True),
+        ('SUCCESS', 'REFUNDED', True),
+        ('SUCCESS', 'FAILED', False),
+        ('PENDING', 'REFUNDED', False),
+        ('REFUNDED', 'SUCCESS', False),
+        ('FAILED', 'PENDING', False),
+    ])
+    def test_transition_table(self, old_status, new_status, legal):
+        assert state.allowed(old_status, new_status) is legal
+
+    def test_transition_writes_row_summary_and_log(self, transaction):
+        assert state.transition(transaction, 'SUCCESS', razorpay_payment_id='pay_1')
+
+        stored = Transaction.objects.get(pk=transaction.pk)
+        assert stored.status == 'SUCCESS'
+        assert stored.razorpay_payment_id == 'pay_1'
+        assert PaymentLog.objects.get(transaction=transaction).event_type == 'PAYMENT_SUCCESS'
+        assert summary.differences() == {}
+
+    def test_illegal_transition_writes_nothing(self, transaction):
+        assert state.transition(transaction, 'REFUNDED') is False
+
+        assert Transaction.objects.get(pk=transaction.pk).status == 'PENDING'
+        assert not PaymentLog.objects.exists()
+
+    def test_refund(self, transaction):
+        state.transition(transaction, 'SUCCESS')
+
+        assert state.transition(transaction, 'REFUNDED')
+        assert PaymentLog.objects.filter(event_type='PAYMENT_REFUNDED').count() == 1
+        assert summary.differences() == {}
+
+    def test_unknown_status(self, transaction):
+        with pytest.raises(state.IllegalTransition):
+            state.transition(transaction, 'CHARGEBACK')
+
+    def test_late_failure_loses_to_verify(self, transaction):
+        stale = Transaction.objects.get(pk=transaction.pk)
+        assert state.transition(transaction, 'SUCCESS')
+
+        assert state.transition(stale, 'FAILED') is False
+        assert stale.status == 'SUCCESS'
+        assert Transaction.objects.get(pk=transaction.pk).status == 'SUCCESS'
+        assert summary.differences() == {}
+
+    def test_capture_retries_after_losing_to_failure(self, transaction):
+        stale = Transaction.objects.get(pk=transaction.pk)
+        assert state.transition(transaction, 'FAILED')
+
+        # the instance still says PENDING, the first UPDATE misses and the move is redone from FAILED
+        assert state.transition(stale, 'SUCCESS')
+        assert Transaction.objects.get(pk=transaction.pk).status == 'SUCCESS'
+        assert list(PaymentLog.objects.order_by('pk').values_list('event_type', flat=True)) == ['PAYMENT_FAILED', 'PAYMENT_SUCCESS']
+        assert summary.differences() == {}
+
+
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite test databases lock on concurrent connections')
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_conflicting_transitions(transaction):
+    barrier = threading.Barrier(8)
+
+    def race(i):
+        instance = Transaction.objects.get(pk=transaction.pk)
+        barrier.wait()
+        try:
+            return state.transition(instance, 'SUCCESS' if i % 2 else 'FAILED')
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(race, range(8)))
+
+    # FAILED may win first, SUCCESS always ends up on top and is applied exactly once
+    assert Transaction.objects.get(pk=transaction.pk).status == 'SUCCESS'
+    assert PaymentLog.objects.filter(event_type='PAYMENT_SUCCESS').count() == 1
+    assert PaymentLog.objects.count() == results.count(True)
+    assert summary.differences() == {}
@@ -0,0 +1,102 @@
+"""
+Payment summary tests
+Run: pytest tests/test_summary.py -v
+"""
+import pytest
+import threading
+import time
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction as db_transaction
+from django.test.utils import CaptureQueriesContext
+from payments import summary
+from payments.models import Transaction, PaymentSummary
+from payments.views import payment_signature
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+
+def create_order(client, amount):
+    with patch('payments.views.get_razorpay_client') as mock_razorpay:
+        mock_client = MagicMock()
+        mock_client.order.create.side_effect = lambda data: {'id': f"order_{data['receipt']}", 'receipt': data['receipt']}
+        mock_razorpay.return_value = mock_client
+        response = client.post('/api/payments/create-order/', {'amount': amount}, content_type='application/json')
+    assert response.status_code == 200
+    return response.data['transaction']
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestPaymentSummary:
+
+    def test_endpoints_keep_summary_in_step(self, client, user, settings):
+        settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET = 'key', 'secret'
+        paid = create_order(client, '100.00')
+        cancelled = create_order(client, '40.00')
+        create_order(client, '5.50')
+
+        client.post('/api/payments/verify/', {
+            'razorpay_order_id': paid['razorpay_order_id'],
+            'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': payment_signature(paid['razorpay_order_id'], 'pay_1'),
+        }, content_type='application/json')
+        client.post('/api/payments/failure/', {'transaction_id': cancelled['id']}, content_type='application/json')
+
+        response = client.get('/api/payments/summary/')
+
+        assert response.status_code == 200
+        assert response.data['by_status'] == {
+            'FAILED': {'count': 1, 'total': '40.00'},
+            'PENDING': {'count': 1, 'total': '5.50'},
+            'SUCCESS': {'count': 1, 'total': '100.00'},
+        }
+        assert response.data['by_currency'] == {'INR': {'count': 3, 'total': '145.50'}}
+        assert response.data['total_count'] == 3
+        assert summary.differences() == {}
+
+    def test_summary_does_not_read_transactions(self, client, user):
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/payments/summary/')
+
+        assert not any('"transactions"' in q['sql'] for q in queries.captured_queries)
+
+    def test_rebuild_command(self, user):
+        Transaction.objects.bulk_create([
+            Transaction(user=user, order_id=f'ORD_{i}', amount=Decimal('10.00'), status='SUCCESS' if i % 2 else 'FAILED')
+            for i in range(10)
+        ])
+        with pytest.raises(CommandError):
+            call_command('rebuild_payment_summary', '--check')
+
+        call_command('rebuild_payment_summary')
+
+        assert PaymentSummary.objects.get(user=user, status='SUCCESS').count == 5
+        call_command('rebuild_payment_summary', '--check')
+
+
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite test databases lock on concurrent connections')
+@pytest.mark.django_db(transaction=True)
+def test_bumps_during_a_rebuild_are_kept(user):
+    computed = threading.Event()
+    recompute = summary.recompute
+
+    def slow_recompute():
+        expected = recompute()
+        computed.set()
+        time.sleep(0.5)
+        return expected
+
+    def create_order():
+        computed.wait()
+        with db_transaction.atomic():
+            summary.record_created(Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00')))
+        connection.close()
+
+    with patch.object(summary, 'recompute', slow_recompute):
+        request = threading.Thread(target=create_order)
+        request.start()
+        summary.rebuild()
+        request.join()
+
+    assert summary.differences() == {}
@@ -0,0 +1,128 @@
+"""
+Transaction history pagination tests
+Run: pytest tests/test_transaction_history.py -v
+"""
+import json
+import pytest
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from payments import renderers
+from payments.models import Transaction
+from payments.views import serialize_transaction
+from decimal import Decimal
+from unittest.mock import patch
+
+
+def make_transactions(user, count, status='SUCCESS', **extra):
+    Transaction.objects.bulk_create([
+        Transaction(user=user, order_id=f"ORD_{user.id}_{status}_{i}", amount=Decimal('10.00'), status=status, **extra)
+        for i in range(count)
+    ])
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestTransactionHistory:
+
+    def test_pages_cover_every_row_once(self, client, user):
+        make_transactions(user, 45)
+        # identical timestamps, the id tie breaker has to keep pages apart
+        Transaction.objects.update(created_at=timezone.now())
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {'page_size': 20, **({'cursor': cursor} if cursor else {})}
+            response = client.get('/api/payments/transactions/', params)
+            assert response.status_code == 200
+            seen += [t['id'] for t in response.data['results']]
+            cursor, pages = response.data['next_cursor'], pages + 1
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert len(seen) == len(set(seen)) == 45
+        assert seen == sorted(seen, reverse=True)
+
+    def test_page_size_is_capped(self, client, user, settings):
+        settings.TRANSACTION_HISTORY_MAX_PAGE_SIZE = 10
+        make_transactions(user, 15)
+
+        response = client.get('/api/payments/transactions/', {'page_size': 1000})
+
+        assert len(response.data['results']) == 10
+        assert response.data['next_cursor']
+
+    def test_fields_projection(self, client, user):
+        make_transactions(user, 3, description='not needed')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/payments/transactions/', {'fields': 'order_id,amount'})
+
+        assert response.data['results'][0] == {'order_id': f"ORD_{user.id}_SUCCESS_2", 'amount': '10.00'}
+        history_sql = [q['sql'] for q in queries.captured_queries if 'transactions' in q['sql']]
+        assert 'description' not in history_sql[-1]
+
+    def test_unknown_field_rejected(self, client, user):
+        response = client.get('/api/payments/transactions/', {'fields': 'order_id,razorpay_signature'})
+
+        assert response.status_code == 400
+
+    def test_status_and_date_filters(self, client, user):
+        make_transactions(user, 2, status='SUCCESS')
+        make_transactions(user, 3, status='FAILED')
+        Transaction.objects.filter(status='FAILED', order_id__endswith='_0').update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+
+        response = client.get('/api/payments/transactions/', {'status': 'failed'})
+        assert len(response.data['results']) == 3
+
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = client.get('/api/payments/transactions/', {'status': 'FAILED', 'created_after': since})
+        assert len(response.data['results']) == 2
+
+    def test_invalid_cursor(self, client, user):
+        response = client.get('/api/payments/transactions/', {'cursor': 'not-a-cursor'})
+
+        assert response.status_code == 400
+
+    def test_only_own_transactions(self, client, user):
+        other = User.objects.create_user(username='other@test.com', email='other@test.com', password='x')
+        make_transactions(other, 2)
+
+        response = client.get('/api/payments/transactions/')
+
+        assert response.data['results'] == []
+        assert response.data['next_cursor'] is None
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('logged_in_user')
+class TestFastRenderer:
+
+    @pytest.mark.parametrize('library', ['stdlib', 'stdlib without operator.call', 'orjson'])
+    def test_body_matches_serialize_transaction(self, client, user, library):
+        if library == 'orjson' and renderers.orjson is None:
+            pytest.skip('orjson is not installed')
+        make_transactions(user, 3, description='Caf\u00e9 "bill" \u2028 line', razorpay_payment_id='pay_1')
+        call = renderers.call if library == 'stdlib' else (lambda encoder, value: encoder(value))
+
+        with patch.object(renderers, 'orjson', renderers.orjson if library == 'orjson' else None), \
+                patch.object(renderers, 'call', call):
+            response = client.get('/api/payments/transactions/')
+
+        expected = [serialize_transaction(t) for t in Transaction.objects.filter(user=user).order_by('-created_at', '-id')]
+        assert json.loads(response.content)['results'] == expected
+        assert b'\\u2028' in response.content
+        assert response.data['results'] == expected
+
+    def test_browsable_api_still_renders(self, client, user):
+        make_transactions(user, 2)
+
+        response = client.get('/api/payments/transactions/', HTTP_ACCEPT='text/html')
+
+        assert response.status_code == 200
+        assert b'ORD_' in response.content
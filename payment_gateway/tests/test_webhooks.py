@@ -0,0 +1,142 @@
+"""
+Razorpay webhook tests
+Run: pytest tests/test_webhooks.py -v
+"""
+import hashlib
+import hmac
+import json
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from payments import webhooks
+from payments.models import Transaction, PaymentLog, WebhookEvent
+from decimal import Decimal
+from unittest.mock import patch
+
+SECRET = 'whsec_test'
+
+
+@pytest.fixture(autouse=True)
+def webhook_settings(settings):
+    settings.RAZORPAY_WEBHOOK_SECRET = SECRET
+    settings.RAZORPAY_WEBHOOK = {**settings.RAZORPAY_WEBHOOK, 'ASYNC': False}
+
+
+@pytest.fixture
+def transaction():
+    user = User.objects.create_user(username='test@test.com', email='test@test.com', password='testpass123')
+    return Transaction.objects.create(user=user, order_id='ORD_1', amount=Decimal('10.00'), razorpay_order_id='order_1')
+
+
+def event(name, order_id='order_1', payment_id='pay_1'):
+    return {
+        'entity': 'event',
+        'event': name,
+        'payload': {'payment': {'entity': {'id': payment_id, 'order_id': order_id}}},
+    }
+
+
+def post_webhook(client, payload, event_id='evt_1', secret=SECRET):
+    body = json.dumps(payload).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.generic('POST', '/api/payments/webhook/', body, content_type='application/json',
+                          HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id)
+
+
+@pytest.mark.django_db
+class TestWebhooks:
+
+    def test_captured_payment_completes_transaction(self, client, transaction, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = post_webhook(client, event('payment.captured'))
+
+        assert response.status_code == 200
+        assert response.data == {'status': 'queued'}
+        transaction.refresh_from_db()
+        assert transaction.status == 'SUCCESS'
+        assert transaction.razorpay_payment_id == 'pay_1'
+        assert WebhookEvent.objects.get(event_id='evt_1').status == 'PROCESSED'
+        assert PaymentLog.objects.filter(transaction=transaction, event_type='WEBHOOK_RECEIVED').exists()
+
+    def test_invalid_signature_rejected(self, client, transaction):
+        response = post_webhook(client, event('payment.captured'), secret='wrong')
+
+        assert response.status_code == 400
+        assert not WebhookEvent.objects.exists()
+
+    def test_redelivery_is_deduplicated(self, client, transaction, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            post_webhook(client, event('payment.failed'))
+            response = post_webhook(client, event('payment.failed'))
+        assert response.data == {'status': 'duplicate'}
+
+        # a fresh worker without the LRU still dedups on the unique event id
+        webhooks.recent_events = webhooks.RecentEvents(10)
+        response = post_webhook(client, event('payment.failed'))
+        assert response.data == {'status': 'duplicate'}
+
+        assert WebhookEvent.objects.count() == 1
+        assert PaymentLog.objects.filter(event_type='WEBHOOK_RECEIVED').count() == 1
+
+    def test_events_are_applied_idempotently(self, client, transaction, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            post_webhook(client, event('payment.captured'), event_id='evt_1')
+            post_webhook(client, event('order.paid'), event_id='evt_2')
+            post_webhook(client, event('payment.failed'), event_id='evt_3')
+
+        transaction.refresh_from_db()
+        assert transaction.status == 'SUCCESS'
+        assert list(WebhookEvent.objects.order_by('pk').values_list('status', flat=True)) == ['PROCESSED', 'IGNORED', 'IGNORED']
+
+    def test_lru_is_bounded(self):
+        recent = webhooks.RecentEvents(2)
+        for event_id in ['a', 'b', 'c']:
+            recent.add(event_id)
+
+        assert 'a' not in recent
+        assert 'b' in recent and 'c' in recent
+
+    def test_process_webhooks_command_picks_up_stranded_events(self, transaction):
+        WebhookEvent.objects.create(event_id='evt_9', event='payment.captured', payload=event('payment.captured'))
+
+        call_command('process_webhooks', '--older-than', '0')
+
+        transaction.refresh_from_db()
+        assert transaction.status == 'SUCCESS'
+
+    def test_an_event_is_applied_once_when_two_workers_select_it(self, transaction):
+        stored = WebhookEvent.objects.create(event_id='evt_9', event='payment.captured', payload=event('payment.captured'))
+        # both selected it while it was RECEIVED
+        first, second = WebhookEvent.objects.get(pk=stored.pk), WebhookEvent.objects.get(pk=stored.pk)
+
+        assert webhooks.process_event(first) is True
+        assert webhooks.process_event(second) is False
+
+        assert PaymentLog.objects.filter(transaction=transaction, event_type='WEBHOOK_RECEIVED').count() == 1
+        assert webhooks.processor.process([stored.pk]) == 0
+
+    def test_failed_batches_are_logged_and_left_for_process_webhooks(self, transaction, caplog):
+        stored = WebhookEvent.objects.create(event_id='evt_9', event='payment.captured', payload=event('payment.captured'))
+
+        with patch('payments.webhooks.process_event', side_effect=OperationalError('database unavailable')):
+            assert webhooks.processor.process_batch([stored.pk]) == 0
+
+        assert 'process_webhooks retries them' in caplog.text
+        assert WebhookEvent.objects.get(pk=stored.pk).status == 'RECEIVED'
+        call_command('process_webhooks', '--older-than', '0')
+        transaction.refresh_from_db()
+        assert transaction.status == 'SUCCESS'
+
+    def test_events_that_fail_to_apply_are_retried_with_retry_failed(self, transaction):
+        stored = WebhookEvent.objects.create(event_id='evt_9', event='payment.captured', payload=event('payment.captured'))
+
+        with patch('payments.webhooks.apply_event', side_effect=ValueError('bad payload')):
+            assert webhooks.processor.process_batch([stored.pk]) == 1
+
+        failed = WebhookEvent.objects.get(pk=stored.pk)
+        assert (failed.status, failed.error) == ('FAILED', 'bad payload')
+        call_command('process_webhooks', '--older-than', '0')
+        assert WebhookEvent.objects.get(pk=stored.pk).status == 'FAILED'
+        call_command('process_webhooks', '--older-than', '0', '--retry-failed')
+        assert WebhookEvent.objects.get(pk=stored.pk).status == 'PROCESSED'